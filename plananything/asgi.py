@@ -3,6 +3,9 @@ ASGI config for plananything project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it under an ASGI server (e.g. ``uvicorn plananything.asgi:application``) so
+the streaming chat endpoint waits on Gemini without holding a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
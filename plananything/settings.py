@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 import os
 import sys
 
@@ -62,28 +63,46 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so session/auth queries are counted too
+    'planner.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Activates the browser's time zone for "today" and overdue state
+    'planner.middleware.TimezoneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'plananything.urls'
 
+# Templates are compiled once per process by the cached loader, whatever
+# DEBUG says. PLANNER_TEMPLATE_RELOAD=True re-reads them from disk on every
+# render and stops caching dashboard plan cards, for editing templates
+# without restarting the server.
+PLANNER_TEMPLATE_RELOAD = os.environ.get('PLANNER_TEMPLATE_RELOAD', 'False') == 'True'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for RequestMetricsMiddleware
+        'BACKEND': 'planner.template_backends.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': (
+                TEMPLATE_LOADERS if PLANNER_TEMPLATE_RELOAD
+                else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+            ),
         },
     },
 ]
@@ -94,14 +113,165 @@ WSGI_APPLICATION = 'plananything.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Pick a profile with PLANNER_DB_PROFILE:
+#   sqlite         - the default. WAL journal so readers don't block the
+#                    writer, a busy timeout instead of immediate "database is
+#                    locked" errors, and BEGIN IMMEDIATE so a transaction takes
+#                    the write lock up front rather than failing on upgrade.
+#   sqlite-default - Django's stock SQLite settings, kept for comparison in
+#                    `manage.py benchmark_db_writes`.
+#   postgres       - PostgreSQL (needs psycopg). Connections are kept for
+#                    POSTGRES_CONN_MAX_AGE seconds and health-checked before
+#                    reuse, or with POSTGRES_POOL=True taken from a psycopg
+#                    pool instead (persistent connections are then disabled,
+#                    as Django requires).
+PLANNER_DB_PROFILE = os.environ.get('PLANNER_DB_PROFILE', 'sqlite')
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    # Durable at every checkpoint; safe with WAL and much cheaper than FULL
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA mmap_size=134217728',
+]
+
+if PLANNER_DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Reuse connections so the pragmas aren't re-run on every request
+            'CONN_MAX_AGE': int(os.environ.get('SQLITE_CONN_MAX_AGE', '600')),
+            'OPTIONS': {
+                'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(SQLITE_PRAGMAS),
+            },
+        }
     }
+elif PLANNER_DB_PROFILE == 'sqlite-default':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+elif PLANNER_DB_PROFILE == 'postgres':
+    POSTGRES_POOL = os.environ.get('POSTGRES_POOL', 'False') == 'True'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'plananything'),
+            'USER': os.environ.get('POSTGRES_USER', 'plananything'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if POSTGRES_POOL else int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': 5,
+                # Fail runaway statements rather than holding locks indefinitely
+                'options': f"-c statement_timeout={os.environ.get('POSTGRES_STATEMENT_TIMEOUT_MS', '30000')}",
+            },
+        }
+    }
+    if POSTGRES_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.environ.get('POSTGRES_POOL_TIMEOUT', '10')),
+        }
+else:
+    raise ImproperlyConfigured(f"Unknown PLANNER_DB_PROFILE {PLANNER_DB_PROFILE!r}; use sqlite, sqlite-default or postgres")
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# 'llm' holds model replies (see planner.chatbot.response_cache_key). The
+# local-memory backend evicts least-recently-used entries past MAX_ENTRIES.
+# 'template_fragments' is where {% cache %} keeps rendered dashboard plan
+# cards, apart from the calendar grids in 'default'.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'llm': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'llm-responses',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CHATBOT_RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('PLANNER_FRAGMENT_CACHE_MAX_ENTRIES', '5000')),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'sessions': (
+        {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('PLANNER_SESSION_CACHE_DIR', BASE_DIR / 'cache' / 'sessions'),
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('PLANNER_SESSION_CACHE_MAX_ENTRIES', '10000'))},
+        }
+        if os.environ.get('PLANNER_SESSION_CACHE', 'locmem') == 'file' else
+        {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sessions',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('PLANNER_SESSION_CACHE_MAX_ENTRIES', '10000'))},
+        }
+    ),
 }
 
 
+# Sessions and authentication
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+#
+# Pick a session store with PLANNER_SESSION_ENGINE:
+#   cached_db - the default. Sessions are written to the database and read
+#               from the 'sessions' cache, so a request only queries
+#               django_session on a cache miss.
+#   cache     - the cache only, no database writes either. With the
+#               local-memory cache sessions are per process and lost on
+#               restart; use PLANNER_SESSION_CACHE=file to share them
+#               between worker processes on one host.
+#   db        - Django's stock database sessions.
+SESSION_ENGINES = {
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'db': 'django.contrib.sessions.backends.db',
+}
+PLANNER_SESSION_ENGINE = os.environ.get('PLANNER_SESSION_ENGINE', 'cached_db')
+if PLANNER_SESSION_ENGINE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f"Unknown PLANNER_SESSION_ENGINE {PLANNER_SESSION_ENGINE!r}; use {', '.join(SESSION_ENGINES)}"
+    )
+SESSION_ENGINE = SESSION_ENGINES[PLANNER_SESSION_ENGINE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# request.user is loaded through CachedModelBackend, which keeps user objects
+# in PLANNER_USER_CACHE_ALIAS for PLANNER_USER_CACHE_TIMEOUT seconds (0
+# turns it off). Saving or deleting a user, which includes password and
+# profile changes, evicts it in this process; other processes of a
+# local-memory cache see the change once the entry expires, so keep the
+# timeout short or point the alias at a shared cache. ModelBackend stays
+# listed so sessions that logged in through it remain valid; new logins use
+# the cached backend.
+AUTHENTICATION_BACKENDS = [
+    'planner.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+PLANNER_USER_CACHE_ALIAS = os.environ.get('PLANNER_USER_CACHE_ALIAS', 'default')
+PLANNER_USER_CACHE_TIMEOUT = int(os.environ.get('PLANNER_USER_CACHE_TIMEOUT', '60'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,6 +296,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 LANGUAGE_CODE = 'en-us'
 
+# Used when a request has no valid tz cookie (planner.middleware.TimezoneMiddleware)
 TIME_ZONE = 'UTC'
 
 USE_I18N = True
@@ -153,3 +324,120 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+#
+# 'planner.requests' gets one JSON line per request from
+# RequestMetricsMiddleware, plus warnings for exceeded query budgets.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'planner': {
+            'handlers': ['console'],
+            'level': os.environ.get('PLANNER_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
+# Planner settings
+# Keep task_count/completed_task_count columns on Plan updated on every task
+# write instead of counting per request. Run `manage.py rebuild_task_counts`
+# after turning this on for an existing database.
+PLANNER_DENORMALIZED_TASK_COUNTS = os.environ.get('PLANNER_DENORMALIZED_TASK_COUNTS', 'False') == 'True'
+
+# Seconds a rendered plan calendar month grid stays in the cache. Grids are
+# keyed on the state of the month's tasks, so edits never show a stale grid.
+PLANNER_CALENDAR_CACHE_TIMEOUT = int(os.environ.get('PLANNER_CALENDAR_CACHE_TIMEOUT', '3600'))
+
+# Seconds a rendered dashboard plan card stays cached. Cards are keyed on
+# the plan's updated_at and task counts, so edits never show a stale card.
+PLANNER_PLAN_CARD_CACHE_TIMEOUT = int(os.environ.get(
+    'PLANNER_PLAN_CARD_CACHE_TIMEOUT', '0' if PLANNER_TEMPLATE_RELOAD else '3600'
+))
+
+# Per-view SQL query budgets, keyed by URL name. Each includes the session
+# and user lookups of a request that finds them uncached. Exceeding one logs
+# a warning, or raises QueryBudgetExceeded when PLANNER_QUERY_BUDGET_STRICT is on.
+PLANNER_QUERY_BUDGETS = {
+    'dashboard': 5,
+    'plan_detail': 7,
+    'plan_month_tasks': 7,
+    'task_toggle_status': 7,
+    'task_batch_update': 8,
+    'chatbot': 6,
+    'chatbot_accept_plan': 10,
+    'chatbot_submit_message': 7,
+    'chatbot_job_status': 4,
+    'dashboard_plans': 3,
+    'chatbot_messages': 4,
+    'chatbot_proposed_plans': 4,
+    'search': 6,
+    'search_results': 6,
+    'plan_export': 3,
+    'plans_export': 2,
+    'overdue_tasks': 4,
+    'overdue_badge': 3,
+    'agenda': 4,
+    'agenda_tasks': 2,
+}
+PLANNER_QUERY_BUDGET_STRICT = os.environ.get('PLANNER_QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# Chatbot settings
+# LLM backend, selected from CHATBOT_PROVIDERS. 'fake' is a deterministic
+# offline backend for development, CI and load tests.
+CHATBOT_PROVIDER = os.environ.get('CHATBOT_PROVIDER', 'gemini')
+CHATBOT_PROVIDERS = {
+    'gemini': {
+        'CLASS': 'planner.llm.GeminiProvider',
+        'OPTIONS': {
+            'api_key': os.environ.get('GEMINI_API_KEY'),
+            # Point at another endpoint (e.g. `manage.py fake_model_server`)
+            'base_url': os.environ.get('GEMINI_BASE_URL'),
+            'model': 'gemini-2.5-flash',
+        },
+    },
+    'fake': {
+        'CLASS': 'planner.llm.FakeProvider',
+        'OPTIONS': {
+            'latency': float(os.environ.get('FAKE_LLM_LATENCY', '0')),
+            'chunk_delay': float(os.environ.get('FAKE_LLM_CHUNK_DELAY', '0')),
+            'plan_days': int(os.environ.get('FAKE_LLM_PLAN_DAYS', '3')),
+        },
+    },
+}
+# Maximum in-flight Gemini calls per process, and how long (seconds) a chat
+# request waits for a free slot before being told the assistant is busy.
+CHATBOT_MAX_CONCURRENT_REQUESTS = int(os.environ.get('CHATBOT_MAX_CONCURRENT_REQUESTS', '8'))
+CHATBOT_QUEUE_TIMEOUT = float(os.environ.get('CHATBOT_QUEUE_TIMEOUT', '10'))
+# Conversation context sent to the model: the newest messages are kept
+# verbatim within these limits and older ones are folded into a summary.
+CHATBOT_CONTEXT_MAX_MESSAGES = int(os.environ.get('CHATBOT_CONTEXT_MAX_MESSAGES', '20'))
+CHATBOT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHATBOT_CONTEXT_TOKEN_BUDGET', '8000'))
+CHATBOT_SUMMARY_BATCH = 40
+CHATBOT_SUMMARY_MAX_WORDS = 300
+# Cache successful model replies keyed on the normalized conversation state
+CHATBOT_RESPONSE_CACHE = os.environ.get('CHATBOT_RESPONSE_CACHE', 'True') == 'True'
+CHATBOT_RESPONSE_CACHE_ALIAS = 'llm'
+CHATBOT_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('CHATBOT_RESPONSE_CACHE_TIMEOUT', '3600'))
+# Queued chat turns (chatbot/jobs/, answered by `manage.py run_chat_workers`).
+# Submissions are refused with 503 + Retry-After once CHATBOT_JOB_QUEUE_LIMIT
+# jobs are waiting or running. Failed model calls are retried with jittered
+# exponential backoff; a job whose worker vanished is retried after the lease.
+CHATBOT_JOB_QUEUE_LIMIT = int(os.environ.get('CHATBOT_JOB_QUEUE_LIMIT', '100'))
+CHATBOT_JOB_RETRY_AFTER = 5
+CHATBOT_JOB_MAX_ATTEMPTS = int(os.environ.get('CHATBOT_JOB_MAX_ATTEMPTS', '3'))
+CHATBOT_JOB_RETRY_BACKOFF = 2
+CHATBOT_JOB_RETRY_BACKOFF_MAX = 60
+CHATBOT_JOB_LEASE_SECONDS = 300
+# Conversations idle this long are compacted into one compressed ChatArchive
+# row by `manage.py archive_chats` and restored when reopened.
+CHATBOT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CHATBOT_ARCHIVE_AFTER_DAYS', '30'))
+CHATBOT_ARCHIVE_BATCH_SIZE = 500
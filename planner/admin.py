@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Plan, Task, ChatConversation, ChatMessage, ProposedPlan
+from .models import Plan, Task, TaskSeries, ChatConversation, ChatMessage, ProposedPlan, ChatJob
 
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
@@ -13,10 +13,16 @@ class TaskAdmin(admin.ModelAdmin):
     list_filter = ['status', 'task_date', 'plan']
     search_fields = ['title', 'description']
 
+@admin.register(TaskSeries)
+class TaskSeriesAdmin(admin.ModelAdmin):
+    list_display = ['title', 'plan', 'frequency', 'interval', 'start_date', 'until', 'occurrence_count']
+    list_filter = ['frequency', 'start_date']
+    search_fields = ['title', 'description']
+
 @admin.register(ChatConversation)
 class ChatConversationAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'created_at', 'updated_at']
-    list_filter = ['user', 'created_at']
+    list_display = ['id', 'user', 'created_at', 'updated_at', 'archived_at']
+    list_filter = ['user', 'created_at', 'archived_at']
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
@@ -29,3 +35,10 @@ class ProposedPlanAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'is_accepted', 'created_at']
     list_filter = ['is_accepted', 'created_at']
     search_fields = ['title', 'description']
+
+
+@admin.register(ChatJob)
+class ChatJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'conversation', 'status', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['locked_by', 'locked_at', 'last_error']
@@ -0,0 +1,123 @@
+"""
+Cross-plan agenda: everything a user has due today or this week, across all
+of their plans, grouped by day.
+
+Tasks come from one query joining Task to Plan on plan.user and task_date,
+which SQLite and PostgreSQL answer with a range scan of task_plan_date_idx
+per plan. The occurrences of recurring series in the range are merged in
+date order. Both are iterated, never loaded in full, so the JSON endpoint
+can stream a week with thousands of tasks.
+"""
+import heapq
+import json
+from datetime import timedelta
+from itertools import groupby
+
+from django.db.models import F
+from django.urls import reverse
+
+from . import recurrence
+from .models import Task, TaskSeries
+
+TODAY, WEEK = 'today', 'week'
+RANGES = (TODAY, WEEK)
+ITERATOR_CHUNK_SIZE = 2000
+# Stands in for the task id when reversing the edit URL once per response
+_ID_PLACEHOLDER = 2147483647
+
+
+def date_range(name, day):
+    """(start, end) of the range containing day; weeks run Monday to Sunday."""
+    if name == WEEK:
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    return day, day
+
+
+def _tasks(user, start, end, today):
+    return (
+        Task.objects.filter(plan__user=user, task_date__range=(start, end))
+        .with_overdue(today)
+        .annotate(plan_title=F('plan__title'), plan_color=F('plan__color'))
+        .only('id', 'plan_id', 'title', 'status', 'task_date')
+        .order_by('task_date', 'plan_id', 'id')
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+
+
+def _occurrences(user, start, end):
+    series_list = list(
+        TaskSeries.objects.filter(plan__user=user, start_date__lte=end, until__gte=start)
+        .annotate(plan_title=F('plan__title'), plan_color=F('plan__color'))
+    )
+    if not series_list:
+        return []
+    overrides = recurrence.overrides_by_series([series.id for series in series_list], start, end)
+    occurrences = []
+    for series in series_list:
+        for occurrence in recurrence.expand(series, start, end, overrides[series.id]):
+            occurrence.plan_title = series.plan_title
+            occurrence.plan_color = series.plan_color
+            occurrences.append(occurrence)
+    occurrences.sort(key=lambda occurrence: (occurrence.task_date, occurrence.plan_id, occurrence.series_id))
+    return occurrences
+
+
+def agenda_items(user, start, end, today):
+    """The user's tasks and series occurrences within [start, end], by date then plan."""
+    return heapq.merge(
+        _tasks(user, start, end, today), _occurrences(user, start, end),
+        key=lambda task: (task.task_date, task.plan_id),
+    )
+
+
+def agenda_days(user, start, end, today):
+    """
+    (date, items) for every day of [start, end], including empty ones.
+    items is lazy, so consume it before moving on to the next day.
+    """
+    groups = groupby(agenda_items(user, start, end, today), key=lambda task: task.task_date)
+    pending = next(groups, None)
+    day = start
+    while day <= end:
+        if pending is not None and pending[0] == day:
+            yield pending
+            pending = next(groups, None)
+        else:
+            yield day, iter(())
+        day += timedelta(days=1)
+
+
+def task_url_template():
+    """task_edit's URL with '{}' for the id; reverse() per task would dominate a busy week."""
+    return reverse('task_edit', args=[_ID_PLACEHOLDER]).replace(str(_ID_PLACEHOLDER), '{}')
+
+
+def item_dict(task, task_url):
+    return {
+        'id': task.id,
+        'series_id': getattr(task, 'series_id', None),
+        'title': task.title,
+        'status': task.status,
+        'is_overdue': task.is_overdue(),
+        'plan_id': task.plan_id,
+        'plan_title': task.plan_title,
+        'plan_color': task.plan_color,
+        'edit_url': task_url.format(task.id) if task.id else task.edit_url(),
+    }
+
+
+def export_json(user, range_name, start, end, today):
+    """The agenda as JSON, one chunk per day."""
+    header = json.dumps({
+        'range': range_name,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'today': today.isoformat(),
+    })
+    yield header[:-1] + ',\n"days": ['
+    task_url = task_url_template()
+    for index, (day, items) in enumerate(agenda_days(user, start, end, today)):
+        tasks = ',\n'.join(json.dumps(item_dict(task, task_url)) for task in items)
+        yield (',\n' if index else '\n') + f'{{"date": "{day.isoformat()}", "tasks": [{tasks}]}}'
+    yield '\n]}\n'
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PlannerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'planner'
+
+    def ready(self):
+        # Connect signal receivers (query counting, search indexing, photo
+        # variant cleanup, user cache invalidation)
+        from . import instrumentation  # noqa: F401
+        from . import signals  # noqa: F401
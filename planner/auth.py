@@ -0,0 +1,45 @@
+"""
+Authentication backend that caches user objects.
+
+AuthenticationMiddleware loads request.user through the session's backend
+on every request. CachedModelBackend answers that from a cache for
+PLANNER_USER_CACHE_TIMEOUT seconds instead of querying auth_user each
+time. signals.py evicts a user's entry whenever the user is saved or
+deleted, which covers password changes, profile edits, deactivation and
+the last_login update on login.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def _user_cache():
+    if not getattr(settings, 'PLANNER_USER_CACHE_TIMEOUT', 0):
+        return None
+    return caches[getattr(settings, 'PLANNER_USER_CACHE_ALIAS', 'default')]
+
+
+def invalidate_user(user_id):
+    cache = _user_cache()
+    if cache is not None:
+        cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        cache = _user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, timeout=settings.PLANNER_USER_CACHE_TIMEOUT)
+            return user
+        # Re-checked on every hit, as ModelBackend does after its query
+        return user if self.user_can_authenticate(user) else None
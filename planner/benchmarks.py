@@ -0,0 +1,277 @@
+"""
+View benchmarks driven through the Django test client.
+
+Each Benchmark subclass exercises one view against seeded data (see
+planner.seeding) and is measured for latency, SQL query count and peak
+Python memory by run_benchmarks(). Run them with `manage.py benchmark`.
+
+write_load() drives concurrent task toggles and chat submissions for
+`manage.py benchmark_db_writes`, which compares database profiles.
+"""
+import json
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Plan, Task, ChatConversation, ProposedPlan
+
+BENCHMARKS = {}
+
+
+def register(cls):
+    BENCHMARKS[cls.name] = cls
+    return cls
+
+
+class BenchmarkContext:
+    """The logged-in client plus the heaviest objects of the benchmark user."""
+
+    def __init__(self, user):
+        self.user = user
+        self.client = Client()
+        self.client.force_login(user)
+        self.plan = (
+            Plan.objects.filter(user=user).with_task_stats()
+            .order_by('-task_total', 'id').first()
+        )
+        self.task = Task.objects.filter(plan=self.plan).order_by('id').first() if self.plan else None
+        self.conversation = ChatConversation.objects.filter(user=user).order_by('-updated_at').first()
+
+
+class Benchmark:
+    name = ''
+    method = 'get'
+    # p95 latency the benchmark must stay under, or None
+    budget_ms = None
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def prepare(self):
+        """Untimed per-iteration setup; returns the URL to request."""
+        raise NotImplementedError
+
+    def request(self, url):
+        return getattr(self.ctx.client, self.method)(url)
+
+
+@register
+class DashboardBenchmark(Benchmark):
+    name = 'dashboard'
+
+    def prepare(self):
+        return reverse('dashboard')
+
+
+@register
+class PlanDetailBenchmark(Benchmark):
+    name = 'plan_detail'
+
+    def prepare(self):
+        # Month with the plan's densest stretch of tasks
+        start = self.ctx.plan.start_date + timedelta(days=15)
+        return f"{reverse('plan_detail', args=[self.ctx.plan.id])}?year={start.year}&month={start.month}"
+
+
+@register
+class TaskToggleBenchmark(Benchmark):
+    name = 'task_toggle_status'
+    method = 'post'
+
+    def prepare(self):
+        return reverse('task_toggle_status', args=[self.ctx.task.id])
+
+
+@register
+class OverdueTasksBenchmark(Benchmark):
+    name = 'overdue_tasks'
+
+    def prepare(self):
+        return reverse('overdue_tasks')
+
+
+@register
+class AgendaTasksBenchmark(Benchmark):
+    name = 'agenda_tasks'
+    budget_ms = 100
+
+    def prepare(self):
+        # The week with the plan's densest stretch of tasks
+        day = self.ctx.plan.start_date + timedelta(days=15)
+        return f"{reverse('agenda_tasks')}?range=week&date={day.isoformat()}"
+
+    def request(self, url):
+        response = super().request(url)
+        # Time the streamed body too, which is where the queries run
+        b''.join(response.streaming_content)
+        return response
+
+
+@register
+class ChatbotViewBenchmark(Benchmark):
+    name = 'chatbot_view'
+
+    def prepare(self):
+        return reverse('chatbot')
+
+
+@register
+class AcceptPlanBenchmark(Benchmark):
+    name = 'chatbot_accept_plan'
+    method = 'post'
+    proposal_tasks = 30
+
+    def prepare(self):
+        start = self.ctx.plan.start_date
+        proposal = ProposedPlan.objects.create(
+            conversation=self.ctx.conversation,
+            user=self.ctx.user,
+            title='Benchmark proposal',
+            start_date=start,
+            end_date=start + timedelta(days=self.proposal_tasks - 1),
+            tasks_data=[
+                {
+                    'title': f"Task {i}",
+                    'description': 'Benchmark task',
+                    'task_date': (start + timedelta(days=i)).isoformat(),
+                    'status': 'pending',
+                }
+                for i in range(self.proposal_tasks)
+            ],
+        )
+        return reverse('chatbot_accept_plan', args=[proposal.id])
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def run_benchmark(benchmark, iterations=20, warmup=3, memory_iterations=3):
+    """Measure one benchmark; returns a JSON-serializable dict of results."""
+    for _ in range(warmup):
+        benchmark.request(benchmark.prepare())
+
+    latencies = []
+    queries = []
+    status_codes = set()
+    for _ in range(iterations):
+        url = benchmark.prepare()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = benchmark.request(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        status_codes.add(response.status_code)
+
+    # Memory is measured in a separate pass since tracemalloc skews timings
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(memory_iterations):
+            url = benchmark.prepare()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            benchmark.request(url)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'iterations': iterations,
+        'status_codes': sorted(status_codes),
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries': max(queries),
+        'peak_memory_kb': round(max(peaks) / 1024, 1),
+    }
+    if benchmark.budget_ms is not None:
+        result['budget_ms'] = benchmark.budget_ms
+    return result
+
+
+def run_benchmarks(user, names=None, **options):
+    ctx = BenchmarkContext(user)
+    results = {}
+    for name in names or BENCHMARKS:
+        results[name] = run_benchmark(BENCHMARKS[name](ctx), **options)
+    return results
+
+
+def compare_results(baseline, current, max_regression=0.2):
+    """
+    Compare two result dicts from run_benchmarks. Returns a list of
+    (name, metric, old, new, regressed) rows for every shared benchmark.
+    """
+    rows = []
+    for name, result in current.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries', 'peak_memory_kb'):
+            before, after = old[metric], result[metric]
+            if metric == 'queries':
+                regressed = after > before
+            else:
+                regressed = after > before * (1 + max_regression)
+            rows.append((name, metric, before, after, regressed))
+    return rows
+
+
+def write_load(user, operations):
+    """
+    Issue `operations` requests as `user` that toggle their tasks or queue
+    chat turns. Returns (latencies_ms, errors) with one error string per
+    failed write (e.g. "database is locked").
+    """
+    client = Client()
+    client.force_login(user)
+    task_ids = list(Task.objects.filter(plan__user=user).order_by('id').values_list('id', flat=True)[:50])
+    conversation_id = ChatConversation.objects.filter(user=user).values_list('id', flat=True).first()
+    toggle_urls = [reverse('task_toggle_status', args=[task_id]) for task_id in task_ids]
+    chat_url = reverse('chatbot_submit_message')
+    chat_body = json.dumps({'message': 'Benchmark message', 'conversation_id': conversation_id})
+
+    latencies = []
+    errors = []
+    for i in range(operations):
+        started = time.perf_counter()
+        try:
+            # Two toggles per chat turn
+            if i % 3 == 2:
+                response = client.post(chat_url, chat_body, content_type='application/json')
+            else:
+                response = client.post(toggle_urls[i % len(toggle_urls)])
+        except OperationalError as e:
+            errors.append(str(e))
+            continue
+        if response.status_code >= 400:
+            errors.append(f"HTTP {response.status_code}")
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, errors
+
+
+def summarize_writes(writers, operations, seconds, latencies, errors):
+    error_kinds = {}
+    for error in errors:
+        error_kinds[error] = error_kinds.get(error, 0) + 1
+    succeeded = writers * operations - len(errors)
+    return {
+        'writers': writers,
+        'operations': writers * operations,
+        'succeeded': succeeded,
+        'failed': len(errors),
+        'errors': error_kinds,
+        'seconds': round(seconds, 3),
+        'writes_per_second': round(succeeded / seconds, 1),
+        'p50_ms': round(_percentile(latencies, 50), 3) if latencies else None,
+        'p95_ms': round(_percentile(latencies, 95), 3) if latencies else None,
+    }
@@ -0,0 +1,38 @@
+"""
+Cache of rendered plan calendar month grids.
+
+A grid's key includes the state of what it shows: the plan's updated_at
+and the count and latest updated_at of its tasks and task series in the
+grid's date range, read in the same aggregate query that makes
+plan_detail's ETag. Any change to the month therefore gives a new key in
+every worker process, with no invalidation step that a per-process cache
+could miss. Stale grids are never read again and age out on their own.
+
+The trade-off is deliberate: a cache hit still costs that one aggregate
+query (which the ETag needs anyway) and only saves loading the month's
+tasks and rendering the grid, in exchange for never serving a stale grid.
+"""
+import calendar
+import hashlib
+
+from django.conf import settings
+
+
+def month_grid_range(year, month):
+    """First and last date shown in the month grid, including adjacent-month days."""
+    weeks = calendar.Calendar().monthdatescalendar(year, month)
+    return weeks[0][0], weeks[-1][-1]
+
+
+def grid_cache_key(plan_id, year, month, today, state):
+    """
+    Key of the rendered grid. state is the month's aggregate (see
+    views._plan_grid_state); today is included since it drives
+    highlighting and overdue state.
+    """
+    digest = hashlib.sha256(repr(tuple(state)).encode()).hexdigest()[:32]
+    return f"plan-grid:{plan_id}:{year}:{month}:{today.isoformat()}:{digest}"
+
+
+def grid_cache_timeout():
+    return getattr(settings, 'PLANNER_CALENDAR_CACHE_TIMEOUT', 3600)
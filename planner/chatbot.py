@@ -1,12 +1,34 @@
-import os
 import json
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from asgiref.sync import sync_to_async
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from google import genai
-from google.genai import types
+from django.conf import settings
+from django.core.cache import caches
 from django.utils import timezone
 
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
+from . import recurrence
+from .instrumentation import timed
+from .llm import get_provider
+
+# Process-wide cap on in-flight upstream model calls. A threading semaphore is
+# used (rather than asyncio.Semaphore) so the limit holds across event loops
+# and between the sync and async chat views.
+_upstream_slots = threading.BoundedSemaphore(
+    getattr(settings, 'CHATBOT_MAX_CONCURRENT_REQUESTS', 8)
+)
+
+
+class AssistantBusyError(Exception):
+    """Raised when no upstream slot frees up within CHATBOT_QUEUE_TIMEOUT."""
+
+
+class AssistantStreamError(Exception):
+    """Raised when the provider fails part-way through a streamed reply."""
 
 SYSTEM_PROMPT = """You are PlanAnything Assistant, a helpful AI that ONLY helps users create new plans and itineraries for trips, workouts, or any other activities.
 
@@ -43,62 +65,456 @@ When you have gathered enough information and are ready to propose a plan, respo
   }
 }
 
+For a task that repeats (a daily workout, a weekly review, a monthly check-in), send ONE task with a "repeat" object instead of one task per date. Its task_date is the first occurrence:
+      {
+        "title": "Morning run",
+        "description": "30 minutes easy pace",
+        "task_date": "YYYY-MM-DD",
+        "repeat": {"frequency": "weekly", "interval": 1, "weekdays": ["mon", "wed", "fri"], "until": "YYYY-MM-DD"}
+      }
+frequency is "daily", "weekly" or "monthly"; interval repeats every N days, weeks or months (default 1); weekdays is only for weekly tasks; until is the last possible date and defaults to the plan's end_date.
+
 The color should be a hex color code (default: #3B82F6 for blue, #10B981 for green, #F59E0B for amber, #EF4444 for red, #8B5CF6 for purple).
 
 Before sending the JSON, ask if the user wants any changes. Only send the JSON format when the user confirms they're ready to create the plan."""
 
-def chat_with_assistant(messages):
+@asynccontextmanager
+async def upstream_slot():
+    """Hold one of the process-wide upstream slots without blocking the event loop."""
+    deadline = time.monotonic() + getattr(settings, 'CHATBOT_QUEUE_TIMEOUT', 10)
+    while not _upstream_slots.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            raise AssistantBusyError("The assistant is busy, please try again in a moment.")
+        await asyncio.sleep(0.05)
+    try:
+        yield
+    finally:
+        _upstream_slots.release()
+
+def _system_instruction(summary=''):
+    if summary:
+        return SYSTEM_PROMPT + f"\n\nSummary of the earlier part of this conversation:\n{summary}"
+    return SYSTEM_PROMPT
+
+def _normalize_text(text):
+    return ' '.join(text.split()).casefold()
+
+def response_cache_key(messages, summary=''):
     """
-    Send messages to Gemini and get a response.
-    messages should be a list of dicts with 'role' and 'content' keys.
+    Cache key for a model reply: a hash of the system prompt, model name,
+    today's date, summary and message history, with whitespace and case
+    normalized so near-identical prompts share an entry. The date keeps
+    replies that resolved "tomorrow" or "next Monday" from outliving the day.
     """
-    try:
-        contents = []
-        for msg in messages:
-            role = "user" if msg['role'] == 'user' else "model"
-            contents.append(types.Content(role=role, parts=[types.Part(text=msg['content'])]))
-        
-        generation_config = types.GenerationConfig(
-            max_output_tokens=2048
-        )
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=contents,
-            system_instruction=SYSTEM_PROMPT,
-            generation_config=generation_config
+    state = {
+        'system': SYSTEM_PROMPT,
+        'date': timezone.localdate().isoformat(),
+        'model': get_provider().model_name,
+        'summary': _normalize_text(summary),
+        'messages': [[msg['role'], _normalize_text(msg['content'])] for msg in messages],
+    }
+    digest = hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+    return f"chat-response:{digest}"
+
+def _response_cache():
+    if not getattr(settings, 'CHATBOT_RESPONSE_CACHE', True):
+        return None
+    return caches[getattr(settings, 'CHATBOT_RESPONSE_CACHE_ALIAS', 'default')]
+
+# Kept apart from the responses so culling entries doesn't reset them
+_cache_stats = {'hits': 0, 'misses': 0}
+_cache_stats_lock = threading.Lock()
+
+def _count(name):
+    with _cache_stats_lock:
+        _cache_stats[name] += 1
+
+def response_cache_stats():
+    """
+    Hit and miss counters for the model response cache, counted by this
+    process since it started (each worker process has its own).
+    """
+    if _response_cache() is None:
+        return {'enabled': False, 'hits': 0, 'misses': 0}
+    with _cache_stats_lock:
+        return {'enabled': True, **_cache_stats}
+
+def _cached_response(messages, summary):
+    cache = _response_cache()
+    if cache is None:
+        return None
+    text = cache.get(response_cache_key(messages, summary))
+    _count('hits' if text is not None else 'misses')
+    return text
+
+def _cache_response(messages, summary, text):
+    cache = _response_cache()
+    if cache is not None:
+        cache.set(
+            response_cache_key(messages, summary),
+            text,
+            timeout=getattr(settings, 'CHATBOT_RESPONSE_CACHE_TIMEOUT', 3600)
         )
-        
-        return response.text or "I'm sorry, I couldn't generate a response."
+
+def generate_reply(messages, summary=''):
+    """
+    Like chat_with_assistant, but raises instead of returning an apology:
+    AssistantBusyError if no upstream slot frees up, or whatever the provider
+    raised. Used by the job queue, which retries failed calls.
+    """
+    cached = _cached_response(messages, summary)
+    if cached is not None:
+        return cached
+    
+    if not _upstream_slots.acquire(timeout=getattr(settings, 'CHATBOT_QUEUE_TIMEOUT', 10)):
+        raise AssistantBusyError("The assistant is busy, please try again in a moment.")
+    try:
+        with timed('llm'):
+            text = get_provider().generate(messages, _system_instruction(summary), 2048)
+    finally:
+        _upstream_slots.release()
+    
+    if not text:
+        return "I'm sorry, I couldn't generate a response."
+    _cache_response(messages, summary, text)
+    return text
+
+def chat_with_assistant(messages, summary=''):
+    """
+    Send messages to the configured LLM provider and get a response.
+    messages should be a list of dicts with 'role' and 'content' keys;
+    summary is the rolling summary of older turns (see build_message_history).
+    Successful replies are cached (see response_cache_key); errors are not.
+    """
+    try:
+        return generate_reply(messages, summary)
+    except AssistantBusyError:
+        return "I'm sorry, the assistant is busy right now. Please try again in a moment."
     except Exception as e:
         return f"I'm sorry, I encountered an error: {str(e)}"
 
-def parse_plan_proposal(response_text):
+async def stream_chat_with_assistant(messages, summary=''):
+    """
+    Async generator yielding the assistant's response in text chunks as they
+    arrive from the LLM provider. A cached reply is yielded as a single chunk.
+    Raises AssistantBusyError if no upstream slot is available, and
+    AssistantStreamError if the provider fails, so the chunks already
+    yielded are never taken for a whole reply.
     """
-    Try to extract a plan proposal from the assistant's response.
-    Returns None if no valid plan proposal is found.
+    cached = await sync_to_async(_cached_response)(messages, summary)
+    if cached is not None:
+        yield cached
+        return
+    
+    async with upstream_slot():
+        chunks = []
+        try:
+            async for text in get_provider().stream(messages, _system_instruction(summary), 2048):
+                chunks.append(text)
+                yield text
+        except Exception as e:
+            raise AssistantStreamError(f"I'm sorry, I encountered an error: {str(e)}") from e
+    
+    if not chunks:
+        yield "I'm sorry, I couldn't generate a response."
+        return
+    await sync_to_async(_cache_response)(messages, summary, ''.join(chunks))
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and PlanAnything Assistant, a planning assistant.
+Update the existing summary with the new messages. Keep every detail needed to continue planning: destinations or activities, dates and durations, preferences, constraints, and any plan that was proposed or changed.
+Reply with the updated summary only, in plain prose, under {max_words} words."""
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for context budgeting."""
+    return len(text) // 4 + 1
+
+def summarize_messages(previous_summary, messages):
     """
+    Fold messages (dicts with 'role' and 'content') into previous_summary.
+    Returns the new summary, or None if the model call failed.
+    """
+    max_words = getattr(settings, 'CHATBOT_SUMMARY_MAX_WORDS', 300)
+    transcript = "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+        for msg in messages
+    )
+    prompt = f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    
+    if not _upstream_slots.acquire(timeout=getattr(settings, 'CHATBOT_QUEUE_TIMEOUT', 10)):
+        return None
     try:
-        response_text = response_text.strip()
+        with timed('llm'):
+            text = get_provider().generate(
+                [{'role': 'user', 'content': prompt}],
+                SUMMARY_PROMPT.format(max_words=max_words),
+                1024
+            )
+        return text.strip() or None
+    except Exception:
+        return None
+    finally:
+        _upstream_slots.release()
+
+def _fit_window(messages, max_messages, token_budget):
+    """
+    Newest messages (oldest first) that fit in max_messages and token_budget.
+    The window always starts on a user turn.
+    """
+    kept = []
+    tokens = 0
+    for msg in reversed(messages):
+        cost = estimate_tokens(msg.content)
+        if kept and (len(kept) >= max_messages or tokens + cost > token_budget):
+            break
+        kept.append(msg)
+        tokens += cost
+    kept.reverse()
+    while len(kept) > 1 and kept[0].role != 'user':
+        kept.pop(0)
+    return kept
+
+def build_message_history(conversation, up_to=None):
+    """
+    Build the context for the next model call as (summary, message_history).
+
+    The newest turns are kept verbatim within CHATBOT_CONTEXT_MAX_MESSAGES and
+    CHATBOT_CONTEXT_TOKEN_BUDGET. When older unsummarized turns fall outside
+    that window, they are folded into conversation.summary together with the
+    older half of the window, so folding happens every few turns rather than
+    on every request. At most CHATBOT_SUMMARY_BATCH messages are folded per
+    call, which bounds the work done for very long legacy conversations.
+    With up_to, messages after that ChatMessage id are left out (used by the
+    job queue when later turns were submitted before this one ran).
+    """
+    from .models import ChatConversation
+    
+    max_messages = getattr(settings, 'CHATBOT_CONTEXT_MAX_MESSAGES', 20)
+    token_budget = getattr(settings, 'CHATBOT_CONTEXT_TOKEN_BUDGET', 8000)
+    batch_size = getattr(settings, 'CHATBOT_SUMMARY_BATCH', 40)
+    
+    unsummarized = conversation.messages.filter(id__gt=conversation.summarized_until).only('id', 'role', 'content')
+    if up_to is not None:
+        unsummarized = unsummarized.filter(id__lte=up_to)
+    # One extra row tells us whether anything older falls outside the window
+    recent = list(unsummarized.order_by('-id')[:max_messages + 1])
+    recent.reverse()
+    window = _fit_window(recent, max_messages, token_budget)
+    
+    if window and len(window) < len(recent):
+        retained = _fit_window(window, max(max_messages // 2, 1), token_budget // 2)
+        to_fold = list(unsummarized.filter(id__lt=retained[0].id).order_by('id')[:batch_size])
+        summary = summarize_messages(
+            conversation.summary,
+            [{'role': msg.role, 'content': msg.content} for msg in to_fold]
+        ) if to_fold else None
         
-        if '```json' in response_text:
-            start = response_text.find('```json') + 7
-            end = response_text.find('```', start)
-            json_text = response_text[start:end].strip()
-        elif '```' in response_text:
-            start = response_text.find('```') + 3
-            end = response_text.find('```', start)
-            json_text = response_text[start:end].strip()
-        elif response_text.startswith('{'):
-            json_text = response_text
-        else:
+        if summary is not None:
+            folded_until = to_fold[-1].id
+            # Conditional update so concurrent requests don't fold the same turns twice
+            ChatConversation.objects.filter(
+                pk=conversation.pk, summarized_until=conversation.summarized_until
+            ).update(summary=summary, summarized_until=folded_until)
+            conversation.summary = summary
+            conversation.summarized_until = folded_until
+            # A full batch may stop short of the retained half or reach into it;
+            # either way only what the summary doesn't cover is sent verbatim
+            window = [msg for msg in window if msg.id > folded_until]
+    
+    message_history = [{'role': msg.role, 'content': msg.content} for msg in window]
+    return conversation.summary, message_history
+
+def save_assistant_reply(conversation, user, assistant_response, plan_data):
+    """
+    Persist the assistant's reply and, if plan_data was extracted from it,
+    the ProposedPlan. Returns (ChatMessage, ProposedPlan or None).
+    """
+    from .models import ChatMessage, ProposedPlan
+    
+    message = ChatMessage.objects.create(
+        conversation=conversation,
+        role='assistant',
+        content=assistant_response
+    )
+    
+    proposed_plan = None
+    
+    if plan_data:
+        proposed_plan = ProposedPlan.objects.create(
+            conversation=conversation,
+            user=user,
+            title=plan_data.get('title', 'Untitled Plan'),
+            description=plan_data.get('description', ''),
+            color=plan_data.get('color', '#3B82F6'),
+            start_date=plan_data.get('start_date'),
+            end_date=plan_data.get('end_date'),
+            tasks_data=plan_data.get('tasks', [])
+        )
+    
+    conversation.save()
+    return message, proposed_plan
+
+class PlanProposalError(Exception):
+    """
+    A plan proposal that could not be used. `code` is one of 'invalid_json',
+    'incomplete' or 'invalid_schema'; `path` points at the offending field
+    (e.g. 'plan.tasks[2].task_date') when known.
+    """
+
+    def __init__(self, code, message, path=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.path = path
+
+    def as_dict(self):
+        return {'code': self.code, 'message': self.message, 'path': self.path}
+
+_HEX_COLOR = re.compile(r'^#[0-9A-Fa-f]{6}$')
+
+def _check_date(value, path, required=True):
+    if value is None and not required:
+        return
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise PlanProposalError('invalid_schema', f"{path} must be a YYYY-MM-DD date", path)
+
+def validate_plan_proposal(data):
+    """
+    Check a decoded {"type": "plan_proposal", "plan": {...}} object against
+    the format in SYSTEM_PROMPT. Returns the plan dict or raises
+    PlanProposalError naming the first bad field.
+    """
+    plan = data.get('plan')
+    if not isinstance(plan, dict):
+        raise PlanProposalError('invalid_schema', "plan must be an object", 'plan')
+    if not isinstance(plan.get('title'), str) or not plan['title'].strip():
+        raise PlanProposalError('invalid_schema', "plan.title must be a non-empty string", 'plan.title')
+    _check_date(plan.get('start_date'), 'plan.start_date')
+    _check_date(plan.get('end_date'), 'plan.end_date', required=False)
+    if 'color' in plan and not (isinstance(plan['color'], str) and _HEX_COLOR.match(plan['color'])):
+        raise PlanProposalError('invalid_schema', "plan.color must be a #RRGGBB hex color", 'plan.color')
+    
+    tasks = plan.get('tasks', [])
+    if not isinstance(tasks, list):
+        raise PlanProposalError('invalid_schema', "plan.tasks must be a list", 'plan.tasks')
+    for index, task in enumerate(tasks):
+        path = f"plan.tasks[{index}]"
+        if not isinstance(task, dict):
+            raise PlanProposalError('invalid_schema', f"{path} must be an object", path)
+        if not isinstance(task.get('title'), str) or not task['title'].strip():
+            raise PlanProposalError('invalid_schema', f"{path}.title must be a non-empty string", f"{path}.title")
+        _check_date(task.get('task_date'), f"{path}.task_date")
+        if task.get('status', 'pending') not in ('pending', 'completed'):
+            raise PlanProposalError('invalid_schema', f"{path}.status must be pending or completed", f"{path}.status")
+        if 'repeat' in task:
+            _check_repeat(task['repeat'], plan, f"{path}.repeat")
+    return plan
+
+def _check_repeat(repeat, plan, path):
+    if not isinstance(repeat, dict):
+        raise PlanProposalError('invalid_schema', f"{path} must be an object", path)
+    if repeat.get('frequency') not in recurrence.FREQUENCIES:
+        raise PlanProposalError('invalid_schema', f"{path}.frequency must be daily, weekly or monthly", f"{path}.frequency")
+    interval = repeat.get('interval', 1)
+    if not isinstance(interval, int) or isinstance(interval, bool) or interval < 1:
+        raise PlanProposalError('invalid_schema', f"{path}.interval must be a positive integer", f"{path}.interval")
+    try:
+        recurrence.parse_weekdays(repeat.get('weekdays', []))
+    except ValueError:
+        raise PlanProposalError('invalid_schema', f"{path}.weekdays must be a list of weekday names", f"{path}.weekdays")
+    if repeat.get('until') is None and plan.get('end_date') is None:
+        raise PlanProposalError('invalid_schema', f"{path}.until is required when the plan has no end_date", f"{path}.until")
+    _check_date(repeat.get('until'), f"{path}.until", required=False)
+
+class PlanProposalExtractor:
+    """
+    Incrementally find and decode a plan_proposal JSON object in model output.
+
+    feed() each chunk as it arrives. Every character is scanned once: the
+    extractor keeps a stack of open '{' positions (ignoring braces inside
+    JSON strings), and each object that closes is decoded if it mentions
+    plan_proposal, so a proposal is available before the rest of the reply
+    has streamed. Objects nest rather than being read from the outermost
+    brace only, so a stray '{' in the prose before a proposal is left open
+    without hiding it. JSON objects that are not plan proposals are skipped.
+    """
+
+    def __init__(self):
+        self.plan = None
+        self.error = None
+        self._text = ''
+        self._starts = []
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self):
+        return self.plan is not None or self.error is not None
+
+    def feed(self, chunk):
+        """Consume a chunk; returns the plan dict if it completed in this chunk."""
+        if self.done:
             return None
-        
-        data = json.loads(json_text)
-        
-        if data.get('type') == 'plan_proposal' and 'plan' in data:
-            return data['plan']
-        
-        return None
-    except:
+        if not self._starts:
+            # Nothing is open, so only the text from the next '{' on matters
+            brace = chunk.find('{')
+            if brace == -1:
+                return None
+            chunk = chunk[brace:]
+            self._text = ''
+        offset = len(self._text)
+        self._text += chunk
+        for i, char in enumerate(chunk, offset):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = bool(self._starts)
+            elif char == '{':
+                self._starts.append(i)
+            elif char == '}' and self._starts:
+                self._finish_object(self._text[self._starts.pop():i + 1])
+                if self.done:
+                    return self.plan
         return None
+
+    def close(self):
+        """Signal end of output; records an 'incomplete' error for an unclosed proposal."""
+        if not self.done and self._starts and 'plan_proposal' in self._text[self._starts[0]:]:
+            self.error = PlanProposalError('incomplete', "The plan proposal JSON was cut off before it closed")
+        self._text = ''
+        self._starts = []
+        return self.plan
+
+    def _finish_object(self, text):
+        if 'plan_proposal' not in text:
+            return
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.error = PlanProposalError('invalid_json', f"The plan proposal is not valid JSON: {e.msg} at position {e.pos}")
+            return
+        if not isinstance(data, dict) or data.get('type') != 'plan_proposal':
+            return
+        try:
+            self.plan = validate_plan_proposal(data)
+        except PlanProposalError as e:
+            self.error = e
+
+def parse_plan_proposal(response_text):
+    """
+    Extract a plan proposal from a complete assistant response.
+    Returns the plan dict, or None if the response contains no proposal;
+    raises PlanProposalError if it contains one that can't be used.
+    """
+    extractor = PlanProposalExtractor()
+    extractor.feed(response_text)
+    extractor.close()
+    if extractor.error:
+        raise extractor.error
+    return extractor.plan
@@ -1,6 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Plan, Task
+from . import recurrence
+from .models import Plan, Task, TaskSeries
 
 def validate_file_size(file):
     max_size_mb = 5
@@ -62,3 +63,51 @@ class TaskForm(forms.ModelForm):
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent'
             }),
         }
+
+_INPUT_CLASS = 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent'
+
+class TaskSeriesForm(forms.ModelForm):
+    weekdays = forms.TypedMultipleChoiceField(
+        required=False,
+        coerce=int,
+        choices=[(index, name.title()) for index, name in enumerate(recurrence.WEEKDAY_NAMES)],
+        widget=forms.CheckboxSelectMultiple,
+        help_text='Weekly series only; defaults to the weekday of the start date',
+    )
+
+    class Meta:
+        model = TaskSeries
+        fields = ['title', 'description', 'frequency', 'interval', 'weekdays', 'start_date', 'until']
+        labels = {'interval': 'Every', 'until': 'Repeat until'}
+        widgets = {
+            'title': forms.TextInput(attrs={'class': _INPUT_CLASS, 'placeholder': 'Enter task title'}),
+            'description': forms.Textarea(attrs={'class': _INPUT_CLASS, 'placeholder': 'Enter task description', 'rows': 3}),
+            'frequency': forms.Select(attrs={'class': _INPUT_CLASS}),
+            'interval': forms.NumberInput(attrs={'class': _INPUT_CLASS, 'min': 1}),
+            'start_date': forms.DateInput(attrs={'type': 'date', 'class': _INPUT_CLASS}),
+            'until': forms.DateInput(attrs={'type': 'date', 'class': _INPUT_CLASS}),
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, until = cleaned_data.get('start_date'), cleaned_data.get('until')
+        frequency, interval = cleaned_data.get('frequency'), cleaned_data.get('interval')
+        if not (start_date and until and frequency and interval):
+            return cleaned_data
+        if until < start_date:
+            raise ValidationError({'until': 'The series must end on or after its start date.'})
+        if frequency != recurrence.WEEKLY:
+            cleaned_data['weekdays'] = []
+        count = recurrence.count_occurrences(start_date, until, frequency, interval, cleaned_data['weekdays'])
+        if count > recurrence.MAX_OCCURRENCES:
+            raise ValidationError(f'A series can have at most {recurrence.MAX_OCCURRENCES} occurrences.')
+        if count == 0:
+            raise ValidationError('This rule has no dates between the start date and the end date.')
+        return cleaned_data
+
+class OccurrenceForm(forms.Form):
+    """Edits one date of a series; blank title or description keeps the series' own."""
+    title = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={'class': _INPUT_CLASS}))
+    description = forms.CharField(required=False, widget=forms.Textarea(attrs={'class': _INPUT_CLASS, 'rows': 3}))
+    status = forms.ChoiceField(choices=Task.STATUS_CHOICES, widget=forms.Select(attrs={'class': _INPUT_CLASS}))
+    cancelled = forms.BooleanField(required=False, label='Skip this date')
@@ -0,0 +1,151 @@
+"""
+Task photo processing: metadata stripping and resized WebP/JPEG variants.
+
+Variants are stored next to the original under task_photos/variants/ with
+names derived from the original's. They are built once when the photo is
+saved and the task records which ones exist (Task.photo_variants), so
+rendering a photo never has to probe storage. Storage keeps original names
+unique, and variant names include the original's extension, so foo.jpg and
+foo.png never share variants.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+# name -> (width, height, crop). Cropped variants are exactly width x height;
+# the others fit inside the box keeping their aspect ratio.
+PHOTO_VARIANTS = {
+    'medium': (640, 640, False),
+}
+# No longer built, but older uploads may still have them on disk
+RETIRED_VARIANTS = ('thumb',)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def webp_supported():
+    return features.check('webp')
+
+
+def variant_formats():
+    return ('webp', 'jpeg') if webp_supported() else ('jpeg',)
+
+
+def variant_name(original_name, variant, fmt):
+    directory, filename = os.path.split(original_name)
+    stem, original_extension = os.path.splitext(filename)
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    return f"{directory}/variants/{stem}_{original_extension.lstrip('.').lower()}_{variant}.{extension}"
+
+
+def delete_variants(storage, original_name):
+    """Remove every variant of a photo, e.g. once it was replaced or cleared."""
+    for variant in (*PHOTO_VARIANTS, *RETIRED_VARIANTS):
+        # Both formats, whatever this Pillow supports now
+        for fmt in ('webp', 'jpeg'):
+            name = variant_name(original_name, variant, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+
+
+def _open_upright(source):
+    image = Image.open(source)
+    # Apply the EXIF orientation before the metadata is dropped
+    return ImageOps.exif_transpose(image)
+
+
+def _flatten(image):
+    """RGB copy suitable for JPEG, compositing transparency onto white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        _flatten(image).save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def strip_metadata(upload):
+    """
+    Re-encode an uploaded image without EXIF/XMP/ICC metadata, keeping its
+    format (PNG stays PNG, everything else becomes JPEG). Returns a
+    ContentFile named like the upload.
+    """
+    upload.seek(0)
+    original = Image.open(upload)
+    fmt = 'png' if original.format == 'PNG' else 'jpeg'
+    # Apply the EXIF orientation before the metadata is dropped
+    image = ImageOps.exif_transpose(original)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    # Pillow writes EXIF/XMP/ICC/text chunks from image.info; keep only transparency
+    image.info = {key: value for key, value in image.info.items() if key == 'transparency'}
+    return ContentFile(_encode(image, fmt), name=f"{stem}.{'png' if fmt == 'png' else 'jpg'}")
+
+
+def _resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def variant_key(variant, fmt):
+    return f"{variant}_{fmt}"
+
+
+def build_variants(field_file):
+    """
+    Generate every variant of a stored photo, overwriting existing ones.
+    Returns the keys of the variants built (e.g. ['medium_webp', 'medium_jpeg']).
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as source:
+        image = _open_upright(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode == 'LA' else 'RGB')
+
+    built = []
+    for variant, (width, height, crop) in PHOTO_VARIANTS.items():
+        resized = _resize(image, width, height, crop)
+        for fmt in variant_formats():
+            name = variant_name(field_file.name, variant, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(_encode(resized, fmt)))
+            built.append(variant_key(variant, fmt))
+    return built
+
+
+def existing_variants(field_file):
+    """Keys of the variants of a stored photo that are present in storage."""
+    storage = field_file.storage
+    return [
+        variant_key(variant, fmt)
+        for variant in PHOTO_VARIANTS
+        for fmt in ('webp', 'jpeg')
+        if storage.exists(variant_name(field_file.name, variant, fmt))
+    ]
+
+
+def variant_urls(field_file, keys):
+    """URLs of the given variants of a photo, keyed like build_variants' result."""
+    storage = field_file.storage
+    urls = {}
+    for key in keys:
+        variant, fmt = key.rsplit('_', 1)
+        urls[key] = storage.url(variant_name(field_file.name, variant, fmt))
+    return urls
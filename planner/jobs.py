@@ -0,0 +1,199 @@
+"""
+Database-backed queue of chat turns.
+
+chatbot_submit_message stores the user's message and a ChatJob and returns
+straight away; `manage.py run_chat_workers` runs a pool of worker processes
+that claim jobs, call the model and store the reply, retrying failed calls
+with exponential backoff. Clients poll chatbot_job_status for the result.
+
+Jobs are claimed with a conditional UPDATE, which works the same on SQLite
+and PostgreSQL without row locks. A job whose worker died is picked up again
+once its lease (CHATBOT_JOB_LEASE_SECONDS) runs out. Jobs of one conversation
+run one at a time and in order, so replies never interleave.
+"""
+import logging
+import os
+import random
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Exists, F, Min, OuterRef, Q
+from django.utils import timezone
+
+from .chatbot import build_message_history, generate_reply, parse_plan_proposal, save_assistant_reply, PlanProposalError
+from .models import ChatJob, ChatMessage
+
+logger = logging.getLogger('planner.jobs')
+
+# Candidates fetched per claim attempt; others may win the race for some of them
+CLAIM_BATCH = 10
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def submit_chat_turn(conversation, user, content):
+    """Store the user's message and queue a job to answer it. Returns the ChatJob."""
+    with transaction.atomic():
+        message = ChatMessage.objects.create(conversation=conversation, role='user', content=content)
+        return ChatJob.objects.create(
+            conversation=conversation,
+            user=user,
+            user_message=message,
+            max_attempts=_setting('CHATBOT_JOB_MAX_ATTEMPTS', 3),
+        )
+
+
+def queue_depth():
+    """Number of jobs waiting or running."""
+    return ChatJob.objects.filter(status__in=('queued', 'running')).count()
+
+
+def queue_full(depth=None):
+    """True when new chat turns should be refused until the workers catch up."""
+    limit = _setting('CHATBOT_JOB_QUEUE_LIMIT', 100)
+    if limit is None:
+        return False
+    return (queue_depth() if depth is None else depth) >= limit
+
+
+def queue_stats():
+    stats = ChatJob.objects.aggregate(
+        queued=Count('id', filter=Q(status='queued')),
+        running=Count('id', filter=Q(status='running')),
+        failed=Count('id', filter=Q(status='failed')),
+        oldest_queued=Min('created_at', filter=Q(status='queued')),
+    )
+    oldest = stats.pop('oldest_queued')
+    stats['depth'] = stats['queued'] + stats['running']
+    stats['limit'] = _setting('CHATBOT_JOB_QUEUE_LIMIT', 100)
+    stats['oldest_queued_seconds'] = round((timezone.now() - oldest).total_seconds(), 1) if oldest else None
+    return stats
+
+
+def queue_position(job):
+    """How many queued jobs will be picked up before this one (0 = next)."""
+    return ChatJob.objects.filter(status='queued', id__lt=job.id).count()
+
+
+def _lease_expired(now):
+    return Q(status='running', locked_at__lt=now - timedelta(seconds=_setting('CHATBOT_JOB_LEASE_SECONDS', 300)))
+
+
+def claim_job(worker_id):
+    """Claim the next runnable job for this worker, or return None."""
+    now = timezone.now()
+    claimable = Q(status='queued', run_after__lte=now) | _lease_expired(now)
+    busy_conversations = ChatJob.objects.filter(status='running').exclude(_lease_expired(now)).values('conversation_id')
+    earlier_queued = ChatJob.objects.filter(
+        conversation_id=OuterRef('conversation_id'), status='queued', id__lt=OuterRef('id')
+    )
+    # Only the oldest job of an idle conversation, so turns are answered in order
+    candidates = list(
+        ChatJob.objects.filter(claimable)
+        .exclude(conversation_id__in=busy_conversations)
+        .filter(~Exists(earlier_queued))
+        .order_by('id')
+        .values_list('id', flat=True)[:CLAIM_BATCH]
+    )
+    for job_id in candidates:
+        claimed = ChatJob.objects.filter(claimable, id=job_id).update(
+            status='running',
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return ChatJob.objects.select_related('conversation', 'user').get(id=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    """Seconds before retry number `attempts`: exponential with full jitter, capped."""
+    base = _setting('CHATBOT_JOB_RETRY_BACKOFF', 2)
+    cap = _setting('CHATBOT_JOB_RETRY_BACKOFF_MAX', 60)
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+def run_job(job):
+    """Answer the job's chat turn and record the result; failures are retried or recorded."""
+    if job.attempts > job.max_attempts:
+        # Reclaimed after its workers kept dying mid-run
+        _record_failure(job, RuntimeError("worker lease expired on every attempt"))
+        return
+    try:
+        summary, history = build_message_history(job.conversation, up_to=job.user_message_id)
+        reply = generate_reply(history, summary)
+    except Exception as e:
+        _record_failure(job, e)
+        return
+
+    try:
+        plan_data = parse_plan_proposal(reply)
+        proposal_error = None
+    except PlanProposalError as e:
+        plan_data = None
+        proposal_error = e.as_dict()
+
+    with transaction.atomic():
+        # Only the worker still holding the lease may store the reply
+        owned = ChatJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by).update(
+            status='succeeded', finished_at=timezone.now(), last_error=''
+        )
+        if not owned:
+            logger.warning("Job %s was taken over by another worker; dropping its reply", job.id)
+            return
+        message, proposed_plan = save_assistant_reply(job.conversation, job.user, reply, plan_data)
+        ChatJob.objects.filter(id=job.id).update(
+            assistant_message=message, proposed_plan=proposed_plan, proposal_error=proposal_error
+        )
+
+
+def _record_failure(job, error):
+    error_text = f"{type(error).__name__}: {error}"
+    if job.attempts < job.max_attempts:
+        delay = retry_delay(job.attempts)
+        logger.warning("Job %s attempt %s failed (%s); retrying in %.1fs", job.id, job.attempts, error_text, delay)
+        changes = {'status': 'queued', 'run_after': timezone.now() + timedelta(seconds=delay)}
+    else:
+        logger.error("Job %s failed after %s attempts: %s", job.id, job.attempts, error_text)
+        changes = {'status': 'failed', 'finished_at': timezone.now()}
+    ChatJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by).update(
+        last_error=error_text, locked_by='', locked_at=None, **changes
+    )
+
+
+def default_worker_id(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def work(worker_id, stop=None, poll_interval=1.0, burst=False):
+    """
+    Claim and run jobs until `stop` (a threading/multiprocessing Event) is
+    set, or, with burst, until no job is runnable. Returns the number of
+    jobs run.
+    """
+    processed = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        job = claim_job(worker_id)
+        if job is None:
+            if burst:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        try:
+            run_job(job)
+        except Exception as e:
+            logger.exception("Job %s crashed while storing its result", job.id)
+            _record_failure(job, e)
+        processed += 1
+    close_old_connections()
+    return processed
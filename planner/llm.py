@@ -0,0 +1,172 @@
+"""
+Pluggable LLM providers for the chatbot.
+
+The active provider is chosen by settings.CHATBOT_PROVIDER, a key into
+settings.CHATBOT_PROVIDERS (same shape as CACHES: a dotted 'CLASS' path plus
+'OPTIONS' passed to its constructor). Providers take messages as dicts with
+'role' ('user'/'assistant') and 'content' keys.
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class LLMProvider:
+    """Interface every chatbot backend implements."""
+    model_name = ''
+
+    def generate(self, messages, system_instruction, max_output_tokens):
+        """Return the full reply text ('' if the model produced nothing)."""
+        raise NotImplementedError
+
+    def stream(self, messages, system_instruction, max_output_tokens):
+        """Async iterator over reply text chunks."""
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini via the google-genai SDK. The SDK is imported and the client
+    constructed on first use, so processes that never chat never load it.
+    """
+
+    def __init__(self, api_key=None, base_url=None, model='gemini-2.5-flash'):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model_name = model
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    from google.genai import types
+                    self._client = genai.Client(
+                        api_key=self.api_key,
+                        http_options=types.HttpOptions(base_url=self.base_url) if self.base_url else None,
+                    )
+        return self._client
+
+    def _request(self, messages, system_instruction, max_output_tokens):
+        from google.genai import types
+        contents = [
+            types.Content(
+                role="user" if msg['role'] == 'user' else "model",
+                parts=[types.Part(text=msg['content'])]
+            )
+            for msg in messages
+        ]
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            max_output_tokens=max_output_tokens
+        )
+        return {'model': self.model_name, 'contents': contents, 'config': config}
+
+    def generate(self, messages, system_instruction, max_output_tokens):
+        response = self.client.models.generate_content(
+            **self._request(messages, system_instruction, max_output_tokens)
+        )
+        return response.text or ''
+
+    async def stream(self, messages, system_instruction, max_output_tokens):
+        stream = await self.client.aio.models.generate_content_stream(
+            **self._request(messages, system_instruction, max_output_tokens)
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic offline backend for development, CI and load tests.
+
+    Replies with a clarifying question, unless the last user message contains
+    one of plan_triggers, in which case it proposes a plan_proposal JSON with
+    plan_days daily tasks starting tomorrow. latency is slept before replying
+    and chunk_delay between streamed words.
+    """
+    model_name = 'fake'
+
+    DEFAULT_REPLY = (
+        "Sounds great! How many days would you like the plan to cover, "
+        "and are there any activities you definitely want to include?"
+    )
+
+    def __init__(self, latency=0.0, chunk_delay=0.0, plan_days=3,
+                 plan_triggers=('create', 'looks good', 'confirm'), reply=None):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.plan_days = plan_days
+        self.plan_triggers = tuple(trigger.lower() for trigger in plan_triggers)
+        self.reply = reply or self.DEFAULT_REPLY
+
+    def _reply_for(self, messages):
+        last_user = next((msg['content'] for msg in reversed(messages) if msg['role'] == 'user'), '')
+        if any(trigger in last_user.lower() for trigger in self.plan_triggers):
+            return self._plan_proposal(last_user)
+        return self.reply
+
+    def _plan_proposal(self, request_text):
+        start = timezone.now().date() + timedelta(days=1)
+        days = [start + timedelta(days=i) for i in range(self.plan_days)]
+        proposal = {
+            'type': 'plan_proposal',
+            'plan': {
+                'title': f"{self.plan_days}-Day Plan",
+                'description': request_text[:200],
+                'color': '#3B82F6',
+                'start_date': days[0].isoformat(),
+                'end_date': days[-1].isoformat(),
+                'tasks': [
+                    {
+                        'title': f"Day {i + 1}",
+                        'description': f"Planned activities for day {i + 1}",
+                        'task_date': day.isoformat(),
+                        'status': 'pending',
+                    }
+                    for i, day in enumerate(days)
+                ],
+            },
+        }
+        return f"Here is your plan:\n```json\n{json.dumps(proposal, indent=2)}\n```"
+
+    def generate(self, messages, system_instruction, max_output_tokens):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply_for(messages)
+
+    async def stream(self, messages, system_instruction, max_output_tokens):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self._reply_for(messages).split(' ')
+        for i, word in enumerate(words):
+            yield word if i == 0 else ' ' + word
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+
+
+@lru_cache(maxsize=None)
+def get_provider():
+    """The configured provider instance, built once per process."""
+    name = getattr(settings, 'CHATBOT_PROVIDER', 'gemini')
+    config = settings.CHATBOT_PROVIDERS[name]
+    return import_string(config['CLASS'])(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def _reset_provider(setting, **kwargs):
+    if setting in ('CHATBOT_PROVIDER', 'CHATBOT_PROVIDERS'):
+        get_provider.cache_clear()
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from planner import retention
+
+
+class Command(BaseCommand):
+    help = "Archive chat conversations that have been inactive for a while into compressed blobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHATBOT_ARCHIVE_AFTER_DAYS,
+                            help='Archive conversations not updated for this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.CHATBOT_ARCHIVE_BATCH_SIZE,
+                            help='Rows deleted or restored per statement')
+        parser.add_argument('--limit', type=int, help='Archive at most this many conversations')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many would be archived')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = retention.archivable(older_than).count()
+            if options['limit']:
+                count = min(count, options['limit'])
+            self.stdout.write(f"{count} conversation(s) would be archived.")
+            return
+
+        totals = retention.archive_inactive(older_than, options['batch_size'], options['limit'])
+        ratio = totals['stored_bytes'] / totals['raw_bytes'] if totals['raw_bytes'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {totals['conversations']} conversation(s): {totals['messages']} message(s), "
+            f"{totals['proposals']} proposal(s), {totals['raw_bytes']} bytes stored as "
+            f"{totals['stored_bytes']} ({ratio:.0%})."
+        ))
@@ -0,0 +1,120 @@
+import json
+import platform
+import subprocess
+import sys
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+
+from planner.benchmarks import BENCHMARKS, run_benchmarks, compare_results
+from planner.seeding import seed
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and benchmark the main planner views, "
+        "reporting p50/p95 latency, SQL query count and peak memory as JSON. "
+        "Fails if a benchmark's p95 is over its latency budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmarks', nargs='*', help=f"Subset to run: {', '.join(BENCHMARKS)}")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--plans-per-user', type=int, default=300)
+        parser.add_argument('--tasks-per-plan', type=int, default=30)
+        parser.add_argument('--conversations-per-user', type=int, default=2)
+        parser.add_argument('--messages-per-conversation', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--compare', help='Baseline JSON report to compare against')
+        parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='Allowed fractional latency/memory increase before failing --compare')
+
+    def handle(self, *args, **options):
+        unknown = set(options['benchmarks']) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+        scale = {
+            'users': options['users'],
+            'plans_per_user': options['plans_per_user'],
+            'tasks_per_plan': options['tasks_per_plan'],
+            'conversations_per_user': options['conversations_per_user'],
+            'messages_per_conversation': options['messages_per_conversation'],
+            'seed': options['seed'],
+        }
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            seed(username_prefix='bench-user', **scale)
+            user = User.objects.get(username='bench-user-0')
+            results = run_benchmarks(
+                user,
+                names=options['benchmarks'] or None,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'git_commit': _git_commit(),
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'session_engine': settings.SESSION_ENGINE,
+                'user_cache_timeout': settings.PLANNER_USER_CACHE_TIMEOUT,
+                'scale': scale,
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        over_budget = [
+            (name, result['p95_ms'], result['budget_ms'])
+            for name, result in results.items()
+            if result.get('budget_ms') is not None and result['p95_ms'] > result['budget_ms']
+        ]
+        for name, p95, budget in over_budget:
+            self.stderr.write(f"{name:24} p95_ms {p95:>10} over its {budget} ms budget")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            rows = compare_results(baseline['results'], results, options['max_regression'])
+            regressions = [row for row in rows if row[4]]
+            for name, metric, before, after, regressed in rows:
+                flag = '  REGRESSION' if regressed else ''
+                self.stderr.write(f"{name:24} {metric:16} {before:>10} -> {after:>10}{flag}")
+            if regressions:
+                sys.exit(1)
+        if over_budget:
+            sys.exit(1)
@@ -0,0 +1,123 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from planner.seeding import seed
+
+
+def _writer_process(database_name, user_id, operations, start, results):
+    # Imported here so spawned children set Django up before loading models
+    import django
+    django.setup()
+    from django.test.utils import setup_test_environment
+    from planner.benchmarks import write_load
+
+    try:
+        setup_test_environment()
+    except RuntimeError:
+        pass  # Inherited through fork
+    connections['default'].settings_dict['NAME'] = database_name
+    user = User.objects.get(id=user_id)
+    start.wait()
+    with override_settings(CHATBOT_JOB_QUEUE_LIMIT=None, PLANNER_QUERY_BUDGET_STRICT=False):
+        results.put(write_load(user, operations))
+    connections.close_all()
+
+
+def _run_writers(user_ids, operations):
+    from planner.benchmarks import summarize_writes
+
+    database_name = connection.settings_dict['NAME']
+    connections.close_all()
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=_writer_process, args=(database_name, user_id, operations, start, results))
+        for user_id in user_ids
+    ]
+    for process in processes:
+        process.start()
+    # Give every writer time to connect before releasing them together
+    time.sleep(1)
+    started = time.perf_counter()
+    start.set()
+    latencies, errors = [], []
+    for _ in processes:
+        process_latencies, process_errors = results.get()
+        latencies.extend(process_latencies)
+        errors.extend(process_errors)
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    return summarize_writes(len(user_ids), operations, elapsed, latencies, errors)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure write throughput of the configured database profile "
+        "(PLANNER_DB_PROFILE) with concurrent writer processes toggling tasks "
+        "and queueing chat turns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, action='append',
+                            help='Concurrent writer processes (repeatable; default 1, 4 and 16)')
+        parser.add_argument('--operations', type=int, default=200, help='Requests per writer')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    def handle(self, *args, **options):
+        writer_counts = options['writers'] or [1, 4, 16]
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        temp_path = None
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # The default in-memory test database can't be shared between processes
+            fd, temp_path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            test_settings['NAME'] = temp_path
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            seed(
+                users=max(writer_counts), plans_per_user=5, tasks_per_plan=20,
+                conversations_per_user=1, messages_per_conversation=10,
+                username_prefix='write-bench',
+            )
+            user_ids = list(
+                User.objects.filter(username__startswith='write-bench-').order_by('id').values_list('id', flat=True)
+            )
+            results = {str(count): _run_writers(user_ids[:count], options['operations']) for count in writer_counts}
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            if temp_path:
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(temp_path + suffix):
+                        os.remove(temp_path + suffix)
+
+        report = {
+            'meta': {
+                'profile': settings.PLANNER_DB_PROFILE,
+                'database': connection.vendor,
+                'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE'),
+                'options': {key: str(value) for key, value in connection.settings_dict.get('OPTIONS', {}).items()},
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,98 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_REPLY = (
+    "Sounds great! How many days would you like the plan to cover, "
+    "and are there any activities you definitely want to include?"
+)
+
+
+def _response_payload(text, finished):
+    candidate = {
+        'content': {'role': 'model', 'parts': [{'text': text}]},
+        'index': 0,
+    }
+    if finished:
+        candidate['finishReason'] = 'STOP'
+    return {'candidates': [candidate]}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Gemini REST API. Answers generateContent and
+    streamGenerateContent (SSE) with a canned reply split into word chunks.
+    """
+    protocol_version = 'HTTP/1.1'
+    reply = DEFAULT_REPLY
+    latency = 0.0
+    chunk_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        time.sleep(self.latency)
+
+        if ':streamGenerateContent' in self.path:
+            self._stream_reply()
+        elif ':generateContent' in self.path:
+            body = json.dumps(_response_payload(self.reply, True)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def _stream_reply(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        words = self.reply.split(' ')
+        for i, word in enumerate(words):
+            text = word if i == 0 else ' ' + word
+            payload = _response_payload(text, i == len(words) - 1)
+            self.wfile.write(f"data: {json.dumps(payload)}\r\n\r\n".encode())
+            self.wfile.flush()
+            time.sleep(self.chunk_delay)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake Gemini API server for load and integration testing. "
+        "Point the app at it with GEMINI_BASE_URL=http://HOST:PORT/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help='Seconds to wait before answering each request')
+        parser.add_argument('--chunk-delay', type=float, default=0.02,
+                            help='Seconds between streamed chunks')
+        parser.add_argument('--reply', default=DEFAULT_REPLY,
+                            help='Canned reply text; may be a plan_proposal JSON block')
+
+    def handle(self, *args, **options):
+        handler = type('ConfiguredFakeGeminiHandler', (FakeGeminiHandler,), {
+            'reply': options['reply'],
+            'latency': options['latency'],
+            'chunk_delay': options['chunk_delay'],
+        })
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        self.stdout.write(f"Fake Gemini server listening on http://{options['host']}:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
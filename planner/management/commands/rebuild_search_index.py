@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from planner import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of plans, tasks and chat messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        # One transaction so searches never see a half-built index
+        with transaction.atomic():
+            counts = search.rebuild(batch_size=options['batch_size'])
+        if counts is None:
+            raise CommandError("This database has no full-text search support (SQLite needs FTS5).")
+        summary = ', '.join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {summary}."))
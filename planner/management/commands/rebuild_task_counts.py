@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from planner.models import Plan
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized task_count/completed_task_count columns on Plan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only rebuild plans owned by this user id')
+        parser.add_argument('--plan', type=int, action='append', help='Only rebuild this plan id (repeatable)')
+
+    def handle(self, *args, **options):
+        plans = Plan.objects.all()
+        if options['user']:
+            plans = plans.filter(user_id=options['user'])
+        if options['plan']:
+            plans = plans.filter(id__in=options['plan'])
+
+        updated = plans.rebuild_task_counts()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt task counters for {updated} plan(s)."))
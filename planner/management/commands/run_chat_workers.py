@@ -0,0 +1,63 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _run_worker(index, stop, poll_interval, burst):
+    # Imported here so spawned children set Django up before loading models
+    import django
+    django.setup()
+    from planner.jobs import default_worker_id, work
+
+    # The parent handles Ctrl-C and tells the children through `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(default_worker_id(index), stop=stop, poll_interval=poll_interval, burst=burst)
+
+
+class Command(BaseCommand):
+    help = "Run worker processes that answer queued chat turns (see planner.jobs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Number of worker processes (1 runs in this process)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds an idle worker waits before checking the queue again')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is runnable instead of waiting for more')
+
+    def handle(self, *args, **options):
+        from planner.jobs import default_worker_id, work
+
+        concurrency = max(options['concurrency'], 1)
+        poll_interval = options['poll_interval']
+        burst = options['burst']
+
+        if concurrency == 1:
+            processed = work(default_worker_id(), poll_interval=poll_interval, burst=burst)
+            self.stdout.write(self.style.SUCCESS(f"Worker finished after {processed} job(s)."))
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        stop = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(target=_run_worker, args=(index, stop, poll_interval, burst), daemon=True)
+            for index in range(concurrency)
+        ]
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {concurrency} chat workers.")
+
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the jobs in progress...")
+            stop.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS("Chat workers stopped."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from planner.seeding import seed, SEED_PASSWORD
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, plans, tasks, conversations and messages for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--plans-per-user', type=int, default=20)
+        parser.add_argument('--tasks-per-plan', type=int, default=100)
+        parser.add_argument('--conversations-per-user', type=int, default=3)
+        parser.add_argument('--messages-per-conversation', type=int, default=40)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; same seed, same data')
+        parser.add_argument('--username-prefix', default='seed-user')
+
+    def handle(self, *args, **options):
+        counts = seed(
+            users=options['users'],
+            plans_per_user=options['plans_per_user'],
+            tasks_per_plan=options['tasks_per_plan'],
+            conversations_per_user=options['conversations_per_user'],
+            messages_per_conversation=options['messages_per_conversation'],
+            seed=options['seed'],
+            username_prefix=options['username_prefix'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}."))
+        self.stdout.write(f"Users log in with password '{SEED_PASSWORD}'.")
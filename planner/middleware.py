@@ -0,0 +1,130 @@
+import json
+import logging
+import zoneinfo
+from functools import lru_cache
+from urllib.parse import unquote
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+
+from .instrumentation import start_request_metrics, finish_request_metrics
+
+logger = logging.getLogger('planner.requests')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised instead of logging when PLANNER_QUERY_BUDGET_STRICT is on."""
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, DB time, template render time and LLM time for each
+    request, report them in a Server-Timing header and a JSON log line on the
+    'planner.requests' logger, and check PLANNER_QUERY_BUDGETS.
+
+    For streaming responses only the work done before the response object is
+    returned is included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = start_request_metrics()
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request_metrics(token)
+        self._report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token = start_request_metrics()
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request_metrics(token)
+        self._report(request, response, metrics)
+        return response
+
+    def _report(self, request, response, metrics):
+        total_ms = metrics.total_ms
+        timings = metrics.timings
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings["db"]:.1f};desc="{metrics.queries} queries"',
+            f'tpl;dur={timings["template"]:.1f}',
+            f'llm;dur={timings["llm"]:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.url_name if match else None
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(timings['db'], 2),
+            'template_ms': round(timings['template'], 2),
+            'llm_ms': round(timings['llm'], 2),
+            'total_ms': round(total_ms, 2),
+        }))
+
+        budget = getattr(settings, 'PLANNER_QUERY_BUDGETS', {}).get(view_name)
+        if budget is not None and metrics.queries > budget:
+            message = f"{view_name} ran {metrics.queries} queries (budget {budget}) for {request.path}"
+            if getattr(settings, 'PLANNER_QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+# Set by base.html from the browser's Intl time zone
+TIMEZONE_COOKIE = 'tz'
+
+
+@lru_cache(maxsize=256)
+def _zone(name):
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+class TimezoneMiddleware:
+    """
+    Activate the browser's time zone from the tz cookie, so "today" and
+    overdue state follow the user's calendar rather than TIME_ZONE.
+    Requests without a valid cookie use TIME_ZONE.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _activate(self, request):
+        zone = _zone(unquote(request.COOKIES.get(TIMEZONE_COOKIE, ''))[:64])
+        if zone is None:
+            timezone.deactivate()
+        else:
+            timezone.activate(zone)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._activate(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._activate(request)
+        return await self.get_response(request)
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_task_counts(apps, schema_editor):
+    Plan = apps.get_model('planner', 'Plan')
+    Task = apps.get_model('planner', 'Task')
+
+    def task_count_subquery(**filters):
+        return Subquery(
+            Task.objects.filter(plan=OuterRef('pk'), **filters)
+            .order_by()
+            .values('plan')
+            .annotate(n=Count('pk'))
+            .values('n')[:1]
+        )
+
+    Plan.objects.update(
+        task_count=Coalesce(task_count_subquery(), 0),
+        completed_task_count=Coalesce(task_count_subquery(status='completed'), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0002_chatconversation_chatmessage_proposedplan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='completed_task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_task_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0004_task_plan_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summarized_until',
+            field=models.BigIntegerField(default=0, help_text='Id of the last ChatMessage folded into summary'),
+        ),
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+    ]
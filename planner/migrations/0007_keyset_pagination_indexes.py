@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0006_chatjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='chatmessage_conv_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='plan_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposedplan',
+            index=models.Index(fields=['conversation', 'is_accepted', '-created_at', '-id'], name='proposedplan_conv_open_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from planner.search import get_backend, rebuild
+
+
+def create_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        # No full-text support (e.g. SQLite without FTS5): search stays disabled
+        return
+    for sql in backend.create_sql:
+        schema_editor.execute(sql)
+    rebuild(
+        apps.get_model('planner', 'Plan'),
+        apps.get_model('planner', 'Task'),
+        apps.get_model('planner', 'ChatMessage'),
+        conn=schema_editor.connection,
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        for sql in backend.drop_sql:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='daily', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Repeat every this many days, weeks or months')),
+                ('weekdays', models.JSONField(blank=True, default=list, help_text='Weekdays of a weekly series, 0 = Monday')),
+                ('start_date', models.DateField()),
+                ('until', models.DateField()),
+                ('occurrence_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('completed_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_series', to='planner.plan')),
+            ],
+            options={
+                'verbose_name_plural': 'task series',
+                'ordering': ['start_date', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed')], default='pending', max_length=20)),
+                ('title', models.CharField(blank=True, help_text='Blank keeps the series title', max_length=200)),
+                ('description', models.TextField(blank=True, help_text='Null keeps the series description', null=True)),
+                ('cancelled', models.BooleanField(default=False, help_text='Skip this date')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overrides', to='planner.taskseries')),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='taskseries',
+            index=models.Index(fields=['plan', 'start_date', 'until'], name='taskseries_plan_range_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskoccurrence',
+            constraint=models.UniqueConstraint(fields=('series', 'date'), name='taskoccurrence_series_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+from planner.images import existing_variants
+
+
+def record_photo_variants(apps, schema_editor):
+    Task = apps.get_model('planner', 'Task')
+    for task in Task.objects.exclude(photo='').exclude(photo__isnull=True).only('id', 'photo').iterator():
+        keys = existing_variants(task.photo)
+        if keys:
+            Task.objects.filter(pk=task.pk).update(photo_variants=keys)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0011_task_pending_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(record_photo_variants, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,68 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import BooleanField, Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.urls import reverse
 from django.utils import timezone
+from PIL import Image
+
+from . import images, recurrence
+
+
+def task_counters_enabled():
+    """Whether Plan keeps denormalized task counters up to date."""
+    return getattr(settings, 'PLANNER_DENORMALIZED_TASK_COUNTS', False)
+
+
+def _task_count_subquery(**filters):
+    """COUNT of the outer plan's tasks matching filters, as a correlated subquery."""
+    return Coalesce(Subquery(
+        Task.objects.filter(plan=OuterRef('pk'), **filters)
+        .order_by()
+        .values('plan')
+        .annotate(n=Count('pk'))
+        .values('n')[:1]
+    ), 0)
+
+
+def _series_sum_subquery(field):
+    """SUM of a counter over the outer plan's task series, as a correlated subquery."""
+    return Coalesce(Subquery(
+        TaskSeries.objects.filter(plan=OuterRef('pk'))
+        .order_by()
+        .values('plan')
+        .annotate(n=Sum(field))
+        .values('n')[:1]
+    ), 0)
+
+
+class PlanQuerySet(models.QuerySet):
+    def with_task_stats(self):
+        """
+        Annotate each plan with task_total and task_completed so that listing
+        pages can read task stats without issuing per-plan COUNT queries.
+        Occurrences of recurring task series count as tasks.
+        """
+        if task_counters_enabled():
+            return self.annotate(
+                task_total=F('task_count'),
+                task_completed=F('completed_task_count'),
+            )
+        # Correlated subqueries rather than JOIN + GROUP BY, so a LIMITed
+        # page only counts the tasks of the plans it returns
+        return self.annotate(
+            task_total=_task_count_subquery() + _series_sum_subquery('occurrence_count'),
+            task_completed=_task_count_subquery(status='completed') + _series_sum_subquery('completed_count'),
+        )
+
+    def rebuild_task_counts(self):
+        """Recompute the denormalized counters from the Task table in one UPDATE."""
+        return self.update(
+            task_count=_task_count_subquery() + _series_sum_subquery('occurrence_count'),
+            completed_task_count=_task_count_subquery(status='completed') + _series_sum_subquery('completed_count'),
+        )
+
 
 class Plan(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='plans')
@@ -11,21 +73,57 @@ class Plan(models.Model):
     end_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    task_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_task_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PlanQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Dashboard pages are keyset ranges on (created_at, id) per user
+            models.Index(fields=['user', '-created_at', '-id'], name='plan_user_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_task_stats(self):
-        total_tasks = self.tasks.count()
-        completed_tasks = self.tasks.filter(status='completed').count()
+        if hasattr(self, 'task_total'):
+            return {
+                'total': self.task_total,
+                'completed': self.task_completed
+            }
+        if task_counters_enabled():
+            return {
+                'total': self.task_count,
+                'completed': self.completed_task_count
+            }
+        series = self.task_series.aggregate(total=Sum('occurrence_count'), completed=Sum('completed_count'))
+        total_tasks = self.tasks.count() + (series['total'] or 0)
+        completed_tasks = self.tasks.filter(status='completed').count() + (series['completed'] or 0)
         return {
             'total': total_tasks,
             'completed': completed_tasks
         }
 
+class TaskQuerySet(models.QuerySet):
+    def overdue(self, today=None):
+        """
+        Pending tasks dated before today (default: today in the active time
+        zone). Matches task_pending_date_idx, so counting a user's overdue
+        tasks reads only that index.
+        """
+        return self.filter(status='pending', task_date__lt=today or timezone.localdate())
+
+    def with_overdue(self, today=None):
+        """Annotate each task with `overdue`, which is_overdue() then reads instead of the clock."""
+        return self.annotate(overdue=Case(
+            When(status='pending', task_date__lt=today or timezone.localdate(), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ))
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -36,24 +134,252 @@ class Task(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     photo = models.ImageField(upload_to='task_photos/', blank=True, null=True)
+    # Keys of the photo's resized variants in storage, e.g. ['medium_webp', 'medium_jpeg']
+    photo_variants = models.JSONField(default=list, blank=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     task_date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
         ordering = ['task_date', '-created_at']
+        indexes = [
+            # Calendar views fetch one plan's tasks for a date window
+            models.Index(fields=['plan', 'task_date'], name='task_plan_date_idx'),
+            # Overdue lookups only ever want pending tasks before a date
+            models.Index(fields=['plan', 'task_date'], condition=Q(status='pending'), name='task_pending_date_idx'),
+        ]
+
+    _loaded_photo = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a replaced or cleared photo's variants can be removed
+        instance._loaded_photo = instance.__dict__.get('photo') or None
+        return instance
 
     def __str__(self):
         return f"{self.title} - {self.task_date}"
 
+    def edit_url(self):
+        return reverse('task_edit', args=[self.id])
+
+    @staticmethod
+    def adjust_plan_counters(plan_id, total=0, completed=0):
+        """Apply a delta to a plan's denormalized counters in a single UPDATE."""
+        if not task_counters_enabled() or plan_id is None or (total == 0 and completed == 0):
+            return
+        Plan.objects.filter(pk=plan_id).update(
+            task_count=F('task_count') + total,
+            completed_task_count=F('completed_task_count') + completed,
+        )
+
+    def _locked_counted_state(self):
+        """Current (plan_id, status) of this row in the DB, locked until commit."""
+        if self.pk is None:
+            return None
+        return (
+            Task.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list('plan_id', 'status')
+            .first()
+        )
+
+    def save(self, *args, **kwargs):
+        new_photo = bool(self.photo) and not self.photo._committed
+        if new_photo:
+            self._strip_photo_metadata()
+            # Store the file now so its variants are recorded in the same row write
+            self.photo.save(self.photo.name, self.photo.file, save=False)
+            self.photo_variants = self._build_photo_variants()
+        elif not self.photo:
+            self.photo_variants = []
+
+        if task_counters_enabled():
+            self._save_counted(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+
+        if self._loaded_photo and self._loaded_photo != self.photo.name:
+            self.delete_photo_variants(self._loaded_photo)
+        self._loaded_photo = self.photo.name or None
+
+    def delete_photo_variants(self, name):
+        """Remove the variants of a photo this task no longer uses, once the change commits."""
+        storage = self.photo.storage
+        transaction.on_commit(lambda: images.delete_variants(storage, name))
+
+    def _strip_photo_metadata(self):
+        try:
+            self.photo = images.strip_metadata(self.photo.file)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Keep the upload as-is; the form already validated it as an image
+            pass
+
+    def _build_photo_variants(self):
+        try:
+            return images.build_variants(self.photo)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # photo_urls falls back to the original
+            return []
+
+    def photo_urls(self):
+        """
+        URLs of the photo's recorded variants ('medium_webp', 'medium_jpeg', ...)
+        plus 'original', or {} when the task has no photo.
+        """
+        if not self.photo:
+            return {}
+        urls = images.variant_urls(self.photo, self.photo_variants)
+        urls['original'] = self.photo.url
+        return urls
+
+    def _save_counted(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None if self._state.adding else self._locked_counted_state()
+            super().save(*args, **kwargs)
+            done = 1 if self.status == 'completed' else 0
+            if previous is None:
+                self.adjust_plan_counters(self.plan_id, 1, done)
+                return
+            old_plan_id, old_status = previous
+            was_done = 1 if old_status == 'completed' else 0
+            if old_plan_id != self.plan_id:
+                self.adjust_plan_counters(old_plan_id, -1, -was_done)
+                self.adjust_plan_counters(self.plan_id, 1, done)
+            else:
+                self.adjust_plan_counters(self.plan_id, 0, done - was_done)
+
+    def delete(self, *args, **kwargs):
+        if not task_counters_enabled():
+            return super().delete(*args, **kwargs)
+
+        with transaction.atomic():
+            previous = self._locked_counted_state()
+            result = super().delete(*args, **kwargs)
+            if previous is not None:
+                old_plan_id, old_status = previous
+                self.adjust_plan_counters(old_plan_id, -1, -1 if old_status == 'completed' else 0)
+        return result
+
     def is_overdue(self):
+        if 'overdue' in self.__dict__:
+            return self.overdue
         if self.status == 'completed':
             return False
-        return self.task_date < timezone.now().date()
+        return self.task_date < timezone.localdate()
+
+class TaskSeries(models.Model):
+    """
+    A recurring task. Its occurrences are generated from the rule for the
+    dates being shown (see planner.recurrence) rather than stored as Tasks.
+    """
+    FREQUENCY_CHOICES = [
+        (recurrence.DAILY, 'Daily'),
+        (recurrence.WEEKLY, 'Weekly'),
+        (recurrence.MONTHLY, 'Monthly'),
+    ]
+
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='task_series')
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=recurrence.DAILY)
+    interval = models.PositiveSmallIntegerField(default=1, help_text='Repeat every this many days, weeks or months')
+    weekdays = models.JSONField(default=list, blank=True, help_text='Weekdays of a weekly series, 0 = Monday')
+    start_date = models.DateField()
+    until = models.DateField()
+    # Occurrences left after skips, and how many of them are completed
+    occurrence_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['start_date', 'id']
+        verbose_name_plural = 'task series'
+        indexes = [
+            models.Index(fields=['plan', 'start_date', 'until'], name='taskseries_plan_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.frequency})"
+
+    def count_dates(self):
+        return recurrence.count_occurrences(
+            self.start_date, self.until, self.frequency, self.interval, self.weekdays
+        )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.refresh_counts()
+
+    def refresh_counts(self):
+        """
+        Drop overrides for dates the rule no longer produces, then recompute
+        occurrence_count and completed_count and apply the change to the
+        plan's counters.
+        """
+        locked = TaskSeries.objects.select_for_update().filter(pk=self.pk)
+        old_total, old_completed = locked.values_list('occurrence_count', 'completed_count').get()
+        overrides = list(self.overrides.all())
+        stale = [override.pk for override in overrides if not recurrence.occurs_on(self, override.date)]
+        if stale:
+            TaskOccurrence.objects.filter(pk__in=stale).delete()
+        kept = [override for override in overrides if override.pk not in stale]
+        total = self.count_dates() - sum(1 for override in kept if override.cancelled)
+        completed = sum(1 for override in kept if not override.cancelled and override.status == 'completed')
+        locked.update(occurrence_count=total, completed_count=completed)
+        self.occurrence_count, self.completed_count = total, completed
+        Task.adjust_plan_counters(self.plan_id, total - old_total, completed - old_completed)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            counts = TaskSeries.objects.select_for_update().filter(pk=self.pk).values_list(
+                'occurrence_count', 'completed_count'
+            ).first()
+            result = super().delete(*args, **kwargs)
+            if counts is not None:
+                Task.adjust_plan_counters(self.plan_id, -counts[0], -counts[1])
+        return result
+
+    def edit_url(self):
+        return reverse('series_edit', args=[self.id])
+
+
+class TaskOccurrence(models.Model):
+    """
+    Override of one date of a TaskSeries. Dates without one take the
+    series' title and description and are pending. Written through
+    recurrence.update_occurrence, which keeps the counters in step.
+    """
+    series = models.ForeignKey(TaskSeries, on_delete=models.CASCADE, related_name='overrides')
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES, default='pending')
+    title = models.CharField(max_length=200, blank=True, help_text='Blank keeps the series title')
+    description = models.TextField(null=True, blank=True, help_text='Null keeps the series description')
+    cancelled = models.BooleanField(default=False, help_text='Skip this date')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'date'], name='taskoccurrence_series_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.series_id} on {self.date}"
 
 class ChatConversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_conversations')
+    # Rolling summary of older turns, maintained by chatbot.build_message_history
+    summary = models.TextField(blank=True)
+    summarized_until = models.BigIntegerField(default=0, help_text='Id of the last ChatMessage folded into summary')
+    # Set while the messages and proposals live in a ChatArchive (see planner.retention)
+    archived_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -63,6 +389,18 @@ class ChatConversation(models.Model):
     def __str__(self):
         return f"Chat {self.id} - {self.user.username}"
 
+class ChatArchive(models.Model):
+    """Compressed messages and proposals of an inactive conversation (see planner.retention)."""
+    conversation = models.OneToOneField(ChatConversation, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    data = models.BinaryField(help_text='zlib-compressed JSON')
+    message_count = models.PositiveIntegerField(default=0)
+    proposal_count = models.PositiveIntegerField(default=0)
+    raw_size = models.PositiveIntegerField(default=0, help_text='Bytes of JSON before compression')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of chat {self.conversation_id}"
+
 class ChatMessage(models.Model):
     ROLE_CHOICES = [
         ('user', 'User'),
@@ -76,6 +414,9 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['conversation', 'created_at', 'id'], name='chatmessage_conv_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
@@ -94,6 +435,43 @@ class ProposedPlan(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['conversation', 'is_accepted', '-created_at', '-id'], name='proposedplan_conv_open_idx'),
+        ]
 
     def __str__(self):
         return f"Proposed: {self.title}"
+
+class ChatJob(models.Model):
+    """A queued chat turn, run by `manage.py run_chat_workers` (see planner.jobs)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    conversation = models.ForeignKey(ChatConversation, on_delete=models.CASCADE, related_name='jobs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_jobs')
+    user_message = models.ForeignKey(ChatMessage, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text='Not picked up before this time (retry backoff)')
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    assistant_message = models.ForeignKey(ChatMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    proposed_plan = models.ForeignKey(ProposedPlan, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    proposal_error = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='chatjob_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status})"
@@ -0,0 +1,53 @@
+"""
+Keyset (cursor) pagination.
+
+A page is fetched with WHERE (field, id) < (last field, last id) instead of
+an OFFSET, so every page costs one index range scan however deep the user
+has scrolled, and rows created meanwhile don't shift later pages. The id
+breaks ties between rows with the same timestamp.
+"""
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from django.db.models import Q
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    return base64.urlsafe_b64encode(f"{value.isoformat()}|{pk}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(datetime, id) from encode_cursor; raises InvalidCursor for anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_page(queryset, field, cursor=None, size=20, descending=True):
+    """
+    Up to `size` rows of queryset ordered by (field, id), starting after
+    `cursor`. next_cursor is None on the last page.
+    """
+    op = 'lt' if descending else 'gt'
+    ordering = (f'-{field}', '-id') if descending else (field, 'id')
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk}))
+
+    # One extra row tells us whether there is another page
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return KeysetPage(rows, None)
+    rows = rows[:size]
+    return KeysetPage(rows, encode_cursor(getattr(rows[-1], field), rows[-1].pk))
@@ -0,0 +1,248 @@
+"""
+Recurring tasks.
+
+A TaskSeries stores a rule instead of one Task row per occurrence: daily,
+weekly (on chosen weekdays) or monthly, every `interval` periods, from
+start_date through until. Occurrences are generated on the fly, and only for
+the date window being shown, so a year-long daily habit is one row however
+much of it is on screen.
+
+TaskOccurrence rows are sparse overrides. Only a date that was completed,
+edited or skipped has one, and an override that is changed back to the
+series' values is deleted again.
+"""
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+DAILY, WEEKLY, MONTHLY = 'daily', 'weekly', 'monthly'
+FREQUENCIES = (DAILY, WEEKLY, MONTHLY)
+WEEKDAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+# Keeps counting a series' occurrences cheap however far `until` is
+MAX_OCCURRENCES = 3660
+
+
+def parse_weekdays(values):
+    """Sorted weekday numbers (0 = Monday) from numbers or names like 'mon'/'Monday'."""
+    if not isinstance(values, (list, tuple)):
+        raise ValueError("weekdays must be a list")
+    days = set()
+    for value in values:
+        if isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 6:
+            days.add(value)
+        elif isinstance(value, str) and value.strip()[:3].lower() in WEEKDAY_NAMES:
+            days.add(WEEKDAY_NAMES.index(value.strip()[:3].lower()))
+        else:
+            raise ValueError(f"Unknown weekday: {value!r}")
+    return sorted(days)
+
+
+def _add_months(day, months, anchor_day):
+    """anchor_day of the month `months` after day's, clamped to that month's length."""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    if not 1 <= year <= 9999:
+        return None
+    return day.replace(year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_dates(start_date, until, frequency, interval=1, weekdays=(), window_start=None, window_end=None):
+    """
+    Dates of a rule within [window_start, window_end] (both optional), in
+    order. Jumps straight to the window instead of stepping from start_date.
+    """
+    interval = max(int(interval or 1), 1)
+    low = max(start_date, window_start) if window_start else start_date
+    high = min(until, window_end) if window_end else until
+    if low > high:
+        return
+
+    if frequency == DAILY:
+        skip = -(-(low - start_date).days // interval)
+        day = start_date + timedelta(days=skip * interval)
+        step = timedelta(days=interval)
+        while day <= high:
+            yield day
+            day += step
+
+    elif frequency == WEEKLY:
+        days = sorted(set(weekdays)) or [start_date.weekday()]
+        first_monday = start_date - timedelta(days=start_date.weekday())
+        week = (low - first_monday).days // 7
+        # Round up to the next week the rule is active in
+        week = -(-week // interval) * interval
+        while True:
+            monday = first_monday + timedelta(weeks=week)
+            if monday > high:
+                return
+            for weekday in days:
+                day = monday + timedelta(days=weekday)
+                if day > high:
+                    return
+                if day >= low:
+                    yield day
+            week += interval
+
+    elif frequency == MONTHLY:
+        months = (low.year - start_date.year) * 12 + low.month - start_date.month
+        months = max(-(-months // interval) * interval - interval, 0)
+        while True:
+            day = _add_months(start_date, months, start_date.day)
+            if day is None or day > high:
+                return
+            if day >= low:
+                yield day
+            months += interval
+
+    else:
+        raise ValueError(f"Unknown frequency: {frequency!r}")
+
+
+def count_occurrences(start_date, until, frequency, interval=1, weekdays=(), limit=MAX_OCCURRENCES):
+    """Number of dates the rule produces, stopping at limit + 1."""
+    dates = occurrence_dates(start_date, until, frequency, interval, weekdays)
+    return sum(1 for _ in islice(dates, limit + 1))
+
+
+def series_dates(series, window_start=None, window_end=None):
+    return occurrence_dates(
+        series.start_date, series.until, series.frequency, series.interval, series.weekdays,
+        window_start, window_end,
+    )
+
+
+def occurs_on(series, day):
+    return next(series_dates(series, day, day), None) == day
+
+
+class Occurrence:
+    """
+    One date of a TaskSeries with its override, if any, applied. Has the
+    attributes templates and JSON views read from a Task.
+    """
+    id = None
+    photo = None
+
+    def __init__(self, series, task_date, override=None):
+        self.series = series
+        self.series_id = series.id
+        self.plan_id = series.plan_id
+        self.task_date = task_date
+        self.override = override
+        self.title = (override and override.title) or series.title
+        if override is not None and override.description is not None:
+            self.description = override.description
+        else:
+            self.description = series.description
+        self.status = override.status if override is not None else 'pending'
+        self.updated_at = max(series.updated_at, override.updated_at) if override is not None else series.updated_at
+
+    def __repr__(self):
+        return f"<Occurrence {self.series_id} {self.task_date}>"
+
+    def is_overdue(self):
+        if self.status == 'completed':
+            return False
+        return self.task_date < timezone.localdate()
+
+    def edit_url(self):
+        return reverse('occurrence_edit', args=[self.series_id, self.task_date.isoformat()])
+
+
+def expand(series, start=None, end=None, overrides=None):
+    """Occurrences of one series within [start, end], skipping cancelled dates."""
+    overrides = overrides or {}
+    for day in series_dates(series, start, end):
+        override = overrides.get(day)
+        if override is not None and override.cancelled:
+            continue
+        yield Occurrence(series, day, override)
+
+
+def overrides_by_series(series_ids, start=None, end=None):
+    """{series id: {date: TaskOccurrence}} for the given series, optionally within a window."""
+    from .models import TaskOccurrence
+
+    overrides = defaultdict(dict)
+    if not series_ids:
+        return overrides
+    queryset = TaskOccurrence.objects.filter(series_id__in=series_ids)
+    if start is not None and end is not None:
+        queryset = queryset.filter(date__range=(start, end))
+    for override in queryset:
+        overrides[override.series_id][override.date] = override
+    return overrides
+
+
+def plan_occurrences(plan_id, start, end):
+    """
+    Occurrences of every series of the plan within [start, end]: one query
+    for the series overlapping the window and, if there are any, one for
+    their overrides in it.
+    """
+    from .models import TaskSeries
+
+    series_list = list(TaskSeries.objects.filter(plan_id=plan_id, start_date__lte=end, until__gte=start))
+    if not series_list:
+        return []
+    overrides = overrides_by_series([series.id for series in series_list], start, end)
+    return [
+        occurrence
+        for series in series_list
+        for occurrence in expand(series, start, end, overrides[series.id])
+    ]
+
+
+def update_occurrence(series, day, toggle_status=False, **changes):
+    """
+    Change one occurrence (status, title, description or cancelled) and
+    return it; toggle_status flips its status under the row lock. Stores the
+    override only while it differs from the series and keeps the series'
+    and plan's counters in step.
+    """
+    from .models import Task, TaskOccurrence, TaskSeries
+
+    defaults = {'status': 'pending', 'title': '', 'description': None, 'cancelled': False}
+    with transaction.atomic():
+        override = TaskOccurrence.objects.select_for_update().filter(series=series, date=day).first()
+        before = {field: getattr(override, field) for field in defaults} if override else dict(defaults)
+        if toggle_status:
+            changes['status'] = 'completed' if before['status'] == 'pending' else 'pending'
+        after = {**before, **changes}
+        if after['title'] == series.title:
+            after['title'] = ''
+        if after['description'] == series.description:
+            after['description'] = None
+
+        if after == defaults:
+            if override is not None:
+                override.delete()
+            override = None
+        elif override is None:
+            override = TaskOccurrence.objects.create(series=series, date=day, **after)
+        elif after != before:
+            for field, value in after.items():
+                setattr(override, field, value)
+            override.save()
+
+        def counted(state):
+            return (0, 0) if state['cancelled'] else (1, 1 if state['status'] == 'completed' else 0)
+
+        (total_before, done_before), (total_after, done_after) = counted(before), counted(after)
+        total, completed = total_after - total_before, done_after - done_before
+        # updated_at is bumped even without a count change; the calendar's ETag reads it
+        TaskSeries.objects.filter(pk=series.pk).update(
+            occurrence_count=F('occurrence_count') + total,
+            completed_count=F('completed_count') + completed,
+            updated_at=timezone.now(),
+        )
+        Task.adjust_plan_counters(series.plan_id, total, completed)
+
+    return Occurrence(series, day, override)
@@ -0,0 +1,216 @@
+"""
+Chat retention: archiving inactive conversations.
+
+archive_inactive() finds conversations nobody has touched for
+CHATBOT_ARCHIVE_AFTER_DAYS and no queued or running job. For each one, it
+writes every ChatMessage and ProposedPlan into a single zlib-compressed JSON
+blob in ChatArchive. It then deletes the originals in batches and marks the
+conversation with archived_at. Finished ChatJobs of the conversation are
+deleted with the messages.
+
+Archived messages drop out of search. Opening the conversation again calls
+restore_conversation(), which re-creates the rows with their original ids
+and timestamps, so summaries, pagination cursors and search entries stay
+valid.
+
+Run it with `manage.py archive_chats`, e.g. daily from cron.
+"""
+import json
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from . import search
+from .models import ChatArchive, ChatConversation, ChatJob, ChatMessage, ProposedPlan
+
+ARCHIVE_VERSION = 1
+_PROPOSAL_FIELDS = ('id', 'user_id', 'title', 'description', 'color', 'is_accepted', 'tasks_data')
+
+ArchiveResult = namedtuple('ArchiveResult', ['messages', 'proposals', 'raw_size', 'stored_size'])
+
+
+def _batch_size(batch_size=None):
+    return batch_size or getattr(settings, 'CHATBOT_ARCHIVE_BATCH_SIZE', 500)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def archivable(older_than=None):
+    """Conversations inactive since older_than (default: CHATBOT_ARCHIVE_AFTER_DAYS ago)."""
+    if older_than is None:
+        older_than = timezone.now() - timedelta(days=getattr(settings, 'CHATBOT_ARCHIVE_AFTER_DAYS', 30))
+    active_jobs = ChatJob.objects.filter(status__in=('queued', 'running')).values('conversation_id')
+    return (
+        ChatConversation.objects
+        .filter(archived_at__isnull=True, updated_at__lt=older_than)
+        .exclude(id__in=active_jobs)
+    )
+
+
+def _restore_created_at(model, rows, batch_size):
+    """Put back created_at values, which auto_now_add overwrote on insert."""
+    for batch in _chunks(rows, batch_size):
+        model.objects.filter(id__in=[row_id for row_id, _ in batch]).update(
+            created_at=Case(*(When(id=row_id, then=Value(created_at)) for row_id, created_at in batch))
+        )
+
+
+def _delete_messages(message_ids):
+    """
+    Delete messages and their search entries, one statement each. A plain
+    delete() would load every row to send post_delete, whose receiver in
+    signals.py removes search entries one at a time. Nothing else cascades
+    from a message once the conversation's jobs are gone.
+    """
+    search.remove_documents([search.doc_id(search.MESSAGE, message_id) for message_id in message_ids])
+    table = connection.ops.quote_name(ChatMessage._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(message_ids))})", list(message_ids)
+        )
+
+
+def archive_conversation(conversation, batch_size=None, older_than=None):
+    """
+    Move one conversation's messages and proposals into a ChatArchive.
+    Returns an ArchiveResult, or None if it is no longer archivable (it was
+    used, got a job or was archived since it was selected).
+    """
+    batch_size = _batch_size(batch_size)
+    with transaction.atomic():
+        locked = archivable(older_than).select_for_update().filter(pk=conversation.pk).first()
+        if locked is None:
+            return None
+
+        messages = list(
+            ChatMessage.objects.filter(conversation=locked).order_by('id')
+            .values_list('id', 'role', 'content', 'created_at')
+        )
+        proposals = list(
+            ProposedPlan.objects.filter(conversation=locked).order_by('id')
+            .values(*_PROPOSAL_FIELDS, 'start_date', 'end_date', 'created_at')
+        )
+        payload = {
+            'version': ARCHIVE_VERSION,
+            'messages': [
+                [message_id, role, content, created_at.isoformat()]
+                for message_id, role, content, created_at in messages
+            ],
+            'proposals': [
+                {
+                    **{field: proposal[field] for field in _PROPOSAL_FIELDS},
+                    'start_date': proposal['start_date'].isoformat(),
+                    'end_date': proposal['end_date'].isoformat() if proposal['end_date'] else None,
+                    'created_at': proposal['created_at'].isoformat(),
+                }
+                for proposal in proposals
+            ],
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        data = zlib.compress(raw, 6)
+        ChatArchive.objects.create(
+            conversation=locked,
+            data=data,
+            message_count=len(messages),
+            proposal_count=len(proposals),
+            raw_size=len(raw),
+        )
+
+        # Jobs reference the messages; all of them are finished (see archivable())
+        ChatJob.objects.filter(conversation=locked).delete()
+        # Only the rows that went into the archive, so a message written meanwhile is kept
+        for batch in _chunks([proposal['id'] for proposal in proposals], batch_size):
+            ProposedPlan.objects.filter(id__in=batch).delete()
+        for batch in _chunks([message[0] for message in messages], batch_size):
+            _delete_messages(batch)
+
+        # update() rather than save() so updated_at keeps the last activity
+        ChatConversation.objects.filter(pk=locked.pk).update(archived_at=timezone.now())
+    return ArchiveResult(len(messages), len(proposals), len(raw), len(data))
+
+
+def restore_conversation(conversation, batch_size=None):
+    """
+    Put an archived conversation's messages and proposals back and delete
+    the archive. Returns True if anything was restored. Reopening counts as
+    activity, so updated_at moves to now.
+    """
+    if conversation.archived_at is None:
+        return False
+    batch_size = _batch_size(batch_size)
+    with transaction.atomic():
+        locked = ChatConversation.objects.select_for_update().filter(pk=conversation.pk).first()
+        if locked is None or locked.archived_at is None:
+            conversation.archived_at = None
+            return False
+        archive = ChatArchive.objects.filter(conversation=locked).first()
+        if archive is not None:
+            payload = json.loads(zlib.decompress(archive.data))
+            _restore_payload(locked, payload, batch_size)
+            archive.delete()
+        now = timezone.now()
+        ChatConversation.objects.filter(pk=locked.pk).update(archived_at=None, updated_at=now)
+    conversation.archived_at = None
+    conversation.updated_at = now
+    return True
+
+
+def _restore_payload(conversation, payload, batch_size):
+    if payload.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported chat archive version: {payload.get('version')!r}")
+
+    messages = [
+        ChatMessage(id=message_id, conversation=conversation, role=role, content=content)
+        for message_id, role, content, _ in payload['messages']
+    ]
+    ChatMessage.objects.bulk_create(messages, batch_size=batch_size)
+    _restore_created_at(ChatMessage, [
+        (message_id, datetime.fromisoformat(created_at))
+        for message_id, _, _, created_at in payload['messages']
+    ], batch_size)
+    # bulk_create sends no post_save, so index the messages here
+    for batch in _chunks(messages, batch_size):
+        search.index_documents([search.message_document(message, conversation.user_id) for message in batch])
+
+    proposals = [
+        ProposedPlan(
+            conversation=conversation,
+            start_date=proposal['start_date'],
+            end_date=proposal['end_date'],
+            **{field: proposal[field] for field in _PROPOSAL_FIELDS},
+        )
+        for proposal in payload['proposals']
+    ]
+    ProposedPlan.objects.bulk_create(proposals, batch_size=batch_size)
+    _restore_created_at(ProposedPlan, [
+        (proposal['id'], datetime.fromisoformat(proposal['created_at'])) for proposal in payload['proposals']
+    ], batch_size)
+
+
+def archive_inactive(older_than=None, batch_size=None, limit=None):
+    """
+    Archive every archivable conversation, one transaction each. Returns
+    totals: conversations, messages, proposals, raw_bytes and stored_bytes.
+    """
+    totals = {'conversations': 0, 'messages': 0, 'proposals': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+    candidates = archivable(older_than).order_by('updated_at').values_list('id', flat=True)
+    if limit:
+        candidates = candidates[:limit]
+    for conversation_id in list(candidates):
+        result = archive_conversation(ChatConversation(pk=conversation_id), batch_size, older_than)
+        if result is None:
+            continue
+        totals['conversations'] += 1
+        totals['messages'] += result.messages
+        totals['proposals'] += result.proposals
+        totals['raw_bytes'] += result.raw_size
+        totals['stored_bytes'] += result.stored_size
+    return totals
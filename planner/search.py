@@ -0,0 +1,287 @@
+"""
+Full-text search over a user's plans, tasks and chat messages.
+
+Documents live in one index table, planner_search, keyed by object id * 4
++ kind (recurring task series take kind 0) so an object's entry is written
+and deleted by primary key. On SQLite it is an FTS5 table. The owner column
+holds a "u<user id>" token, so a search is a single index intersection of
+the owner's postings and the query terms (matched in title and body only)
+rather than a filter over every match. On PostgreSQL it is a plain table
+with a generated, weighted tsvector column behind a GIN index.
+
+signals.py keeps entries in sync when a Plan, Task, TaskSeries or
+ChatMessage is saved or deleted. Bulk inserts call index_documents();
+`manage.py rebuild_search_index` rebuilds everything.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.db import connection
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+SERIES, PLAN, TASK, MESSAGE = 0, 1, 2, 3
+KIND_NAMES = {SERIES: 'recurring task', PLAN: 'plan', TASK: 'task', MESSAGE: 'message'}
+
+TABLE = 'planner_search'
+# Highlight markers; swapped for <mark> after the snippet is HTML-escaped
+_START, _END = '\x02', '\x03'
+_TERM = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 8
+
+SearchResult = namedtuple('SearchResult', ['kind', 'object', 'title', 'snippet', 'url', 'rank'])
+
+
+def doc_id(kind, object_id):
+    return object_id * 4 + kind
+
+
+def split_doc_id(value):
+    return value % 4, value // 4
+
+
+def _terms(query):
+    return _TERM.findall(query.lower())[:MAX_TERMS]
+
+
+@lru_cache(maxsize=None)
+def fts5_available():
+    """Whether the SQLite library Python is linked against has FTS5."""
+    import sqlite3
+    conn = sqlite3.connect(':memory:')
+    try:
+        return any(row[0] == 'ENABLE_FTS5' for row in conn.execute("PRAGMA compile_options"))
+    finally:
+        conn.close()
+
+
+class SQLiteSearchBackend:
+    create_sql = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "title, body, owner, "
+        "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')",
+    ]
+    drop_sql = [f"DROP TABLE IF EXISTS {TABLE}"]
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {TABLE} (rowid, title, body, owner) VALUES (%s, %s, %s, %s)",
+            [(doc, title, body, f"u{user_id}") for doc, user_id, title, body in rows],
+        )
+
+    def delete(self, cursor, doc_ids):
+        doc_ids = list(doc_ids)
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(doc_ids))})", doc_ids)
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    def search(self, cursor, user_id, terms, limit):
+        # Every term is quoted, so user input can't inject FTS5 syntax;
+        # the last one is a prefix so results appear while typing
+        phrases = [f'"{term}"' for term in terms]
+        phrases[-1] += '*'
+        # Terms must not match the owner column's "u<id>" tokens
+        match = f"owner:u{user_id} AND {{title body}}: ({' '.join(phrases)})"
+        cursor.execute(
+            f"SELECT rowid, bm25({TABLE}, 10.0, 1.0, 0.0) AS score, title, "
+            f"snippet({TABLE}, 1, char(2), char(3), '…', 16) "
+            f"FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY score LIMIT %s",
+            [match, limit],
+        )
+        # bm25() is lower-is-better; flip it so higher rank means more relevant
+        return [(doc, -score, title, snippet) for doc, score, title, snippet in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    create_sql = [
+        f"""CREATE TABLE IF NOT EXISTS {TABLE} (
+            id bigint PRIMARY KEY,
+            user_id integer NOT NULL,
+            title text NOT NULL DEFAULT '',
+            body text NOT NULL DEFAULT '',
+            document tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')
+            ) STORED
+        )""",
+        f"CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING GIN (document)",
+        f"CREATE INDEX IF NOT EXISTS {TABLE}_user_idx ON {TABLE} (user_id)",
+    ]
+    drop_sql = [f"DROP TABLE IF EXISTS {TABLE}"]
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (id, user_id, title, body) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (id) DO UPDATE SET user_id = EXCLUDED.user_id, title = EXCLUDED.title, body = EXCLUDED.body",
+            rows,
+        )
+
+    def delete(self, cursor, doc_ids):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE id = ANY(%s)", [list(doc_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {TABLE}")
+
+    def search(self, cursor, user_id, terms, limit):
+        query = ' & '.join(f"{term}:*" if i == len(terms) - 1 else term for i, term in enumerate(terms))
+        # Headlines are built only for the page of top-ranked rows
+        cursor.execute(
+            f"""SELECT id, rank, title,
+                       ts_headline('english', body, query,
+                                   'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=24, MinWords=8')
+                FROM (
+                    SELECT id, title, body, query, ts_rank_cd(document, query) AS rank
+                    FROM {TABLE}, to_tsquery('english', %s) AS query
+                    WHERE user_id = %s AND document @@ query
+                    ORDER BY rank DESC
+                    LIMIT %s
+                ) AS ranked
+                ORDER BY rank DESC""",
+            [query, user_id, limit],
+        )
+        return cursor.fetchall()
+
+
+def get_backend(conn=None):
+    """Search backend for the connection, or None if it has no usable full-text index."""
+    conn = conn or connection
+    if conn.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if conn.vendor == 'sqlite' and fts5_available():
+        return SQLiteSearchBackend()
+    return None
+
+
+def plan_document(plan):
+    return doc_id(PLAN, plan.pk), plan.user_id, plan.title, plan.description or ''
+
+
+def task_document(task, user_id):
+    return doc_id(TASK, task.pk), user_id, task.title, task.description or ''
+
+
+def series_document(series, user_id):
+    return doc_id(SERIES, series.pk), user_id, series.title, series.description or ''
+
+
+def message_document(message, user_id):
+    return doc_id(MESSAGE, message.pk), user_id, '', message.content
+
+
+def index_documents(rows):
+    """Add or replace index entries; rows are (doc_id, user_id, title, body)."""
+    backend = get_backend()
+    if backend is None or not rows:
+        return
+    with connection.cursor() as cursor:
+        backend.upsert(cursor, rows)
+
+
+def remove_documents(doc_ids):
+    """Drop index entries in one statement; callers batch large deletes."""
+    backend = get_backend()
+    if backend is None or not doc_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, doc_ids)
+
+
+def rebuild(plan_model=None, task_model=None, message_model=None, batch_size=2000, conn=None, series_model=None):
+    """
+    Replace the whole index with documents for every plan, task, task
+    series and message, streaming rows in batches. The model arguments let
+    migrations pass historical models. Returns a dict of documents indexed per kind.
+    """
+    from .models import ChatMessage, Plan, Task, TaskSeries
+
+    conn = conn or connection
+    backend = get_backend(conn)
+    if backend is None:
+        return None
+    sources = {
+        'plans': (plan_model or Plan).objects.values_list('id', 'user_id', 'title', 'description'),
+        'tasks': (task_model or Task).objects.values_list('id', 'plan__user_id', 'title', 'description'),
+        'messages': (message_model or ChatMessage).objects.values_list('id', 'conversation__user_id', 'content'),
+    }
+    # Migrations that predate TaskSeries pass historical models without one
+    series_model = series_model or (TaskSeries if plan_model is None else None)
+    if series_model is not None:
+        sources['series'] = series_model.objects.values_list('id', 'plan__user_id', 'title', 'description')
+    kinds = {'plans': PLAN, 'tasks': TASK, 'series': SERIES, 'messages': MESSAGE}
+    counts = {}
+    with conn.cursor() as cursor:
+        backend.clear(cursor)
+        for name, rows in sources.items():
+            kind = kinds[name]
+            counts[name] = 0
+            batch = []
+            for row in rows.order_by().iterator(chunk_size=batch_size):
+                if kind == MESSAGE:
+                    object_id, user_id, body = row
+                    batch.append((doc_id(kind, object_id), user_id, '', body))
+                else:
+                    object_id, user_id, title, body = row
+                    batch.append((doc_id(kind, object_id), user_id, title, body or ''))
+                if len(batch) >= batch_size:
+                    backend.upsert(cursor, batch)
+                    counts[name] += len(batch)
+                    batch = []
+            if batch:
+                backend.upsert(cursor, batch)
+                counts[name] += len(batch)
+    return counts
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(_START, '<mark>').replace(_END, '</mark>'))
+
+
+def search(user, query, limit=20):
+    """
+    Ranked SearchResults for the user's plans, tasks and messages matching
+    every word of query (the last as a prefix). Returns None when the
+    database has no full-text index.
+    """
+    from .models import ChatMessage, Plan, Task, TaskSeries
+
+    backend = get_backend()
+    if backend is None:
+        return None
+    terms = _terms(query)
+    if not terms:
+        return []
+    with connection.cursor() as cursor:
+        hits = backend.search(cursor, user.pk, terms, limit)
+
+    ids = {SERIES: [], PLAN: [], TASK: [], MESSAGE: []}
+    for doc, *_ in hits:
+        kind, object_id = split_doc_id(doc)
+        ids[kind].append(object_id)
+    # Loading the objects also drops entries whose rows are gone
+    objects = {
+        SERIES: TaskSeries.objects.filter(plan__user=user).in_bulk(ids[SERIES]) if ids[SERIES] else {},
+        PLAN: Plan.objects.filter(user=user).in_bulk(ids[PLAN]) if ids[PLAN] else {},
+        TASK: Task.objects.filter(plan__user=user).in_bulk(ids[TASK]) if ids[TASK] else {},
+        MESSAGE: ChatMessage.objects.filter(conversation__user=user).in_bulk(ids[MESSAGE]) if ids[MESSAGE] else {},
+    }
+
+    results = []
+    for doc, rank, title, snippet in hits:
+        kind, object_id = split_doc_id(doc)
+        obj = objects[kind].get(object_id)
+        if obj is None:
+            continue
+        if kind == PLAN:
+            url = reverse('plan_detail', args=[obj.pk])
+        elif kind in (TASK, SERIES):
+            day = obj.task_date if kind == TASK else obj.start_date
+            url = f"{reverse('plan_detail', args=[obj.plan_id])}?year={day.year}&month={day.month}"
+        else:
+            url = f"{reverse('chatbot')}?conversation={obj.conversation_id}"
+            title = 'Chat message'
+        if not snippet and kind != MESSAGE:
+            snippet = obj.description or ''
+        results.append(SearchResult(KIND_NAMES[kind], obj, title, _highlight(snippet or title), url, rank))
+    return results
@@ -0,0 +1,90 @@
+"""
+Synthetic data generation for load testing and benchmarks.
+
+Everything is derived from a seeded random.Random, so the same arguments
+always produce the same data set.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import search
+from .models import Plan, Task, ChatConversation, ChatMessage
+
+PLAN_COLORS = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6']
+PLAN_TOPICS = ['Trip', 'Workout', 'Study', 'Garden', 'Reading', 'Marathon', 'Move', 'Launch']
+TASK_WORDS = ['Visit', 'Run', 'Read', 'Pack', 'Book', 'Review', 'Cook', 'Call', 'Stretch', 'Write']
+SEED_PASSWORD = 'benchmark-password'
+
+
+def seed(users=10, plans_per_user=20, tasks_per_plan=100, conversations_per_user=3,
+         messages_per_conversation=40, start=date(2025, 1, 1), seed=42,
+         username_prefix='seed-user', batch_size=1000, stdout=None):
+    """
+    Create users with plans, tasks, conversations and messages via bulk_create.
+    Users are named f"{username_prefix}-{n}" with password SEED_PASSWORD.
+    Returns a dict of row counts created.
+    """
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)
+    counts = {'users': 0, 'plans': 0, 'tasks': 0, 'conversations': 0, 'messages': 0}
+
+    for n in range(users):
+        # One transaction per user keeps memory and lock time bounded at scale
+        with transaction.atomic():
+            user = User.objects.create(username=f"{username_prefix}-{n}", password=password)
+            counts['users'] += 1
+
+            plans = Plan.objects.bulk_create([
+                Plan(
+                    user=user,
+                    title=f"{rng.choice(PLAN_TOPICS)} plan {p}",
+                    description=f"Synthetic plan {p} for {user.username}",
+                    color=rng.choice(PLAN_COLORS),
+                    start_date=start + timedelta(days=rng.randrange(365)),
+                ) for p in range(plans_per_user)
+            ], batch_size=batch_size)
+            search.index_documents([search.plan_document(plan) for plan in plans])
+            counts['plans'] += len(plans)
+
+            for plan in plans:
+                tasks = []
+                for t in range(tasks_per_plan):
+                    tasks.append(Task(
+                        plan=plan,
+                        title=f"{rng.choice(TASK_WORDS)} {t}",
+                        description='',
+                        task_date=plan.start_date + timedelta(days=t * rng.randint(1, 3) // 2),
+                        status='completed' if rng.random() < 0.4 else 'pending',
+                    ))
+                Task.objects.bulk_create(tasks, batch_size=batch_size)
+                search.index_documents([search.task_document(task, user.id) for task in tasks])
+                counts['tasks'] += len(tasks)
+            Plan.objects.filter(user=user).rebuild_task_counts()
+
+            conversations = ChatConversation.objects.bulk_create([
+                ChatConversation(user=user) for _ in range(conversations_per_user)
+            ], batch_size=batch_size)
+            counts['conversations'] += len(conversations)
+
+            messages = []
+            for conversation in conversations:
+                for m in range(messages_per_conversation):
+                    role = 'user' if m % 2 == 0 else 'assistant'
+                    words = rng.randint(5, 80)
+                    messages.append(ChatMessage(
+                        conversation=conversation,
+                        role=role,
+                        content=' '.join(rng.choice(TASK_WORDS).lower() for _ in range(words)),
+                    ))
+            ChatMessage.objects.bulk_create(messages, batch_size=batch_size)
+            search.index_documents([search.message_document(message, user.id) for message in messages])
+            counts['messages'] += len(messages)
+
+        if stdout is not None:
+            stdout.write(f"Seeded {user.username}")
+
+    return counts
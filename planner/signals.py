@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .auth import invalidate_user
+from .models import ChatConversation, ChatMessage, Plan, Task, TaskSeries
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Drop the copy CachedModelBackend serves request.user from
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    if instance._loaded_photo:
+        instance.delete_photo_variants(instance._loaded_photo)
+
+
+def _owner_id(instance, field, model):
+    """User id behind instance's `field` FK, without a query when it's already loaded."""
+    descriptor = type(instance)._meta.get_field(field)
+    if descriptor.is_cached(instance):
+        return getattr(instance, field).user_id
+    return model.objects.values_list('user_id', flat=True).get(pk=getattr(instance, f'{field}_id'))
+
+
+@receiver(post_save, sender=Plan)
+def plan_indexed(sender, instance, **kwargs):
+    search.index_documents([search.plan_document(instance)])
+
+
+@receiver(post_save, sender=Task)
+def task_indexed(sender, instance, **kwargs):
+    search.index_documents([search.task_document(instance, _owner_id(instance, 'plan', Plan))])
+
+
+@receiver(post_save, sender=TaskSeries)
+def series_indexed(sender, instance, **kwargs):
+    search.index_documents([search.series_document(instance, _owner_id(instance, 'plan', Plan))])
+
+
+@receiver(post_save, sender=ChatMessage)
+def message_indexed(sender, instance, **kwargs):
+    search.index_documents([search.message_document(instance, _owner_id(instance, 'conversation', ChatConversation))])
+
+
+@receiver(post_delete, sender=Plan)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=TaskSeries)
+@receiver(post_delete, sender=ChatMessage)
+def document_removed(sender, instance, **kwargs):
+    kind = {Plan: search.PLAN, Task: search.TASK, TaskSeries: search.SERIES, ChatMessage: search.MESSAGE}[sender]
+    search.remove_documents([search.doc_id(kind, instance.pk)])
@@ -1,3 +1,1385 @@
-from django.test import TestCase
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import json
+import unittest
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.utils import ConnectionHandler
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.template.loaders.filesystem import Loader as FilesystemLoader
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from . import benchmarks, chatbot, images, jobs, recurrence, retention, search, seeding, transfer, views
+from .llm import FakeProvider, GeminiProvider, get_provider
+from .middleware import QueryBudgetExceeded
+from .models import ChatConversation, ChatJob, ChatMessage, Plan, ProposedPlan, Task, TaskOccurrence, TaskSeries
+from .pagination import keyset_page
+
+
+class PlannerTestCase(TestCase):
+    """Logged-in client for a fresh user, with every cache emptied between tests."""
+
+    def setUp(self):
+        # Cached grids, users and sessions would otherwise leak between tests
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+
+    def make_plan(self, user=None, **fields):
+        fields.setdefault('title', 'Plan')
+        fields.setdefault('start_date', date(2026, 10, 1))
+        return Plan.objects.create(user=user or self.user, **fields)
+
+
+class AcceptPlanTests(PlannerTestCase):
+    """Accepting a proposal validates every task first and inserts all of them or none."""
+
+    def make_proposal(self, tasks_data):
+        conversation = ChatConversation.objects.create(user=self.user)
+        return ProposedPlan.objects.create(
+            conversation=conversation,
+            user=self.user,
+            title='Proposed',
+            start_date=date(2026, 11, 1),
+            end_date=date(2026, 11, 30),
+            tasks_data=tasks_data,
+        )
+
+    def accept(self, proposal):
+        return self.client.post(reverse('chatbot_accept_plan', args=[proposal.id]))
+
+    def test_accept_creates_plan_with_every_task(self):
+        proposal = self.make_proposal([
+            {'title': 'One', 'task_date': '2026-11-01'},
+            {'title': 'Two', 'task_date': '2026-11-02', 'status': 'completed'},
+            {'title': 'Habit', 'task_date': '2026-11-03', 'repeat': {'frequency': 'daily', 'until': '2026-11-09'}},
+        ])
+        response = self.accept(proposal)
+
+        self.assertEqual(response.status_code, 200)
+        plan = Plan.objects.get(id=response.json()['plan_id'])
+        self.assertEqual(
+            sorted(plan.tasks.values_list('title', 'task_date', 'status')),
+            [('One', date(2026, 11, 1), 'pending'), ('Two', date(2026, 11, 2), 'completed')],
+        )
+        self.assertEqual(plan.task_series.get().title, 'Habit')
+        proposal.refresh_from_db()
+        self.assertTrue(proposal.is_accepted)
+
+    def test_second_accept_is_refused(self):
+        proposal = self.make_proposal([{'title': 'One', 'task_date': '2026-11-01'}])
+        self.assertEqual(self.accept(proposal).status_code, 200)
+
+        response = self.accept(proposal)
+
+        self.assertIn(response.status_code, (404, 409))
+        self.assertEqual(Plan.objects.count(), 1)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_bad_payload_writes_nothing(self):
+        proposal = self.make_proposal([
+            {'title': 'One', 'task_date': '2026-11-01'},
+            {'title': 'Two', 'task_date': 'next tuesday'},
+        ])
+        response = self.accept(proposal)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Task 2', response.json()['error'])
+        self.assertFalse(Plan.objects.exists())
+        self.assertFalse(Task.objects.exists())
+        proposal.refresh_from_db()
+        self.assertFalse(proposal.is_accepted)
+
+    def test_failure_while_inserting_rolls_back_everything(self):
+        proposal = self.make_proposal([
+            {'title': 'One', 'task_date': '2026-11-01'},
+            {'title': 'Habit', 'task_date': '2026-11-03', 'repeat': {'frequency': 'daily', 'until': '2026-11-09'}},
+        ])
+        with mock.patch.object(TaskSeries.objects, 'bulk_create', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                self.accept(proposal)
+
+        self.assertFalse(Plan.objects.exists())
+        self.assertFalse(Task.objects.exists())
+        proposal.refresh_from_db()
+        self.assertFalse(proposal.is_accepted)
+
+    def test_click_that_loses_the_race_creates_nothing(self):
+        proposal = self.make_proposal([{'title': 'One', 'task_date': '2026-11-01'}])
+        normalize = views._normalize_proposed_tasks
+
+        def accepted_meanwhile(*args):
+            # Another request claims the proposal after this one loaded it
+            ProposedPlan.objects.filter(pk=proposal.pk).update(is_accepted=True)
+            return normalize(*args)
+
+        with mock.patch('planner.views._normalize_proposed_tasks', side_effect=accepted_meanwhile):
+            response = self.accept(proposal)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Plan.objects.exists())
+
+    def test_tasks_are_inserted_in_batches(self):
+        proposal = self.make_proposal([{'title': f'Day {n}', 'task_date': '2026-11-01'} for n in range(1200)])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.accept(proposal)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Task.objects.count(), 1200)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "planner_task"')]
+        # Batches of 500, or fewer where the backend caps query parameters (SQLite)
+        self.assertLessEqual(len(inserts), 1200 // 100)
+
+
+class QueryBudgetTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_plan()
+
+    @override_settings(PLANNER_QUERY_BUDGET_STRICT=True)
+    def test_view_within_budget_passes_in_strict_mode(self):
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+
+    @override_settings(PLANNER_QUERY_BUDGET_STRICT=True)
+    def test_cold_agenda_stays_within_budget(self):
+        Task.objects.create(plan=Plan.objects.get(), title='Today', task_date=timezone.localdate())
+        for range_name in ('today', 'week'):
+            with self.subTest(range_name):
+                # Uncached session and user, as on a worker's first request
+                for cache in caches.all():
+                    cache.clear()
+                response = self.client.get(reverse('agenda'), {'range': range_name})
+                self.assertContains(response, 'Today')
+
+    @override_settings(PLANNER_QUERY_BUDGET_STRICT=True)
+    def test_cold_overdue_views_stay_within_budget(self):
+        Task.objects.create(plan=Plan.objects.get(), title='Late', task_date=timezone.localdate() - timedelta(days=1))
+        for name in ('overdue_tasks', 'overdue_badge'):
+            with self.subTest(name):
+                for cache in caches.all():
+                    cache.clear()
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    @override_settings(PLANNER_QUERY_BUDGET_STRICT=True, PLANNER_QUERY_BUDGETS={'dashboard': 0})
+    def test_view_over_budget_raises_in_strict_mode(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'dashboard ran'):
+            self.client.get(reverse('dashboard'))
+
+    @override_settings(PLANNER_QUERY_BUDGET_STRICT=False, PLANNER_QUERY_BUDGETS={'dashboard': 0})
+    def test_view_over_budget_only_warns_otherwise(self):
+        with self.assertLogs('planner.requests', 'WARNING') as logs:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('budget 0', logs.output[-1])
+
+
+def _image_upload(name, fmt):
+    buffer = BytesIO()
+    Image.new('RGB', (800, 600), (200, 40, 40)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class TaskPhotoTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.plan = self.make_plan()
+
+    def make_task(self, upload):
+        return Task.objects.create(plan=self.plan, title='Photo', task_date=date(2026, 10, 2), photo=upload)
+
+    def variant_files(self, task):
+        return [
+            images.variant_name(task.photo.name, variant, fmt)
+            for variant in images.PHOTO_VARIANTS
+            for fmt in images.variant_formats()
+        ]
+
+    def test_same_stem_photos_get_separate_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jpeg_task = self.make_task(_image_upload('foo.jpg', 'JPEG'))
+            png_task = self.make_task(_image_upload('foo.png', 'PNG'))
+
+        jpeg_variants, png_variants = self.variant_files(jpeg_task), self.variant_files(png_task)
+        self.assertFalse(set(jpeg_variants) & set(png_variants))
+        for name in jpeg_variants + png_variants:
+            self.assertTrue(jpeg_task.photo.storage.exists(name), name)
+
+    def test_replaced_and_cleared_photos_lose_their_variants(self):
+        task = self.make_task(_image_upload('first.jpg', 'JPEG'))
+        storage = task.photo.storage
+        first_variants = self.variant_files(task)
+
+        task = Task.objects.get(pk=task.pk)
+        task.photo = _image_upload('second.jpg', 'JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        self.assertFalse(any(storage.exists(name) for name in first_variants))
+        second_variants = self.variant_files(task)
+        self.assertTrue(all(storage.exists(name) for name in second_variants))
+
+        task = Task.objects.get(pk=task.pk)
+        task.photo = None
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        self.assertFalse(any(storage.exists(name) for name in second_variants))
+
+    def test_deleted_task_loses_its_variants(self):
+        task = self.make_task(_image_upload('gone.png', 'PNG'))
+        variants = self.variant_files(task)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.get(pk=task.pk).delete()
+
+        self.assertFalse(any(os.path.exists(os.path.join(self.media_root, name)) for name in variants))
+
+    def test_variants_are_recorded_and_rendered_without_probing_storage(self):
+        task = self.make_task(_image_upload('shown.jpg', 'JPEG'))
+        expected = [f'medium_{fmt}' for fmt in images.variant_formats()]
+        self.assertEqual(Task.objects.get(pk=task.pk).photo_variants, expected)
+
+        with mock.patch.object(FileSystemStorage, 'exists', autospec=True) as exists:
+            response = self.client.get(reverse('task_edit', args=[task.id]))
+        exists.assert_not_called()
+        medium_jpeg = images.variant_name(task.photo.name, 'medium', 'jpeg')
+        self.assertContains(response, task.photo.storage.url(medium_jpeg))
+
+    def test_photo_without_recorded_variants_shows_the_original(self):
+        task = self.make_task(_image_upload('legacy.jpg', 'JPEG'))
+        Task.objects.filter(pk=task.pk).update(photo_variants=[])
+
+        self.assertEqual(Task.objects.get(pk=task.pk).photo_urls(), {'original': task.photo.url})
+
+    def test_retired_thumbnails_are_removed_with_the_photo(self):
+        task = self.make_task(_image_upload('old.jpg', 'JPEG'))
+        storage = task.photo.storage
+        thumb = images.variant_name(task.photo.name, 'thumb', 'jpeg')
+        storage.save(thumb, ContentFile(b'thumb'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.get(pk=task.pk).delete()
+
+        self.assertFalse(storage.exists(thumb))
+
+
+class CalendarGridCacheTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = self.make_plan()
+        self.task = Task.objects.create(plan=self.plan, title='Original', task_date=date(2026, 10, 5))
+        self.url = f"{reverse('plan_detail', args=[self.plan.id])}?year=2026&month=10"
+
+    def test_grid_follows_changes_made_by_another_process(self):
+        self.assertContains(self.client.get(self.url), 'Original')
+        # A queryset update runs no signals or cache code here, like a write
+        # handled by another worker with its own local cache
+        Task.objects.filter(pk=self.task.pk).update(title='Renamed', updated_at=timezone.now())
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Renamed')
+        self.assertNotContains(response, 'Original')
+
+    def test_deleted_task_leaves_the_grid(self):
+        self.assertContains(self.client.get(self.url), 'Original')
+        Task.objects.filter(pk=self.task.pk).delete()
+
+        self.assertNotContains(self.client.get(self.url), 'Original')
+
+    def test_unchanged_month_is_served_from_cache(self):
+        self.client.get(self.url)
+        with mock.patch('planner.views.render_to_string') as render:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        render.assert_not_called()
+
+
+class TemplateCacheTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = self.make_plan(title='Marathon')
+        self.task = Task.objects.create(plan=self.plan, title='Long run', task_date=date(2026, 10, 4))
+
+    def test_templates_come_from_the_cached_loader(self):
+        backend, = engines.all()
+        loader, = backend.engine.template_loaders
+        self.assertIsInstance(loader, CachedLoader)
+
+        self.client.get(reverse('dashboard'))
+        self.assertIn('planner/partials/plan_cards.html', loader.get_template_cache)
+        with mock.patch.object(FilesystemLoader, 'get_contents') as get_contents:
+            self.client.get(reverse('dashboard'))
+        get_contents.assert_not_called()
+
+    def test_card_is_served_from_cache_until_its_tasks_change(self):
+        self.assertContains(self.client.get(reverse('dashboard')), '0/1 Completed')
+        # Not part of the key, so the cached card still shows the old title
+        Plan.objects.filter(pk=self.plan.pk).update(title='Renamed')
+        self.assertContains(self.client.get(reverse('dashboard')), 'Marathon')
+
+        self.task.status = 'completed'
+        self.task.save()
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, '1/1 Completed')
+        self.assertContains(response, 'Renamed')
+
+
+class TaskBatchUpdateTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        plan = self.make_plan()
+        self.tasks = [
+            Task.objects.create(plan=plan, title=f'Task {n}', task_date=date(2026, 10, n)) for n in (1, 2)
+        ]
+        other = User.objects.create_user('mallory', password='pw')
+        self.foreign = Task.objects.create(plan=self.make_plan(user=other), title='Theirs', task_date=date(2026, 10, 1))
+
+    def batch(self, payload):
+        return self.client.post(reverse('task_batch_update'), json.dumps(payload), content_type='application/json')
+
+    def test_updates_status_and_date_of_every_task(self):
+        response = self.batch({'task_ids': [task.id for task in self.tasks], 'status': 'completed', 'date_offset': 7})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(task['status'], task['task_date']) for task in response.json()['tasks']],
+            [('completed', '2026-10-08'), ('completed', '2026-10-09')],
+        )
+
+    def test_task_of_another_user_is_404_and_nothing_changes(self):
+        response = self.batch({'task_ids': [self.tasks[0].id, self.foreign.id], 'status': 'completed'})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['task_ids'], [self.foreign.id])
+        self.assertFalse(Task.objects.filter(status='completed').exists())
+
+
+class ConditionalGetTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = self.make_plan(title='Cached plan')
+
+    def assert_revalidates(self, url):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_dashboard_shows_message_queued_before_redirect(self):
+        url = reverse('dashboard')
+        etag = self.assert_revalidates(url)
+
+        # A failed import queues an error and redirects to the dashboard
+        response = self.client.post(reverse('plans_import'))
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No file uploaded')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_plan_detail_shows_message_queued_before_redirect(self):
+        url = reverse('plan_detail', args=[self.plan.id])
+        etag = self.assert_revalidates(url)
+
+        response = self.client.post(reverse('task_create', args=[self.plan.id]), {
+            'title': 'New task', 'description': '', 'status': 'pending', 'task_date': '2026-10-03',
+        })
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Task created successfully!')
+
+
+@override_settings(CHATBOT_PROVIDER='fake')
+class ChatStreamTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = ChatConversation.objects.create(user=self.user)
+        self.async_client.force_login(self.user)
+
+    async def stream(self, message):
+        response = await self.async_client.post(
+            reverse('chatbot_stream_message'),
+            json.dumps({'message': message, 'conversation_id': self.conversation.id}),
+            content_type='application/json',
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        events = []
+        for block in body.strip().split('\n\n'):
+            event_line, data_line = block.split('\n')
+            events.append((event_line.removeprefix('event: '), json.loads(data_line.removeprefix('data: '))))
+        return events
+
+    async def test_reply_streams_tokens_and_ends_with_done(self):
+        events = await self.stream('Hi there')
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(set(names[:-1]), {'token'})
+        done = events[-1][1]
+        self.assertEqual(done['assistant_message'], ''.join(data['text'] for _, data in events[:-1]))
+        self.assertIsNone(done['proposed_plan_id'])
+        self.assertEqual(
+            [role async for role in self.conversation.messages.order_by('id').values_list('role', flat=True)],
+            ['user', 'assistant'],
+        )
+
+    async def test_proposal_is_announced_before_done(self):
+        events = await self.stream('Please create a plan')
+
+        names = [name for name, _ in events]
+        self.assertEqual(names.count('proposal'), 1)
+        self.assertEqual(names[-1], 'done')
+        proposal = await ProposedPlan.objects.aget(id=events[-1][1]['proposed_plan_id'])
+        self.assertEqual(proposal.title, events[names.index('proposal')][1]['plan']['title'])
+
+
+    async def test_provider_failure_mid_reply_is_an_error_and_saves_nothing(self):
+        with mock.patch('planner.chatbot.get_provider', return_value=_FailingProvider()):
+            events = await self.stream('Hi there')
+
+        self.assertEqual(events[0], ('token', {'text': 'Here is half'}))
+        self.assertEqual(events[-1][0], 'error')
+        self.assertIn('connection reset', events[-1][1]['error'])
+        self.assertEqual(
+            [role async for role in self.conversation.messages.values_list('role', flat=True)], ['user'],
+        )
+
+    @override_settings(CHATBOT_QUEUE_TIMEOUT=0.1)
+    async def test_busy_when_every_upstream_slot_is_taken(self):
+        held = _hold_upstream_slots(self)
+
+        events = await self.stream('Hi there')
+
+        self.assertEqual(events, [('error', {'error': 'The assistant is busy, please try again in a moment.'})])
+        with self.assertRaises(chatbot.AssistantBusyError):
+            await sync_to_async(chatbot.generate_reply)([{'role': 'user', 'content': 'Hi'}])
+
+        held.pop().release()
+        self.assertEqual((await self.stream('Hi again'))[-1][0], 'done')
+
+
+class _FailingProvider(FakeProvider):
+    model_name = 'failing'
+
+    async def stream(self, messages, system_instruction, max_output_tokens):
+        yield 'Here is half'
+        raise ConnectionError('connection reset')
+
+
+def _hold_upstream_slots(test):
+    """Take every upstream slot until the test ends; returns them for releasing early."""
+    held = []
+    while chatbot._upstream_slots.acquire(blocking=False):
+        held.append(chatbot._upstream_slots)
+
+    def release():
+        for slot in held:
+            slot.release()
+    test.addCleanup(release)
+    return held
+
+@override_settings(CHATBOT_JOB_MAX_ATTEMPTS=3, CHATBOT_JOB_RETRY_BACKOFF=2, CHATBOT_JOB_LEASE_SECONDS=300)
+class ChatJobTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = ChatConversation.objects.create(user=self.user)
+        self.job = jobs.submit_chat_turn(self.conversation, self.user, 'Hello')
+
+    def run_claimed(self, reply=None, error=None):
+        job = jobs.claim_job('worker-1')
+        self.assertEqual(job.id, self.job.id)
+        with mock.patch('planner.jobs.generate_reply', return_value=reply, side_effect=error):
+            jobs.run_job(job)
+        return ChatJob.objects.get(id=job.id)
+
+    def make_runnable(self):
+        ChatJob.objects.filter(id=self.job.id).update(run_after=timezone.now())
+
+    def test_failed_attempts_back_off_exponentially_then_fail(self):
+        # Full jitter draws from [0, cap); take the cap so the delay is exact
+        with mock.patch('planner.jobs.random.uniform', side_effect=lambda low, high: high), \
+                self.assertLogs('planner.jobs', 'WARNING'):
+            for attempt, delay in ((1, 2), (2, 4)):
+                before = timezone.now()
+                job = self.run_claimed(error=ConnectionError('upstream down'))
+                self.assertEqual((job.status, job.attempts), ('queued', attempt))
+                self.assertEqual(job.last_error, 'ConnectionError: upstream down')
+                self.assertGreaterEqual(job.run_after, before + timedelta(seconds=delay))
+                self.assertLess(job.run_after, timezone.now() + timedelta(seconds=delay))
+                self.assertIsNone(jobs.claim_job('worker-1'))
+                self.make_runnable()
+
+            job = self.run_claimed(error=ConnectionError('upstream down'))
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_that_succeeds_stores_the_reply(self):
+        with self.assertLogs('planner.jobs', 'WARNING'):
+            self.run_claimed(error=ConnectionError('upstream down'))
+        self.make_runnable()
+
+        job = self.run_claimed(reply='Hi!')
+
+        self.assertEqual((job.status, job.attempts, job.last_error), ('succeeded', 2, ''))
+        self.assertEqual(job.assistant_message.content, 'Hi!')
+
+    def test_chat_page_submits_and_polls_a_proposal(self):
+        page = self.client.get(reverse('chatbot'))
+        self.assertContains(page, reverse('chatbot_submit_message'))
+        self.assertNotContains(page, reverse('chatbot_stream_message'))
+
+        reply = FakeProvider().generate([{'role': 'user', 'content': 'Please create a plan'}], '', 100)
+        job = self.run_claimed(reply=reply)
+        status = self.client.get(reverse('chatbot_job_status', args=[job.id])).json()
+
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['proposed_plan_id'], job.proposed_plan_id)
+        self.assertEqual(status['plan']['title'], chatbot.parse_plan_proposal(reply)['title'])
+        self.assertEqual(len(status['plan']['tasks']), len(job.proposed_plan.tasks_data))
+
+    def test_expired_lease_is_reclaimed_by_another_worker(self):
+        stuck = jobs.claim_job('worker-1')
+        self.assertIsNone(jobs.claim_job('worker-2'))
+
+        ChatJob.objects.filter(id=stuck.id).update(locked_at=timezone.now() - timedelta(seconds=301))
+        job = jobs.claim_job('worker-2')
+
+        self.assertEqual((job.id, job.locked_by, job.attempts), (stuck.id, 'worker-2', 2))
+        # The first worker lost its lease, so its reply is dropped
+        with mock.patch('planner.jobs.generate_reply', return_value='Late'), self.assertLogs('planner.jobs', 'WARNING'):
+            jobs.run_job(stuck)
+        self.assertFalse(ChatJob.objects.filter(id=job.id, status='succeeded').exists())
+
+
+@unittest.skipUnless(settings.PLANNER_DB_PROFILE == 'sqlite', 'needs the sqlite database profile')
+class SQLiteProfileTests(SimpleTestCase):
+    """The profile's pragmas and locking, on a file database (tests otherwise run in memory)."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'profile.sqlite3')
+
+    def connect(self, **options):
+        config = {**settings.DATABASES['default'], 'NAME': self.path, 'CONN_MAX_AGE': 0}
+        config['OPTIONS'] = {**config['OPTIONS'], **options}
+        connection = ConnectionHandler({'default': {}, 'profile': config})['profile']
+        self.addCleanup(connection.close)
+        return connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_run_on_connect(self):
+        connection = self.connect()
+
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(connection, 'temp_store'), 2)  # MEMORY
+        timeout = settings.DATABASES['default']['OPTIONS']['timeout']
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), int(timeout * 1000))
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        first, second = self.connect(), self.connect(timeout=0)
+        with second.cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (n integer)')
+
+        # How atomic() opens a transaction on SQLite
+        first.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        self.addCleanup(first.rollback)
+        with first.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM counter')
+
+        # The first transaction has only read, yet it already holds the write lock
+        with self.assertRaisesMessage(OperationalError, 'locked'), second.cursor() as cursor:
+            cursor.execute('INSERT INTO counter VALUES (1)')
+
+
+class KeysetPaginationTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        # Runs of equal timestamps, some straddling page boundaries
+        base = timezone.now()
+        for n in range(23):
+            plan = self.make_plan(title=f'Plan {n}')
+            Plan.objects.filter(pk=plan.pk).update(created_at=base - timedelta(minutes=n // 4))
+        self.make_plan(user=User.objects.create_user('bob', password='pw'), title='Not mine')
+        self.plans = Plan.objects.filter(user=self.user)
+
+    def walk(self, descending):
+        pages, cursor = [], None
+        while True:
+            page = keyset_page(self.plans, 'created_at', cursor=cursor, size=5, descending=descending)
+            pages.append([plan.id for plan in page.items])
+            if page.next_cursor is None:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for descending, ordering in ((True, ('-created_at', '-id')), (False, ('created_at', 'id'))):
+            with self.subTest(descending=descending):
+                pages = self.walk(descending)
+
+                self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+                self.assertEqual(sum(pages, []), list(self.plans.order_by(*ordering).values_list('id', flat=True)))
+
+    def test_rows_created_meanwhile_do_not_shift_later_pages(self):
+        expected = self.walk(True)[1]
+        first = keyset_page(self.plans, 'created_at', size=5)
+        self.make_plan(title='Newest')
+
+        second = keyset_page(self.plans, 'created_at', cursor=first.next_cursor, size=5)
+
+        self.assertEqual([plan.id for plan in second.items], expected)
+
+    def test_dashboard_pages_follow_the_cursor(self):
+        seen, cursor = [], None
+        with mock.patch('planner.views.DASHBOARD_PAGE_SIZE', 10):
+            while True:
+                response = self.client.get(reverse('dashboard_plans'), {'cursor': cursor} if cursor else {})
+                seen += [plan.id for plan in response.context['plans']]
+                cursor = response.context['next_cursor']
+                if cursor is None:
+                    break
+
+        self.assertCountEqual(seen, self.plans.values_list('id', flat=True))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(self.client.get(reverse('dashboard_plans'), {'cursor': 'garbage!'}).status_code, 400)
+
+
+@unittest.skipIf(search.get_backend() is None, 'needs a full-text index')
+class SearchSyncTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = self.make_plan(title='Kayak weekend', description='Paddle the lake')
+        self.task = Task.objects.create(plan=self.plan, title='Pack the drybag', task_date=date(2026, 10, 3))
+        self.conversation = ChatConversation.objects.create(user=self.user)
+        self.message = ChatMessage.objects.create(conversation=self.conversation, role='user', content='Suggest a canoe route')
+
+    def indexed(self, term):
+        """Doc ids in the index matching term, whether or not their rows still exist."""
+        with connection.cursor() as cursor:
+            return {doc for doc, *_ in search.get_backend().search(cursor, self.user.pk, [term], 20)}
+
+    def results(self, query):
+        return [(result.kind, result.object.pk) for result in search.search(self.user, query)]
+
+    def test_edits_replace_the_indexed_text(self):
+        self.plan.title = 'Canoe weekend'
+        self.plan.save()
+        self.task.description = 'Waterproof the maps'
+        self.task.save()
+
+        self.assertFalse(self.indexed('kayak'))
+        self.assertEqual(self.results('canoe'), [('plan', self.plan.pk), ('message', self.message.pk)])
+        self.assertEqual(self.results('waterproof'), [('task', self.task.pk)])
+
+    def test_deletes_remove_index_entries(self):
+        self.message.delete()
+        self.assertFalse(self.indexed('canoe'))
+
+        self.plan.delete()
+        self.assertFalse(self.indexed('kayak'))
+        self.assertFalse(self.indexed('drybag'))
+
+    def test_other_users_documents_are_not_found(self):
+        self.make_plan(user=User.objects.create_user('bob', password='pw'), title='Kayak rental')
+
+        self.assertEqual(self.results('kayak'), [('plan', self.plan.pk)])
+
+    def test_terms_do_not_match_the_owner_token(self):
+        self.assertEqual(self.results(f'u{self.user.pk}'), [])
+        self.assertEqual(self.results(f'kayak u{self.user.pk}'), [])
+
+    def test_message_hit_links_to_its_conversation(self):
+        ChatConversation.objects.create(user=self.user)
+
+        result, = search.search(self.user, 'canoe')
+
+        self.assertEqual(result.url, f"{reverse('chatbot')}?conversation={self.conversation.pk}")
+        self.assertContains(self.client.get(result.url), 'Suggest a canoe route')
+
+
+class PlanTransferTests(PlannerTestCase):
+    def export(self, fmt):
+        response = self.client.get(reverse('plans_export', args=[fmt]))
+        return b''.join(response.streaming_content)
+
+    def import_file(self, name, content):
+        return self.client.post(
+            reverse('plans_import'), {'file': SimpleUploadedFile(name, content)}, HTTP_ACCEPT='application/json',
+        )
+
+    def imported_plans(self, response):
+        self.assertEqual(response.status_code, 201, response.content)
+        return [
+            (plan.title, sorted(plan.tasks.values_list('title', flat=True)))
+            for plan in Plan.objects.filter(id__in=[plan['id'] for plan in response.json()['plans']]).order_by('id')
+        ]
+
+    def test_round_trip_keeps_plans_with_identical_columns_apart(self):
+        for titles in (['Monday run', 'Tuesday run'], ['Wednesday run']):
+            plan = self.make_plan(title='Running')
+            for n, title in enumerate(titles, start=1):
+                Task.objects.create(plan=plan, title=title, task_date=date(2026, 10, n))
+        self.make_plan(title='Empty')
+        expected = [('Running', ['Monday run', 'Tuesday run']), ('Running', ['Wednesday run']), ('Empty', [])]
+
+        exports = {fmt: self.export(fmt) for fmt in ('csv', 'json')}
+        for fmt, content in exports.items():
+            with self.subTest(fmt=fmt):
+                self.assertEqual(self.imported_plans(self.import_file(f'plans.{fmt}', content)), expected)
+
+    def test_csv_without_plan_key_groups_identical_columns(self):
+        content = (
+            'plan_title,plan_start_date,task_title,task_date\n'
+            'Trip,2026-10-01,Pack,2026-10-01\n'
+            'Trip,2026-10-01,Leave,2026-10-02\n'
+        ).encode()
+
+        self.assertEqual(self.imported_plans(self.import_file('plans.csv', content)), [('Trip', ['Leave', 'Pack'])])
+
+    @mock.patch.object(transfer, 'IMPORT_BATCH_SIZE', 2)
+    def test_bad_row_after_inserted_batches_rolls_everything_back(self):
+        rows = ''.join(f'{n},Plan {n},2026-10-01,Task {n},2026-10-0{n}\n' for n in range(1, 6))
+        content = f'plan_key,plan_title,plan_start_date,task_title,task_date\n{rows}6,Plan 6,2026-10-01,Task 6,soon\n'
+
+        response = self.import_file('plans.csv', content.encode())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['line'], 7)
+        self.assertFalse(Plan.objects.exists())
+        self.assertFalse(Task.objects.exists())
+        if search.get_backend() is not None:
+            self.assertEqual(search.search(self.user, 'task'), [])
+
+    def test_malformed_json_plan_references_are_rejected(self):
+        plan = {'key': 1, 'title': 'Trip', 'start_date': '2026-10-01'}
+        task = {'plan': 1, 'title': 'Pack', 'task_date': '2026-10-01'}
+        cases = {
+            'unhashable plan key': ({'plans': [{**plan, 'key': [1]}], 'tasks': []}, None),
+            'unhashable task plan': ({'plans': [plan], 'tasks': [{**task, 'plan': {'key': 1}}]}, 1),
+            'tasks before plans': ({'tasks': [task], 'plans': [plan]}, None),
+        }
+        for name, (document, line) in cases.items():
+            with self.subTest(name):
+                response = self.import_file('plans.json', json.dumps(document).encode())
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['line'], line)
+        self.assertFalse(Plan.objects.exists())
+
+
+class RecurrenceTests(PlannerTestCase):
+    def stepped_dates(self, start, until, matches):
+        """Every date of [start, until] that matches, found by walking day by day."""
+        days = (start + timedelta(days=n) for n in range((until - start).days + 1))
+        return [day for day in days if matches(day)]
+
+    def test_windows_match_stepping_from_the_start(self):
+        start, until = date(2026, 1, 7), date(2027, 3, 31)
+        first_monday = start - timedelta(days=start.weekday())
+        rules = [
+            ((recurrence.DAILY, 3, ()), lambda day: (day - start).days % 3 == 0),
+            ((recurrence.WEEKLY, 2, (0, 3)),
+             lambda day: day.weekday() in (0, 3) and (day - first_monday).days // 7 % 2 == 0),
+        ]
+        windows = [(date(2026, 1, 1), date(2026, 1, 31)), (date(2026, 6, 3), date(2026, 6, 20)), (None, None)]
+        for (frequency, interval, weekdays), matches in rules:
+            for window_start, window_end in windows:
+                with self.subTest(frequency=frequency, window=(window_start, window_end)):
+                    expected = self.stepped_dates(window_start or start, window_end or until, matches)
+                    dates = recurrence.occurrence_dates(
+                        start, until, frequency, interval, weekdays, window_start, window_end,
+                    )
+                    self.assertEqual(list(dates), [day for day in expected if start <= day <= until])
+
+    def test_monthly_clamps_to_short_months_and_keeps_its_day(self):
+        dates = recurrence.occurrence_dates(date(2026, 1, 31), date(2026, 5, 31), recurrence.MONTHLY)
+
+        self.assertEqual(
+            list(dates),
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30), date(2026, 5, 31)],
+        )
+
+    def test_occurrence_overrides_and_counters(self):
+        plan = self.make_plan()
+        series = TaskSeries.objects.create(
+            plan=plan, title='Stretch', frequency=recurrence.DAILY,
+            start_date=date(2026, 10, 1), until=date(2026, 10, 10),
+        )
+        self.assertEqual((series.occurrence_count, series.completed_count), (10, 0))
+
+        url = reverse('occurrence_toggle_status', args=[series.id, '2026-10-04'])
+        self.assertEqual(self.client.post(url).json()['status'], 'completed')
+        recurrence.update_occurrence(series, date(2026, 10, 5), cancelled=True)
+        recurrence.update_occurrence(series, date(2026, 10, 6), title='Long stretch')
+
+        occurrences = {
+            occurrence.task_date.day: occurrence
+            for occurrence in recurrence.plan_occurrences(plan.id, date(2026, 10, 1), date(2026, 10, 31))
+        }
+        self.assertEqual(sorted(occurrences), [1, 2, 3, 4, 6, 7, 8, 9, 10])
+        self.assertEqual(occurrences[4].status, 'completed')
+        self.assertEqual((occurrences[6].title, occurrences[7].title), ('Long stretch', 'Stretch'))
+        series.refresh_from_db()
+        self.assertEqual((series.occurrence_count, series.completed_count), (9, 1))
+        self.assertEqual(Plan.objects.with_task_stats().get(pk=plan.pk).get_task_stats(), {'total': 9, 'completed': 1})
+
+        # Changing an occurrence back to the series' values drops its override
+        self.assertEqual(self.client.post(url).json()['status'], 'pending')
+        recurrence.update_occurrence(series, date(2026, 10, 6), title='Stretch')
+        self.assertEqual(list(TaskOccurrence.objects.values_list('date', flat=True)), [date(2026, 10, 5)])
+
+        # Overrides for dates the edited rule no longer produces are dropped
+        series.until = date(2026, 10, 4)
+        series.save()
+        self.assertFalse(TaskOccurrence.objects.exists())
+        self.assertEqual((series.occurrence_count, series.completed_count), (4, 0))
+
+
+class UserCacheTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_plan()
+
+    def test_login_uses_the_cached_backend(self):
+        self.client.logout()
+        self.assertTrue(self.client.login(username='alice', password='pw'))
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'planner.auth.CachedModelBackend')
+        self.client.get(reverse('dashboard'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.wsgi_request.user, self.user)
+        self.assertFalse([query['sql'] for query in queries if 'auth_user' in query['sql']])
+
+    def test_sessions_from_before_the_cached_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+
+class ChatRetentionTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = ChatConversation.objects.create(user=self.user)
+        for n in range(7):
+            ChatMessage.objects.create(conversation=self.conversation, role='user', content=f'Glacier hike {n}')
+        ProposedPlan.objects.create(
+            conversation=self.conversation, user=self.user, title='Hikes', start_date=date(2026, 11, 1), tasks_data=[],
+        )
+        ChatConversation.objects.filter(pk=self.conversation.pk).update(updated_at=timezone.now() - timedelta(days=90))
+        self.messages = list(self.conversation.messages.order_by('id').values_list('id', 'content', 'created_at'))
+
+    def archive(self):
+        return retention.archive_conversation(self.conversation, batch_size=3)
+
+    def test_archive_deletes_each_batch_in_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.archive()
+
+        self.assertEqual((result.messages, result.proposals), (7, 1))
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len([sql for sql in deletes if 'planner_chatmessage' in sql]), 3)
+        if search.get_backend() is not None:
+            self.assertEqual(len([sql for sql in deletes if search.TABLE in sql]), 3)
+            self.assertEqual(search.search(self.user, 'glacier'), [])
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertFalse(ProposedPlan.objects.exists())
+
+    def test_restore_brings_back_messages_and_search_entries(self):
+        self.archive()
+        conversation = ChatConversation.objects.get(pk=self.conversation.pk)
+
+        self.assertTrue(retention.restore_conversation(conversation, batch_size=3))
+
+        self.assertEqual(
+            list(conversation.messages.order_by('id').values_list('id', 'content', 'created_at')), self.messages,
+        )
+        self.assertEqual(conversation.proposed_plans.get().title, 'Hikes')
+        if search.get_backend() is not None:
+            self.assertEqual(len(search.search(self.user, 'glacier')), 7)
+
+
+class OverdueTimezoneTests(PlannerTestCase):
+    # Evening of the 17th in Los Angeles, already the 18th in UTC (TIME_ZONE)
+    NOW = datetime(2026, 10, 18, 2, 0, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        plan = self.make_plan()
+        self.yesterday = Task.objects.create(plan=plan, title='Call mum', task_date=date(2026, 10, 17))
+        Task.objects.create(plan=plan, title='Shop', task_date=date(2026, 10, 16))
+        now = mock.patch('django.utils.timezone.now', return_value=self.NOW)
+        now.start()
+        self.addCleanup(now.stop)
+
+    def agenda(self):
+        response = self.client.get(reverse('agenda_tasks'), {'range': 'week'})
+        data = json.loads(b''.join(response.streaming_content))
+        overdue = {task['title']: task['is_overdue'] for day in data['days'] for task in day['tasks']}
+        return data['today'], overdue
+
+    def toggled_back(self):
+        url = reverse('task_toggle_status', args=[self.yesterday.id])
+        self.client.post(url)
+        return self.client.post(url).json()
+
+    def test_without_cookie_today_is_in_time_zone(self):
+        self.assertEqual(self.agenda(), ('2026-10-18', {'Shop': True, 'Call mum': True}))
+        self.assertEqual(self.toggled_back(), {'status': 'pending', 'is_overdue': True})
+
+    def test_cookie_moves_today_to_the_browsers_date(self):
+        self.client.cookies['tz'] = 'America%2FLos_Angeles'
+
+        self.assertEqual(self.agenda(), ('2026-10-17', {'Shop': True, 'Call mum': False}))
+        self.assertEqual(self.toggled_back(), {'status': 'pending', 'is_overdue': False})
+
+    def test_unknown_zone_falls_back_to_time_zone(self):
+        self.client.cookies['tz'] = 'Mars/Olympus_Mons'
+
+        self.assertEqual(self.agenda()[0], '2026-10-18')
+
+
+class AgendaTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        plan = self.make_plan()
+        # Sunday before, Monday, Sunday and Monday after the week of 12-18 October 2026
+        for day in (11, 12, 18, 19):
+            Task.objects.create(plan=plan, title=f'Task {day}', task_date=date(2026, 10, day))
+        TaskSeries.objects.create(
+            plan=plan, title='Run', frequency=recurrence.WEEKLY, weekdays=[0, 6],
+            start_date=date(2026, 10, 1), until=date(2026, 10, 31),
+        )
+        other = self.make_plan(user=User.objects.create_user('bob', password='pw'))
+        Task.objects.create(plan=other, title='Not mine', task_date=date(2026, 10, 14))
+
+    def week(self, day):
+        response = self.client.get(reverse('agenda_tasks'), {'range': 'week', 'date': day})
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_week_runs_monday_to_sunday_from_any_day_in_it(self):
+        for given in ('2026-10-12', '2026-10-15', '2026-10-18'):
+            with self.subTest(date=given):
+                data = self.week(given)
+
+                self.assertEqual((data['start'], data['end']), ('2026-10-12', '2026-10-18'))
+                self.assertEqual([day['date'] for day in data['days']], [f'2026-10-{n}' for n in range(12, 19)])
+                self.assertEqual(
+                    {day['date']: [task['title'] for task in day['tasks']] for day in data['days'] if day['tasks']},
+                    {'2026-10-12': ['Task 12', 'Run'], '2026-10-18': ['Task 18', 'Run']},
+                )
+
+    def test_page_links_to_the_neighbouring_weeks(self):
+        response = self.client.get(reverse('agenda'), {'range': 'week', 'date': '2026-10-18'})
+
+        self.assertEqual(
+            (response.context['previous_date'], response.context['next_date']), (date(2026, 10, 5), date(2026, 10, 19)),
+        )
+        self.assertEqual(len(response.context['days']), 7)
+
+    def test_day_range_and_bad_dates(self):
+        response = self.client.get(reverse('agenda_tasks'), {'range': 'today', 'date': '2026-10-11'})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([task['title'] for task in data['days'][0]['tasks']], ['Task 11', 'Run'])
+
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 10, 14)):
+            self.assertEqual(self.week('not-a-date')['start'], '2026-10-12')
+
+
+@override_settings(PLANNER_DENORMALIZED_TASK_COUNTS=True)
+class TaskCounterTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = self.make_plan()
+
+    def counters(self, plan=None):
+        return Plan.objects.values_list('task_count', 'completed_task_count').get(pk=(plan or self.plan).pk)
+
+    def make_task(self, plan=None, **fields):
+        fields.setdefault('title', 'Task')
+        fields.setdefault('task_date', date(2026, 10, 2))
+        return Task.objects.create(plan=plan or self.plan, **fields)
+
+    def test_saves_and_deletes_track_the_counts(self):
+        task = self.make_task()
+        self.make_task(status='completed')
+        self.assertEqual(self.counters(), (2, 1))
+
+        task.status = 'completed'
+        task.save()
+        self.assertEqual(self.counters(), (2, 2))
+
+        other = self.make_plan(title='Other')
+        task.plan = other
+        task.save()
+        self.assertEqual((self.counters(), self.counters(other)), ((1, 1), (1, 1)))
+
+        task.delete()
+        self.assertEqual(self.counters(other), (0, 0))
+
+    def test_toggle_and_batch_views_track_the_counts(self):
+        tasks = [self.make_task() for _ in range(3)]
+
+        self.client.post(reverse('task_toggle_status', args=[tasks[0].id]))
+        self.assertEqual(self.counters(), (3, 1))
+
+        ids = [task.id for task in tasks]
+        self.client.post(reverse('task_batch_update'), json.dumps({'task_ids': ids, 'status': 'toggle'}),
+                         content_type='application/json')
+        self.assertEqual(self.counters(), (3, 2))
+        self.client.post(reverse('task_batch_update'), json.dumps({'task_ids': ids, 'status': 'completed'}),
+                         content_type='application/json')
+        self.assertEqual(self.counters(), (3, 3))
+
+        self.client.post(reverse('task_delete', args=[tasks[0].id]))
+        self.assertEqual(self.counters(), (2, 2))
+
+    def test_bulk_inserts_set_the_counts(self):
+        proposal = ProposedPlan.objects.create(
+            conversation=ChatConversation.objects.create(user=self.user), user=self.user, title='Proposed',
+            start_date=date(2026, 11, 1), tasks_data=[
+                {'title': 'One', 'task_date': '2026-11-01', 'status': 'completed'},
+                {'title': 'Habit', 'task_date': '2026-11-02', 'repeat': {'frequency': 'daily', 'until': '2026-11-05'}},
+            ],
+        )
+        accepted = self.client.post(reverse('chatbot_accept_plan', args=[proposal.id])).json()['plan_id']
+        self.assertEqual(self.counters(Plan(pk=accepted)), (5, 1))
+
+        content = (
+            b'plan_key,plan_title,plan_start_date,task_title,task_date,task_status\n'
+            b'1,Imported,2026-10-01,A,2026-10-01,completed\n'
+            b'1,Imported,2026-10-01,B,2026-10-02,pending\n'
+        )
+        response = self.client.post(reverse('plans_import'), {'file': SimpleUploadedFile('plans.csv', content)},
+                                    HTTP_ACCEPT='application/json')
+        self.assertEqual(self.counters(Plan(pk=response.json()['plans'][0]['id'])), (2, 1))
+
+    def test_rebuild_command_fixes_drifted_counts(self):
+        self.make_task()
+        self.make_task(status='completed')
+        TaskSeries.objects.create(
+            plan=self.plan, title='Run', start_date=date(2026, 10, 1), until=date(2026, 10, 3),
+        )
+        other = self.make_plan(title='Other')
+        self.make_task(plan=other)
+        Plan.objects.update(task_count=40, completed_task_count=30)
+
+        call_command('rebuild_task_counts', plan=[self.plan.pk], stdout=StringIO())
+        self.assertEqual((self.counters(), self.counters(other)), ((5, 1), (40, 30)))
+
+        out = StringIO()
+        call_command('rebuild_task_counts', user=self.user.pk, stdout=out)
+        self.assertEqual(self.counters(other), (1, 0))
+        self.assertIn('2 plan(s)', out.getvalue())
+
+
+class PlanMonthTasksTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = self.make_plan()
+        self.task = Task.objects.create(plan=self.plan, title='Dentist', task_date=date(2026, 9, 28))
+        Task.objects.create(plan=self.plan, title='Later', task_date=date(2026, 11, 20))
+        self.series = TaskSeries.objects.create(
+            plan=self.plan, title='Water plants', frequency=recurrence.WEEKLY, weekdays=[3],
+            start_date=date(2026, 10, 1), until=date(2026, 10, 8),
+        )
+
+    def month(self, plan=None, **params):
+        return self.client.get(reverse('plan_month_tasks', args=[(plan or self.plan).id]), params)
+
+    def test_month_lists_tasks_and_occurrences_of_the_whole_grid(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 10, 18)):
+            data = self.month(year=2026, month=10).json()
+
+        self.assertEqual((data['year'], data['month'], data['month_name']), (2026, 10, 'October'))
+        # October 2026 starts on a Thursday, so the grid begins on Monday 28 September
+        self.assertEqual((data['start'], data['end']), ('2026-09-28', '2026-11-01'))
+        self.assertEqual(data['calendar'][0], [0, 0, 0, 1, 2, 3, 4])
+        self.assertEqual(data['today'], '2026-10-18')
+        self.assertEqual(data['tasks_by_date'], {
+            '2026-09-28': [{
+                'id': self.task.id, 'series_id': None, 'title': 'Dentist', 'status': 'pending',
+                'is_overdue': True, 'edit_url': reverse('task_edit', args=[self.task.id]),
+            }],
+            '2026-10-01': [{
+                'id': None, 'series_id': self.series.id, 'title': 'Water plants', 'status': 'pending',
+                'is_overdue': True, 'edit_url': reverse('occurrence_edit', args=[self.series.id, '2026-10-01']),
+            }],
+            '2026-10-08': [{
+                'id': None, 'series_id': self.series.id, 'title': 'Water plants', 'status': 'pending',
+                'is_overdue': True, 'edit_url': reverse('occurrence_edit', args=[self.series.id, '2026-10-08']),
+            }],
+        })
+
+    def test_plan_of_another_user_is_404(self):
+        other = self.make_plan(user=User.objects.create_user('bob', password='pw'))
+
+        self.assertEqual(self.month(other, year=2026, month=10).status_code, 404)
+
+    def test_invalid_month_falls_back_to_the_current_one(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 11, 5)):
+            for params in ({'year': 2026, 'month': 13}, {'year': 'soon', 'month': 1}, {'year': 0, 'month': 5}, {}):
+                with self.subTest(params=params):
+                    data = self.month(**params).json()
+                    self.assertEqual((data['year'], data['month']), (2026, 11))
+                    self.assertEqual(list(data['tasks_by_date']), ['2026-11-20'])
+
+
+@override_settings(CHATBOT_CONTEXT_MAX_MESSAGES=6, CHATBOT_CONTEXT_TOKEN_BUDGET=8000, CHATBOT_SUMMARY_BATCH=40)
+class MessageHistoryTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = ChatConversation.objects.create(user=self.user)
+        for n in range(1, 9):
+            ChatMessage.objects.create(
+                conversation=self.conversation, role='user' if n % 2 else 'assistant', content=f'm{n}',
+            )
+        self.folded = []
+
+    def summarize(self, previous_summary, messages):
+        self.folded.append([message['content'] for message in messages])
+        return ' '.join(filter(None, [previous_summary] + self.folded[-1]))
+
+    def history(self):
+        with mock.patch('planner.chatbot.summarize_messages', side_effect=self.summarize):
+            summary, messages = chatbot.build_message_history(self.conversation)
+        return summary, [message['content'] for message in messages]
+
+    def test_older_turns_are_folded_and_the_newer_half_kept(self):
+        # The window is m3-m8; its newer half starts at the next user turn, m7
+        self.assertEqual(self.history(), ('m1 m2 m3 m4 m5 m6', ['m7', 'm8']))
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, 'm1 m2 m3 m4 m5 m6')
+
+        # Nothing new outside the window, so nothing more is folded
+        self.assertEqual(self.history(), ('m1 m2 m3 m4 m5 m6', ['m7', 'm8']))
+        self.assertEqual(len(self.folded), 1)
+
+    @override_settings(CHATBOT_SUMMARY_BATCH=6)
+    def test_batch_ending_at_the_kept_half_does_not_overlap_it(self):
+        self.assertEqual(self.history(), ('m1 m2 m3 m4 m5 m6', ['m7', 'm8']))
+
+    @override_settings(CHATBOT_SUMMARY_BATCH=4)
+    def test_batch_ending_inside_the_window_sends_only_the_rest(self):
+        self.assertEqual(self.history(), ('m1 m2 m3 m4', ['m5', 'm6', 'm7', 'm8']))
+
+    @override_settings(CHATBOT_SUMMARY_BATCH=2)
+    def test_batch_ending_before_the_window_keeps_the_whole_window(self):
+        self.assertEqual(self.history(), ('m1 m2', ['m3', 'm4', 'm5', 'm6', 'm7', 'm8']))
+        # The rest now fits the window, so the next call folds nothing
+        self.assertEqual(self.history(), ('m1 m2', ['m3', 'm4', 'm5', 'm6', 'm7', 'm8']))
+        self.assertEqual(len(self.folded), 1)
+
+    def test_failed_summary_keeps_the_window(self):
+        with mock.patch('planner.chatbot.summarize_messages', return_value=None):
+            summary, messages = chatbot.build_message_history(self.conversation)
+
+        self.assertEqual(summary, '')
+        self.assertEqual([message['content'] for message in messages], ['m3', 'm4', 'm5', 'm6', 'm7', 'm8'])
+
+
+class BenchmarkSuiteTests(TestCase):
+    SCALE = {'users': 2, 'plans_per_user': 3, 'tasks_per_plan': 4, 'conversations_per_user': 1,
+             'messages_per_conversation': 6}
+
+    def test_seed_is_deterministic(self):
+        counts = seeding.seed(username_prefix='a', **self.SCALE)
+
+        self.assertEqual(counts, {'users': 2, 'plans': 6, 'tasks': 24, 'conversations': 2, 'messages': 12})
+        first = list(Task.objects.filter(plan__user__username='a-0').values_list('title', 'task_date', 'status'))
+        seeding.seed(username_prefix='b', **self.SCALE)
+        self.assertEqual(
+            list(Task.objects.filter(plan__user__username='b-0').values_list('title', 'task_date', 'status')), first,
+        )
+
+    def test_every_benchmark_reports_its_metrics(self):
+        for cache in caches.all():
+            cache.clear()
+        seeding.seed(**self.SCALE)
+        user = User.objects.get(username='seed-user-0')
+
+        results = benchmarks.run_benchmarks(user, iterations=2, warmup=1, memory_iterations=1)
+
+        self.assertEqual(set(results), set(benchmarks.BENCHMARKS))
+        for name, result in results.items():
+            with self.subTest(benchmark=name):
+                self.assertLess(max(result['status_codes']), 400)
+                self.assertGreaterEqual(result['p95_ms'], result['p50_ms'])
+                self.assertGreater(result['queries'], 0)
+
+    def test_compare_flags_slower_and_chattier_views(self):
+        baseline = {'dashboard': {'p50_ms': 10, 'p95_ms': 20, 'queries': 3, 'peak_memory_kb': 100}}
+        current = {'dashboard': {'p50_ms': 11, 'p95_ms': 30, 'queries': 4, 'peak_memory_kb': 100}}
+
+        regressed = {metric for _, metric, _, _, flag in benchmarks.compare_results(baseline, current) if flag}
+
+        self.assertEqual(regressed, {'p95_ms', 'queries'})
+
+
+class ResponseCacheTests(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.provider = mock.Mock(model_name='test-model')
+        self.provider.generate.return_value = 'Where to?'
+        patcher = mock.patch('planner.chatbot.get_provider', return_value=self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stats = chatbot.response_cache_stats()
+
+    def ask(self, *contents, summary=''):
+        messages = [{'role': 'user', 'content': content} for content in contents]
+        return chatbot.chat_with_assistant(messages, summary)
+
+    def stats_delta(self):
+        stats = chatbot.response_cache_stats()
+        return stats['hits'] - self.stats['hits'], stats['misses'] - self.stats['misses']
+
+    def test_repeated_prompt_skips_the_provider(self):
+        self.assertEqual(self.ask('Plan a  trip to Rome'), 'Where to?')
+        self.assertEqual(self.ask('plan a trip to rome '), 'Where to?')
+
+        self.assertEqual(self.provider.generate.call_count, 1)
+        self.assertEqual(self.stats_delta(), (1, 1))
+
+    def test_changed_prompt_summary_or_day_calls_the_provider(self):
+        self.ask('Plan a trip to Rome')
+        self.ask('Plan a trip to Paris')
+        self.ask('Plan a trip to Rome', summary='Likes museums')
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2030, 1, 1)):
+            self.ask('Plan a trip to Rome')
+
+        self.assertEqual(self.provider.generate.call_count, 4)
+        self.assertEqual(self.stats_delta(), (0, 4))
+
+    def test_errors_are_not_cached(self):
+        self.provider.generate.side_effect = [RuntimeError('quota'), 'Where to?']
+
+        self.assertIn('quota', self.ask('Plan a trip'))
+        self.assertEqual(self.ask('Plan a trip'), 'Where to?')
+        self.assertEqual(self.provider.generate.call_count, 2)
+
+    def test_counters_outlive_evicted_entries(self):
+        self.ask('Plan a trip')
+        self.ask('Plan a trip')
+        caches[settings.CHATBOT_RESPONSE_CACHE_ALIAS].clear()
+
+        self.assertEqual(self.stats_delta(), (1, 1))
+
+    @override_settings(CHATBOT_RESPONSE_CACHE=False)
+    def test_disabled_cache_always_calls_the_provider(self):
+        self.ask('Plan a trip')
+        self.ask('Plan a trip')
+
+        self.assertEqual(self.provider.generate.call_count, 2)
+        self.assertFalse(chatbot.response_cache_stats()['enabled'])
+
+
+class ProviderTests(SimpleTestCase):
+    def test_app_starts_without_a_gemini_key_or_sdk_import(self):
+        env = {key: value for key, value in os.environ.items() if key not in ('GEMINI_API_KEY', 'CHATBOT_PROVIDER')}
+        env['DJANGO_SETTINGS_MODULE'] = 'plananything.settings'
+        script = (
+            'import sys, django; django.setup(); '
+            'import plananything.urls, planner.views, planner.jobs; '
+            'from planner.llm import get_provider; '
+            'print(type(get_provider()).__name__, "google.genai" in sys.modules)'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ['GeminiProvider', 'False'])
+
+    def test_setting_picks_the_backend(self):
+        with override_settings(CHATBOT_PROVIDER='fake'):
+            self.assertIsInstance(get_provider(), FakeProvider)
+            self.assertIs(get_provider(), get_provider())
+        with override_settings(CHATBOT_PROVIDER='gemini'):
+            self.assertIsInstance(get_provider(), GeminiProvider)
+
+        custom = {'slow': {'CLASS': 'planner.llm.FakeProvider', 'OPTIONS': {'plan_days': 5, 'reply': 'Hm?'}}}
+        with override_settings(CHATBOT_PROVIDER='slow', CHATBOT_PROVIDERS=custom):
+            provider = get_provider()
+        self.assertEqual((provider.plan_days, provider.reply), (5, 'Hm?'))
+
+    def test_fake_provider_asks_then_proposes_a_usable_plan(self):
+        provider = FakeProvider(plan_days=4)
+        question = provider.generate([{'role': 'user', 'content': 'Hi'}], '', 100)
+        self.assertEqual(question, FakeProvider.DEFAULT_REPLY)
+
+        messages = [{'role': 'user', 'content': 'Looks good, create it'}]
+        reply = provider.generate(messages, '', 100)
+        plan = chatbot.parse_plan_proposal(reply)
+        self.assertEqual(len(plan['tasks']), 4)
+        self.assertEqual(plan['start_date'], (timezone.now().date() + timedelta(days=1)).isoformat())
+
+        async def streamed():
+            return ''.join([chunk async for chunk in provider.stream(messages, '', 100)])
+        self.assertEqual(async_to_sync(streamed)(), reply)
+
+
+class PlanProposalExtractorTests(SimpleTestCase):
+    def proposal_reply(self):
+        return FakeProvider().generate([{'role': 'user', 'content': 'Please create a plan'}], '', 100)
+
+    def feed_in_chunks(self, text, size=7):
+        extractor = chatbot.PlanProposalExtractor()
+        found = [extractor.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        extractor.close()
+        return extractor, [plan for plan in found if plan is not None]
+
+    def test_stray_brace_before_the_proposal_does_not_hide_it(self):
+        reply = 'Use a { to start a block. ' + self.proposal_reply()
+
+        extractor, found = self.feed_in_chunks(reply)
+
+        self.assertIsNone(extractor.error)
+        self.assertEqual(len(found), 1)
+        self.assertEqual(found[0], chatbot.parse_plan_proposal(reply))
+
+    def test_unrelated_objects_are_skipped_and_a_cut_off_proposal_is_an_error(self):
+        reply = self.proposal_reply()
+        extractor, found = self.feed_in_chunks('Config: {"a": {"b": 1}} then ' + reply)
+        self.assertEqual(len(found), 1)
+
+        extractor, found = self.feed_in_chunks(reply[:reply.index('"tasks"')])
+        self.assertEqual((found, extractor.error.code), ([], 'incomplete'))
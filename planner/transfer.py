@@ -0,0 +1,455 @@
+"""
+Plan export (iCalendar, CSV, JSON) and import (CSV, JSON).
+
+Exports are generators of text chunks for StreamingHttpResponse. Plans and
+tasks are read with .iterator(), so memory use doesn't depend on how many
+tasks are exported. The JSON layout keeps tasks in their own top-level
+array, each pointing at its plan by key:
+
+    {"version": 1,
+     "plans": [{"key": 1, "title": ..., "color": ..., ...}],
+     "tasks": [{"plan": 1, "title": ..., "task_date": "YYYY-MM-DD", ...}]}
+
+CSV has one row per task (or per plan without tasks), repeating the plan's
+columns; plan_key tells the rows of different plans apart.
+
+Imports read the upload incrementally, one CSV row or one JSON task at a
+time. They create new plans and bulk-insert tasks in batches, all inside
+one transaction, so a bad row leaves nothing behind. Since JSON tasks are
+not buffered, "plans" must come before "tasks", as in the export.
+"""
+import codecs
+import csv
+import heapq
+import json
+import re
+from datetime import date, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import recurrence, search
+from .models import Plan, Task, TaskSeries, task_counters_enabled
+
+EXPORT_FORMATS = {
+    'ics': 'text/calendar; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+CSV_COLUMNS = [
+    'plan_key', 'plan_title', 'plan_description', 'plan_color', 'plan_start_date', 'plan_end_date',
+    'task_title', 'task_description', 'task_date', 'task_status',
+]
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_TASKS = 100000
+ITERATOR_CHUNK_SIZE = 2000
+
+_PLAN_FIELDS = ('id', 'title', 'description', 'color', 'start_date', 'end_date', 'updated_at')
+_TASK_FIELDS = ('id', 'plan_id', 'title', 'description', 'task_date', 'status', 'updated_at')
+_HEX_COLOR = re.compile(r'^#[0-9A-Fa-f]{6}$')
+
+
+class PlanImportError(ValueError):
+    """A malformed upload; `line` is the CSV line or JSON task number, when known."""
+
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+
+    def as_dict(self):
+        return {'error': self.message, 'line': self.line}
+
+
+def _plans(plans):
+    return plans.order_by('id').only(*_PLAN_FIELDS).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def _tasks(plans):
+    """
+    Tasks of the plans ordered by plan and date, with the occurrences of
+    their recurring series merged in. Exports write each occurrence as an
+    ordinary task, so an imported plan gets them as Task rows.
+    """
+    tasks = (
+        Task.objects.filter(plan__in=plans.values('id'))
+        .order_by('plan_id', 'task_date', 'id')
+        .only(*_TASK_FIELDS)
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    series_list = list(TaskSeries.objects.filter(plan__in=plans.values('id')).order_by('plan_id', 'id'))
+    if not series_list:
+        return tasks
+    overrides = recurrence.overrides_by_series([series.id for series in series_list])
+    occurrences = [recurrence.expand(series, overrides=overrides[series.id]) for series in series_list]
+    return heapq.merge(tasks, *occurrences, key=lambda task: (task.plan_id, task.task_date))
+
+
+def _date(value):
+    return value.isoformat() if value else ''
+
+
+# --- JSON ---------------------------------------------------------------
+
+def export_json(plans):
+    yield '{"version": 1,\n"plans": ['
+    for index, plan in enumerate(_plans(plans)):
+        yield (',\n' if index else '\n') + json.dumps({
+            'key': plan.id,
+            'title': plan.title,
+            'description': plan.description,
+            'color': plan.color,
+            'start_date': _date(plan.start_date),
+            'end_date': _date(plan.end_date) or None,
+        })
+    yield '\n],\n"tasks": ['
+    for index, task in enumerate(_tasks(plans)):
+        yield (',\n' if index else '\n') + json.dumps({
+            'plan': task.plan_id,
+            'title': task.title,
+            'description': task.description,
+            'task_date': _date(task.task_date),
+            'status': task.status,
+        })
+    yield '\n]}\n'
+
+
+# --- CSV ----------------------------------------------------------------
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(plans):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    tasks = _tasks(plans)
+    task = next(tasks, None)
+    # Plans and tasks are both ordered by plan id, so merge them in one pass
+    for plan in _plans(plans):
+        plan_columns = [plan.id, plan.title, plan.description, plan.color, _date(plan.start_date), _date(plan.end_date)]
+        if task is None or task.plan_id != plan.id:
+            yield writer.writerow(plan_columns + ['', '', '', ''])
+            continue
+        while task is not None and task.plan_id == plan.id:
+            yield writer.writerow(plan_columns + [task.title, task.description, _date(task.task_date), task.status])
+            task = next(tasks, None)
+
+
+# --- iCalendar ----------------------------------------------------------
+
+def _ical_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ical_line(line):
+    """Fold a content line at 75 octets as RFC 5545 requires."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Don't split a UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ical_stamp(value):
+    return timezone.localtime(value, dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ical_uid(task):
+    if isinstance(task, recurrence.Occurrence):
+        return f'series-{task.series_id}-{task.task_date:%Y%m%d}'
+    return f'task-{task.id}'
+
+
+def export_ical(plans, calendar_name='PlanAnything'):
+    yield ''.join(_ical_line(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//PlanAnything//Plan export//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_ical_text(calendar_name)}',
+    ])
+    titles = {plan.id: plan.title for plan in _plans(plans)}
+    for task in _tasks(plans):
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:{_ical_uid(task)}@plananything',
+            f'DTSTAMP:{_ical_stamp(task.updated_at)}',
+            f'DTSTART;VALUE=DATE:{task.task_date:%Y%m%d}',
+            f'DTEND;VALUE=DATE:{task.task_date + timedelta(days=1):%Y%m%d}',
+            f'SUMMARY:{_ical_text(task.title)}',
+        ]
+        if task.description:
+            lines.append(f'DESCRIPTION:{_ical_text(task.description)}')
+        lines.append(f'CATEGORIES:{_ical_text(titles.get(task.plan_id, ""))}')
+        lines.append(f'X-PLANANYTHING-STATUS:{task.status}')
+        lines.append('TRANSP:TRANSPARENT')
+        lines.append('END:VEVENT')
+        yield ''.join(_ical_line(line) for line in lines)
+    yield _ical_line('END:VCALENDAR')
+
+
+EXPORTERS = {'ics': export_ical, 'csv': export_csv, 'json': export_json}
+
+
+# --- Import -------------------------------------------------------------
+
+def _parse_date(value, what, line, required=True):
+    if value in (None, ''):
+        if required:
+            raise PlanImportError(f"{what} is required", line)
+        return None
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise PlanImportError(f"{what} must be a YYYY-MM-DD date, got {value!r}", line)
+
+
+def _plan_fields(data, line):
+    title = str(data.get('title') or '').strip()
+    if not title:
+        raise PlanImportError("Plan title is required", line)
+    color = data.get('color') or '#3B82F6'
+    if not isinstance(color, str) or not _HEX_COLOR.match(color):
+        raise PlanImportError(f"Plan color must be #RRGGBB, got {color!r}", line)
+    return {
+        'title': title[:Plan._meta.get_field('title').max_length],
+        'description': str(data.get('description') or ''),
+        'color': color,
+        'start_date': _parse_date(data.get('start_date'), 'Plan start_date', line),
+        'end_date': _parse_date(data.get('end_date'), 'Plan end_date', line, required=False),
+    }
+
+
+def _task_fields(data, line):
+    title = str(data.get('title') or '').strip()
+    if not title:
+        raise PlanImportError("Task title is required", line)
+    status = data.get('status') or 'pending'
+    if status not in ('pending', 'completed'):
+        raise PlanImportError(f"Task status must be pending or completed, got {status!r}", line)
+    return {
+        'title': title[:Task._meta.get_field('title').max_length],
+        'description': str(data.get('description') or ''),
+        'task_date': _parse_date(data.get('task_date'), 'Task task_date', line),
+        'status': status,
+    }
+
+
+class _Importer:
+    """Creates plans as they appear and inserts their tasks in batches."""
+
+    def __init__(self, user):
+        self.user = user
+        self.plans = {}
+        self.pending = []
+        self.task_total = 0
+
+    def plan(self, key, fields):
+        if key not in self.plans:
+            self.plans[key] = Plan.objects.create(user=self.user, **fields)
+        return self.plans[key]
+
+    def add_task(self, plan, fields, line):
+        self.task_total += 1
+        if self.task_total > IMPORT_MAX_TASKS:
+            raise PlanImportError(f"At most {IMPORT_MAX_TASKS} tasks can be imported at once", line)
+        self.pending.append(Task(plan=plan, **fields))
+        if len(self.pending) >= IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        created = Task.objects.bulk_create(self.pending)
+        # bulk_create sends no post_save, so index the tasks here
+        search.index_documents([search.task_document(task, self.user.id) for task in created])
+        self.pending = []
+
+    def finish(self):
+        self.flush()
+        plan_ids = [plan.id for plan in self.plans.values()]
+        if task_counters_enabled() and plan_ids:
+            Plan.objects.filter(id__in=plan_ids).rebuild_task_counts()
+        return list(Plan.objects.filter(id__in=plan_ids).with_task_stats().order_by('id'))
+
+
+def _import_csv(upload, importer):
+    reader = csv.DictReader(codecs.iterdecode(upload, 'utf-8-sig'))
+    missing = {'plan_title', 'plan_start_date'} - set(reader.fieldnames or [])
+    if missing:
+        raise PlanImportError(f"Missing CSV column(s): {', '.join(sorted(missing))}", 1)
+    for row in reader:
+        line = reader.line_num
+        plan_data = {
+            'title': row.get('plan_title'),
+            'description': row.get('plan_description'),
+            'color': row.get('plan_color'),
+            'start_date': row.get('plan_start_date'),
+            'end_date': row.get('plan_end_date'),
+        }
+        plan_fields = _plan_fields(plan_data, line)
+        # Without a plan_key (e.g. a hand-written file), identical columns mean the same plan
+        key = (row.get('plan_key') or '').strip()
+        plan = importer.plan(('key', key) if key else ('columns', *sorted(plan_fields.items())), plan_fields)
+        if (row.get('task_title') or '').strip():
+            importer.add_task(plan, _task_fields({
+                'title': row.get('task_title'),
+                'description': row.get('task_description'),
+                'task_date': row.get('task_date'),
+                'status': row.get('task_status'),
+            }, line), line)
+
+
+class _JSONStream:
+    """
+    Pull parser for the export's JSON layout. Scalar values and the "plans"
+    array are decoded whole; "tasks" is decoded one element at a time.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, upload):
+        self.chunks = codecs.iterdecode(upload.chunks(self.chunk_size), 'utf-8-sig')
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise PlanImportError("Unexpected end of JSON upload")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise PlanImportError(f"Malformed JSON upload: expected {char!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Probably cut off at the end of the buffer; read more and retry
+                if not self._fill():
+                    raise PlanImportError(f"Malformed JSON upload: {e.msg}")
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        """(key, stream) pairs of the top-level object; read or skip each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise PlanImportError("Malformed JSON upload: expected a key")
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def items(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def _plan_reference(value, message, line=None):
+    """A plan key or a task's plan reference, which must be a string or an integer."""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise PlanImportError(f"{message} must be a string or an integer, got {value!r}", line)
+    return value
+
+
+def _import_json(upload, importer):
+    stream = _JSONStream(upload)
+    plan_fields = None
+    for key in stream.members():
+        if key == 'plans':
+            plan_fields = {}
+            for index, data in enumerate(stream.items(), start=1):
+                if not isinstance(data, dict):
+                    raise PlanImportError(f"Plan {index} is not an object")
+                plan_key = _plan_reference(data.get('key', index), f"Plan {index} key")
+                plan_fields[plan_key] = _plan_fields(data, None)
+        elif key == 'tasks':
+            # Tasks are streamed, so the plans they refer to must be known already
+            if plan_fields is None:
+                raise PlanImportError('"plans" must come before "tasks" in a JSON import')
+            for index, data in enumerate(stream.items(), start=1):
+                if not isinstance(data, dict):
+                    raise PlanImportError(f"Task {index} is not an object", index)
+                plan_key = _plan_reference(data.get('plan'), f"Task {index} plan", index)
+                fields = plan_fields.get(plan_key)
+                if fields is None:
+                    raise PlanImportError(f"Task {index} refers to unknown plan {plan_key!r}", index)
+                importer.add_task(importer.plan(plan_key, fields), _task_fields(data, index), index)
+        else:
+            stream.value()
+    # Plans without tasks
+    for key, fields in (plan_fields or {}).items():
+        importer.plan(key, fields)
+
+
+IMPORTERS = {'csv': _import_csv, 'json': _import_json}
+
+
+def import_plans(user, upload, fmt):
+    """
+    Create the plans and tasks in an uploaded CSV or JSON export for user.
+    Returns the created plans with task stats; raises PlanImportError and
+    creates nothing if the upload is malformed.
+    """
+    if fmt not in IMPORTERS:
+        raise PlanImportError(f"Unsupported import format {fmt!r}; use csv or json")
+    importer = _Importer(user)
+    try:
+        with transaction.atomic():
+            IMPORTERS[fmt](upload, importer)
+            return importer.finish()
+    except UnicodeDecodeError:
+        raise PlanImportError("The upload is not UTF-8 text")
+    except csv.Error as e:
+        raise PlanImportError(f"Malformed CSV: {e}")
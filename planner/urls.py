@@ -4,23 +4,47 @@ from . import views
 urlpatterns = [
     path('',views.landing_page, name='landing_page'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/plans/', views.dashboard_plans, name='dashboard_plans'),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('about/', views.about_view, name='about'),
+    path('search/', views.search_view, name='search'),
+    path('search/results/', views.search_results, name='search_results'),
     
     path('plan/create/', views.plan_create, name='plan_create'),
     path('plan/<int:plan_id>/', views.plan_detail, name='plan_detail'),
+    path('plan/<int:plan_id>/month/', views.plan_month_tasks, name='plan_month_tasks'),
     path('plan/<int:plan_id>/edit/', views.plan_edit, name='plan_edit'),
     path('plan/<int:plan_id>/delete/', views.plan_delete, name='plan_delete'),
+    path('plan/<int:plan_id>/export/<str:fmt>/', views.plan_export, name='plan_export'),
+    path('plans/export/<str:fmt>/', views.plans_export, name='plans_export'),
+    path('plans/import/', views.plans_import, name='plans_import'),
     
     path('plan/<int:plan_id>/task/create/', views.task_create, name='task_create'),
     path('task/<int:task_id>/edit/', views.task_edit, name='task_edit'),
     path('task/<int:task_id>/delete/', views.task_delete, name='task_delete'),
     path('task/<int:task_id>/toggle/', views.task_toggle_status, name='task_toggle_status'),
+    path('task/batch/', views.task_batch_update, name='task_batch_update'),
+    path('tasks/overdue/', views.overdue_tasks, name='overdue_tasks'),
+    path('tasks/overdue/badge/', views.overdue_badge, name='overdue_badge'),
+    path('agenda/', views.agenda_view, name='agenda'),
+    path('agenda/tasks/', views.agenda_tasks, name='agenda_tasks'),
+    path('plan/<int:plan_id>/series/create/', views.series_create, name='series_create'),
+    path('series/<int:series_id>/edit/', views.series_edit, name='series_edit'),
+    path('series/<int:series_id>/delete/', views.series_delete, name='series_delete'),
+    path('series/<int:series_id>/<str:date>/edit/', views.occurrence_edit, name='occurrence_edit'),
+    path('series/<int:series_id>/<str:date>/toggle/', views.occurrence_toggle_status, name='occurrence_toggle_status'),
     
     path('chatbot/', views.chatbot_view, name='chatbot'),
+    path('chatbot/<int:conversation_id>/messages/', views.chatbot_messages, name='chatbot_messages'),
+    path('chatbot/<int:conversation_id>/proposals/', views.chatbot_proposed_plans, name='chatbot_proposed_plans'),
     path('chatbot/send/', views.chatbot_send_message, name='chatbot_send_message'),
+    path('chatbot/stream/', views.chatbot_stream_message, name='chatbot_stream_message'),
+    path('chatbot/jobs/', views.chatbot_submit_message, name='chatbot_submit_message'),
+    path('chatbot/jobs/<int:job_id>/', views.chatbot_job_status, name='chatbot_job_status'),
+    path('chatbot/queue-stats/', views.chatbot_queue_stats, name='chatbot_queue_stats'),
     path('chatbot/accept/<int:plan_id>/', views.chatbot_accept_plan, name='chatbot_accept_plan'),
+    path('chatbot/cache-stats/', views.chatbot_cache_stats, name='chatbot_cache_stats'),
     path('chatbot/new/', views.chatbot_new_conversation, name='chatbot_new_conversation'),
 ]
@@ -1,20 +1,39 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse, Http404, HttpResponseBadRequest
+from django.views.decorators.http import require_http_methods, condition
+from django.views.decorators.cache import cache_control
 from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
 from datetime import datetime, timedelta
 import calendar
+import hashlib
 import json
+from asgiref.sync import sync_to_async
 from django.urls import reverse
 from django.http import HttpResponse
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 
-from .models import Plan, Task, ChatConversation, ChatMessage, ProposedPlan
-from .forms import PlanForm, TaskForm
-from .chatbot import chat_with_assistant, parse_plan_proposal
+from .models import Plan, Task, TaskSeries, ChatConversation, ChatMessage, ProposedPlan, ChatJob
+from . import agenda, recurrence, retention, search, transfer
+from .pagination import keyset_page, InvalidCursor
+from .calendar_cache import month_grid_range, grid_cache_key, grid_cache_timeout
+from .forms import PlanForm, TaskForm, TaskSeriesForm, OccurrenceForm
+from .jobs import submit_chat_turn, queue_depth, queue_full, queue_position, queue_stats
+from .chatbot import (
+    chat_with_assistant, stream_chat_with_assistant, build_message_history, parse_plan_proposal,
+    response_cache_stats, save_assistant_reply, AssistantBusyError, AssistantStreamError, PlanProposalExtractor,
+    PlanProposalError,
+)
 
 def register_view(request):
     if request.user.is_authenticated:
@@ -77,21 +96,118 @@ def landing_page(request):
     return render(request, 'planner/landing_page.html', {'user_has_no_plans': False})
 
 
+def _etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest()
+
+def _has_pending_messages(request):
+    """Whether contrib.messages are waiting to be shown; len() doesn't consume them."""
+    return len(messages.get_messages(request)) > 0
+
+def _dashboard_etag(request):
+    """
+    Validator for the dashboard: changes when any of the user's plans,
+    tasks or task series is created, edited or deleted (counts catch
+    deletions). Occurrence edits bump their series' updated_at. None
+    while messages are pending, so a 304 can't swallow them.
+    """
+    if _has_pending_messages(request):
+        return None
+    stats = Plan.objects.filter(user=request.user).aggregate(
+        plan_total=Count('id', distinct=True),
+        plan_updated=Max('updated_at'),
+        task_total=Count('tasks'),
+        task_updated=Max('tasks__updated_at'),
+    )
+    # Separate from the plan aggregate so tasks and series aren't joined against each other
+    series = TaskSeries.objects.filter(plan__user=request.user).aggregate(
+        series_total=Count('id'),
+        series_updated=Max('updated_at'),
+    )
+    return _etag('dashboard', request.user.id, *stats.values(), *series.values())
+
+DASHBOARD_PAGE_SIZE = 24
+
+def _plans_page(user, cursor=None):
+    # Task totals/completed counts come back with the plans in one query
+    return keyset_page(
+        Plan.objects.filter(user=user).with_task_stats(),
+        'created_at',
+        cursor=cursor,
+        size=DASHBOARD_PAGE_SIZE,
+    )
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_dashboard_etag)
 def dashboard_view(request):
     """Main dashboard for logged-in users with plans."""
-    plans = Plan.objects.filter(user=request.user)
+    plans, next_cursor = _plans_page(request.user)
     
     # If no plans yet → redirect to landing page (which will show no-plan view)
-    if not plans.exists():
+    if not plans:
         return redirect('landing_page')
     
     context = {
         'plans': plans,
-        'has_plans': True
+        'next_cursor': next_cursor,
+        'has_plans': True,
+        'card_cache_timeout': settings.PLANNER_PLAN_CARD_CACHE_TIMEOUT,
     }
     return render(request, 'planner/dashboard.html', context)
 
+@login_required
+def dashboard_plans(request):
+    """Next page of dashboard plan cards, loaded by infinite scroll."""
+    try:
+        plans, next_cursor = _plans_page(request.user, request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    return render(request, 'planner/partials/plan_cards.html', {
+        'plans': plans,
+        'next_cursor': next_cursor,
+        'card_cache_timeout': settings.PLANNER_PLAN_CARD_CACHE_TIMEOUT,
+    })
+
+SEARCH_RESULTS_LIMIT = 20
+
+@login_required
+def search_view(request):
+    """Search page. HTMX requests from its search box get just the results list."""
+    query = request.GET.get('q', '').strip()
+    results = search.search(request.user, query, limit=SEARCH_RESULTS_LIMIT) if query else []
+    context = {
+        'query': query,
+        'results': results or [],
+        'search_unavailable': results is None
+    }
+    if request.headers.get('HX-Request'):
+        return render(request, 'planner/partials/search_results.html', context)
+    return render(request, 'planner/search.html', context)
+
+@login_required
+def search_results(request):
+    """Ranked search results as JSON, with <mark>-highlighted snippets."""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'q is required'}, status=400)
+    results = search.search(request.user, query, limit=SEARCH_RESULTS_LIMIT)
+    if results is None:
+        return JsonResponse({'error': 'Search is not available on this database'}, status=501)
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'type': result.kind,
+                'id': result.object.id,
+                'title': result.title,
+                'snippet': str(result.snippet),
+                'url': result.url,
+                'rank': result.rank,
+            }
+            for result in results
+        ]
+    })
+
 @login_required
 def plan_create(request):
     if request.method == "POST":
@@ -110,37 +226,143 @@ def plan_create(request):
     # If HTMX request, render partial only
     template = 'planner/partials/plan_form_partial.html' if request.headers.get('HX-Request') else 'planner/plan_form.html'
     return render(request, template, {'form': form})
+def _requested_month(request):
+    """Year/month from the query string, falling back to the current month."""
+    today = timezone.localdate()
+    try:
+        year = int(request.GET.get('year', today.year))
+        month = int(request.GET.get('month', today.month))
+    except (TypeError, ValueError):
+        return today.year, today.month
+    if not (1 <= month <= 12 and 1 <= year <= 9999):
+        return today.year, today.month
+    return year, month
+
+def _tasks_by_date(plan, start, end, today):
+    """
+    Tasks of a plan within [start, end], plus the occurrences of its
+    recurring series in that window, bucketed by 'YYYY-MM-DD'. Tasks
+    carry their overdue state as of today from the query.
+    """
+    tasks_by_date = {}
+    tasks = list(plan.tasks.filter(task_date__range=(start, end)).with_overdue(today))
+    for task in tasks + recurrence.plan_occurrences(plan.id, start, end):
+        # ensure consistent string key (YYYY-MM-DD)
+        date_key = task.task_date.strftime('%Y-%m-%d')
+        tasks_by_date.setdefault(date_key, []).append(task)
+    return tasks_by_date
+
+def _plan_grid_state(request, plan_id):
+    """
+    The plan's updated_at plus the count and latest updated_at of tasks and
+    task series in the requested month grid, or None if the user has no such
+    plan. Both the ETag and the grid's cache key are built from it, so it is
+    read once per request.
+    """
+    year, month = _requested_month(request)
+    memo = getattr(request, '_plan_grid_state', None)
+    if memo is not None and memo[0] == (plan_id, year, month):
+        return memo[1]
+    grid_start, grid_end = month_grid_range(year, month)
+    in_grid = Q(tasks__task_date__range=(grid_start, grid_end))
+    # Occurrence edits bump their series' updated_at
+    series_in_grid = Q(task_series__start_date__lte=grid_end, task_series__until__gte=grid_start)
+    stats = Plan.objects.filter(id=plan_id, user=request.user).aggregate(
+        plan_updated=Max('updated_at'),
+        task_total=Count('tasks', filter=in_grid, distinct=True),
+        task_updated=Max('tasks__updated_at', filter=in_grid),
+        series_total=Count('task_series', filter=series_in_grid, distinct=True),
+        series_updated=Max('task_series__updated_at', filter=series_in_grid),
+    )
+    state = None if stats['plan_updated'] is None else tuple(stats.values())
+    request._plan_grid_state = ((plan_id, year, month), state)
+    return state
+
+def _plan_detail_etag(request, plan_id):
+    """
+    Validator for a plan's calendar page: the month grid's state (see
+    _plan_grid_state), the month, the user and today's date (which drives
+    overdue and today styling). None while messages are pending.
+    """
+    if _has_pending_messages(request):
+        return None
+    state = _plan_grid_state(request, plan_id)
+    if state is None:
+        # Let the view answer 404
+        return None
+    year, month = _requested_month(request)
+    return _etag('plan_detail', request.user.id, plan_id, year, month, timezone.localdate(), *state)
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_plan_detail_etag)
 def plan_detail(request, plan_id):
     plan = get_object_or_404(Plan, id=plan_id, user=request.user)
     
-    year = request.GET.get('year', timezone.now().year)
-    month = request.GET.get('month', timezone.now().month)
+    year, month = _requested_month(request)
     
-    year = int(year)
-    month = int(month)
+    today = timezone.localdate()
     
-    cal = calendar.monthcalendar(year, month)
-    month_name = calendar.month_name[month]
-    
-    tasks_by_date = {}
-    for task in plan.tasks.all():
-        # ensure consistent string key (YYYY-MM-DD)
-        date_key = task.task_date.strftime('%Y-%m-%d')
-        tasks_by_date.setdefault(date_key, []).append(task)
+    # The rendered grid is cached under a key that changes with the month's tasks
+    grid_key = grid_cache_key(plan.id, year, month, today, _plan_grid_state(request, plan.id))
+    calendar_grid = cache.get(grid_key)
+    if calendar_grid is None:
+        # Only load the tasks visible in this month's grid
+        grid_start, grid_end = month_grid_range(year, month)
+        calendar_grid = render_to_string('planner/partials/month_grid.html', {
+            'calendar': calendar.monthcalendar(year, month),
+            'year': year,
+            'month': month,
+            'tasks_by_date': _tasks_by_date(plan, grid_start, grid_end, today),
+            'today': today,
+        })
+        cache.set(grid_key, calendar_grid, timeout=grid_cache_timeout())
         
     context = {
         'plan': plan,
-        'calendar': cal,
         'year': year,
         'month': month,
-        'month_name': month_name,
-        'tasks_by_date': tasks_by_date,
-        'today': timezone.now().date(),
+        'month_name': calendar.month_name[month],
+        'calendar_grid': mark_safe(calendar_grid),
+        'today': today,
     }
     
     return render(request, 'planner/plan_detail.html', context)
 
+@login_required
+def plan_month_tasks(request, plan_id):
+    """JSON for one month of a plan's calendar, used for in-page month navigation."""
+    plan = get_object_or_404(Plan, id=plan_id, user=request.user)
+    
+    year, month = _requested_month(request)
+    today = timezone.localdate()
+    grid_start, grid_end = month_grid_range(year, month)
+    tasks_by_date = _tasks_by_date(plan, grid_start, grid_end, today)
+    
+    return JsonResponse({
+        'year': year,
+        'month': month,
+        'month_name': calendar.month_name[month],
+        'calendar': calendar.monthcalendar(year, month),
+        'start': grid_start.isoformat(),
+        'end': grid_end.isoformat(),
+        'today': today.isoformat(),
+        'tasks_by_date': {
+            date_key: [
+                {
+                    'id': task.id,
+                    'series_id': getattr(task, 'series_id', None),
+                    'title': task.title,
+                    'status': task.status,
+                    'is_overdue': task.is_overdue(),
+                    'edit_url': task.edit_url(),
+                }
+                for task in tasks
+            ]
+            for date_key, tasks in tasks_by_date.items()
+        },
+    })
+
 @login_required
 def plan_edit(request, plan_id):
     plan = get_object_or_404(Plan, id=plan_id, user=request.user)
@@ -167,6 +389,64 @@ def plan_delete(request, plan_id):
     
     return render(request, 'planner/plan_confirm_delete.html', {'plan': plan})
 
+def _export_response(plans, fmt, filename, calendar_name):
+    if fmt not in transfer.EXPORTERS:
+        raise Http404("Unknown export format")
+    exporter = transfer.EXPORTERS[fmt]
+    chunks = exporter(plans, calendar_name) if fmt == 'ics' else exporter(plans)
+    response = StreamingHttpResponse(chunks, content_type=transfer.EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+@login_required
+def plan_export(request, plan_id, fmt):
+    """Stream one plan as iCalendar (ics), CSV or JSON."""
+    plan = get_object_or_404(Plan.objects.only('id', 'title'), id=plan_id, user=request.user)
+    return _export_response(Plan.objects.filter(id=plan.id), fmt, f"plan-{plan.id}", plan.title)
+
+@login_required
+def plans_export(request, fmt):
+    """Stream all of the user's plans as iCalendar (ics), CSV or JSON."""
+    return _export_response(Plan.objects.filter(user=request.user), fmt, 'plans', 'PlanAnything')
+
+@login_required
+@require_http_methods(["POST"])
+def plans_import(request):
+    """
+    Create plans from an uploaded CSV or JSON export ('file'). The format is
+    taken from 'format' or the file extension. Answers JSON when asked for
+    it, otherwise redirects to the dashboard with a message.
+    """
+    upload = request.FILES.get('file')
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    if upload is None:
+        error = {'error': 'No file uploaded', 'line': None}
+    else:
+        fmt = request.POST.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        try:
+            plans = transfer.import_plans(request.user, upload, fmt)
+            error = None
+        except transfer.PlanImportError as e:
+            error = e.as_dict()
+    
+    if error:
+        if wants_json:
+            return JsonResponse(error, status=400)
+        location = f" (line {error['line']})" if error['line'] else ''
+        messages.error(request, f"Import failed{location}: {error['error']}")
+        return redirect('dashboard')
+    
+    if wants_json:
+        return JsonResponse({
+            'plans': [
+                {'id': plan.id, 'title': plan.title, 'tasks': plan.task_total}
+                for plan in plans
+            ]
+        }, status=201)
+    task_total = sum(plan.task_total for plan in plans)
+    messages.success(request, f"Imported {len(plans)} plan(s) with {task_total} task(s).")
+    return redirect('dashboard')
+
 @login_required
 def task_create(request, plan_id):
     plan = get_object_or_404(Plan, id=plan_id, user=request.user)
@@ -180,7 +460,7 @@ def task_create(request, plan_id):
             messages.success(request, 'Task created successfully!')
             return redirect('plan_detail', plan_id=plan.id)
     else:
-        task_date = request.GET.get('date', timezone.now().date())
+        task_date = request.GET.get('date', timezone.localdate())
         form = TaskForm(initial={'task_date': task_date})
     
     return render(request, 'planner/task_form.html', {'form': form, 'plan': plan, 'is_edit': False})
@@ -212,36 +492,357 @@ def task_delete(request, task_id):
     
     return render(request, 'planner/task_confirm_delete.html', {'task': task})
 
+_TOGGLED_STATUS = Case(
+    When(status='pending', then=Value('completed')),
+    default=Value('pending'),
+)
+
 @login_required
 @require_http_methods(["POST"])
 def task_toggle_status(request, task_id):
-    task = get_object_or_404(Task, id=task_id, plan__user=request.user)
+    # Flip status with one conditional UPDATE instead of loading and re-saving the row
+    with transaction.atomic():
+        updated = Task.objects.filter(id=task_id, plan__user=request.user).update(
+            status=_TOGGLED_STATUS,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            raise Http404("Task not found")
+        task = Task.objects.only('plan_id', 'status', 'task_date').get(id=task_id)
+        Task.adjust_plan_counters(task.plan_id, 0, 1 if task.status == 'completed' else -1)
+    
+    return JsonResponse({
+        'status': task.status,
+        'is_overdue': task.is_overdue()
+    })
+
+TASK_BATCH_LIMIT = 500
+
+@login_required
+@require_http_methods(["POST"])
+def task_batch_update(request):
+    """
+    Update many tasks at once. Accepts JSON with 'task_ids' plus a target
+    'status' ('pending', 'completed' or 'toggle') and/or a 'date_offset' in
+    days, applies it with a single UPDATE, and returns every task's new state.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    task_ids = data.get('task_ids')
+    status = data.get('status')
+    date_offset = data.get('date_offset')
+    
+    if not isinstance(task_ids, list) or not task_ids or not all(isinstance(i, int) for i in task_ids):
+        return JsonResponse({'error': 'task_ids must be a non-empty list of ids'}, status=400)
+    if len(task_ids) > TASK_BATCH_LIMIT:
+        return JsonResponse({'error': f'At most {TASK_BATCH_LIMIT} tasks per request'}, status=400)
+    if status is not None and status not in ('pending', 'completed', 'toggle'):
+        return JsonResponse({'error': 'status must be pending, completed or toggle'}, status=400)
+    if date_offset is not None and (not isinstance(date_offset, int) or isinstance(date_offset, bool)):
+        return JsonResponse({'error': 'date_offset must be an integer number of days'}, status=400)
+    if status is None and not date_offset:
+        return JsonResponse({'error': 'Nothing to update'}, status=400)
+    
+    changes = {'updated_at': timezone.now()}
+    if status == 'toggle':
+        changes['status'] = _TOGGLED_STATUS
+    elif status is not None:
+        changes['status'] = Value(status)
+    if date_offset:
+        changes['task_date'] = F('task_date') + timedelta(days=date_offset)
+    
+    task_ids = set(task_ids)
+    with transaction.atomic():
+        # Ownership check and pre-update state in one query
+        before = {
+            task_id: (plan_id, task_date, old_status)
+            for task_id, plan_id, task_date, old_status in Task.objects.select_for_update(of=('self',))
+            .filter(id__in=task_ids, plan__user=request.user)
+            .values_list('id', 'plan_id', 'task_date', 'status')
+        }
+        if len(before) != len(task_ids):
+            missing = sorted(task_ids - before.keys())
+            return JsonResponse({'error': 'Tasks not found', 'task_ids': missing}, status=404)
+        
+        Task.objects.filter(id__in=task_ids).update(**changes)
+        after = list(Task.objects.filter(id__in=task_ids).only('plan_id', 'task_date', 'status'))
+        
+        completed_delta = {}
+        for task in after:
+            was_done = before[task.id][2] == 'completed'
+            is_done = task.status == 'completed'
+            completed_delta[task.plan_id] = completed_delta.get(task.plan_id, 0) + is_done - was_done
+        for plan_id, delta in completed_delta.items():
+            Task.adjust_plan_counters(plan_id, 0, delta)
+    
+    return JsonResponse({
+        'tasks': [
+            {
+                'id': task.id,
+                'status': task.status,
+                'task_date': task.task_date.isoformat(),
+                'is_overdue': task.is_overdue(),
+            }
+            for task in sorted(after, key=lambda task: task.id)
+        ]
+    })
+
+OVERDUE_LIMIT = 50
+
+def _overdue_tasks(user, today):
+    return Task.objects.overdue(today).filter(plan__user=user)
+
+@login_required
+def overdue_tasks(request):
+    """
+    The user's overdue tasks across all plans, oldest first, with the total.
+    "Today" is the user's local date. Occurrences of recurring series are
+    not included.
+    """
+    today = timezone.localdate()
+    try:
+        limit = min(max(int(request.GET.get('limit', OVERDUE_LIMIT)), 0), OVERDUE_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    tasks = _overdue_tasks(request.user, today)
+    rows = tasks.order_by('task_date', 'id').values(
+        'id', 'title', 'task_date', 'plan_id', 'plan__title', 'plan__color'
+    )[:limit]
+    return JsonResponse({
+        'today': today.isoformat(),
+        'count': tasks.count(),
+        'tasks': [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'task_date': row['task_date'].isoformat(),
+                'plan_id': row['plan_id'],
+                'plan_title': row['plan__title'],
+                'plan_color': row['plan__color'],
+                'edit_url': reverse('task_edit', args=[row['id']]),
+            }
+            for row in rows
+        ]
+    })
+
+@login_required
+def overdue_badge(request):
+    """Overdue count for the navigation bar, fetched by base.html after every page loads."""
+    count = _overdue_tasks(request.user, timezone.localdate()).count()
+    return render(request, 'planner/partials/overdue_badge.html', {'overdue_count': count})
+
+def _agenda_range(request):
+    """
+    (range name, start, end, today) for ?range=today|week and an optional
+    ?date=YYYY-MM-DD inside it, falling back to today.
+    """
+    today = timezone.localdate()
+    range_name = request.GET.get('range', agenda.TODAY)
+    if range_name not in agenda.RANGES:
+        range_name = agenda.TODAY
+    try:
+        day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = today
+    start, end = agenda.date_range(range_name, day)
+    return range_name, start, end, today
+
+@login_required
+def agenda_view(request):
+    """Tasks of all the user's plans for a day or a week, grouped by day."""
+    range_name, start, end, today = _agenda_range(request)
+    step = timedelta(days=(end - start).days + 1)
+    return render(request, 'planner/agenda.html', {
+        'range': range_name,
+        'start': start,
+        'end': end,
+        'today': today,
+        'previous_date': start - step,
+        'next_date': start + step,
+        'days': [(day, list(items)) for day, items in agenda.agenda_days(request.user, start, end, today)],
+    })
+
+@login_required
+def agenda_tasks(request):
+    """The agenda as streamed JSON, for the same range and date parameters as agenda_view."""
+    range_name, start, end, today = _agenda_range(request)
+    return StreamingHttpResponse(
+        agenda.export_json(request.user, range_name, start, end, today),
+        content_type='application/json'
+    )
+
+@login_required
+def series_create(request, plan_id):
+    plan = get_object_or_404(Plan, id=plan_id, user=request.user)
     
-    if task.status == 'pending':
-        task.status = 'completed'
+    if request.method == 'POST':
+        form = TaskSeriesForm(request.POST)
+        if form.is_valid():
+            series = form.save(commit=False)
+            series.plan = plan
+            series.save()
+            messages.success(request, 'Recurring task created successfully!')
+            return redirect('plan_detail', plan_id=plan.id)
     else:
-        task.status = 'pending'
+        start_date = request.GET.get('date', timezone.localdate())
+        form = TaskSeriesForm(initial={'start_date': start_date, 'until': plan.end_date})
     
-    task.save()
+    return render(request, 'planner/series_form.html', {'form': form, 'plan': plan, 'is_edit': False})
+
+@login_required
+def series_edit(request, series_id):
+    """Edit the rule or text of a whole series; overrides on dates it no longer has are dropped."""
+    series = get_object_or_404(TaskSeries.objects.select_related('plan'), id=series_id, plan__user=request.user)
+    
+    if request.method == 'POST':
+        form = TaskSeriesForm(request.POST, instance=series)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Recurring task updated successfully!')
+            return redirect('plan_detail', plan_id=series.plan_id)
+    else:
+        form = TaskSeriesForm(instance=series)
+    
+    return render(request, 'planner/series_form.html', {'form': form, 'plan': series.plan, 'series': series, 'is_edit': True})
+
+@login_required
+def series_delete(request, series_id):
+    series = get_object_or_404(TaskSeries.objects.select_related('plan'), id=series_id, plan__user=request.user)
+    
+    if request.method == 'POST':
+        series.delete()
+        messages.success(request, 'Recurring task deleted successfully!')
+        return redirect('plan_detail', plan_id=series.plan_id)
+    
+    return render(request, 'planner/series_confirm_delete.html', {'series': series})
+
+def _get_occurrence_date(request, series_id, date):
+    """The user's series and the requested date, or 404 if the series has no occurrence then."""
+    series = get_object_or_404(TaskSeries.objects.select_related('plan'), id=series_id, plan__user=request.user)
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        raise Http404("Invalid date")
+    if not recurrence.occurs_on(series, day):
+        raise Http404("The series has no occurrence on this date")
+    return series, day
+
+@login_required
+def occurrence_edit(request, series_id, date):
+    """Edit, complete or skip a single date of a series."""
+    series, day = _get_occurrence_date(request, series_id, date)
+    occurrence = recurrence.Occurrence(series, day, series.overrides.filter(date=day).first())
+    
+    if request.method == 'POST':
+        form = OccurrenceForm(request.POST)
+        if form.is_valid():
+            recurrence.update_occurrence(
+                series, day,
+                title=form.cleaned_data['title'],
+                description=form.cleaned_data['description'] or None,
+                status=form.cleaned_data['status'],
+                cancelled=form.cleaned_data['cancelled'],
+            )
+            messages.success(request, 'Task updated successfully!')
+            return redirect('plan_detail', plan_id=series.plan_id)
+    else:
+        form = OccurrenceForm(initial={
+            'title': occurrence.title,
+            'description': occurrence.description,
+            'status': occurrence.status,
+            'cancelled': occurrence.override is not None and occurrence.override.cancelled,
+        })
+    
+    return render(request, 'planner/occurrence_form.html', {
+        'form': form, 'plan': series.plan, 'series': series, 'occurrence': occurrence,
+    })
+
+@login_required
+@require_http_methods(["POST"])
+def occurrence_toggle_status(request, series_id, date):
+    series, day = _get_occurrence_date(request, series_id, date)
+    occurrence = recurrence.update_occurrence(series, day, toggle_status=True)
     
     return JsonResponse({
-        'status': task.status,
-        'is_overdue': task.is_overdue()
+        'status': occurrence.status,
+        'is_overdue': occurrence.is_overdue()
     })
 
+CHAT_MESSAGES_PAGE_SIZE = 50
+PROPOSED_PLANS_PAGE_SIZE = 3
+
+def _messages_page(conversation, cursor=None):
+    """A page of messages going back in time from cursor, in display (oldest first) order."""
+    page = keyset_page(conversation.messages.all(), 'created_at', cursor=cursor, size=CHAT_MESSAGES_PAGE_SIZE)
+    return list(reversed(page.items)), page.next_cursor
+
+def _proposed_plans_page(conversation, cursor=None):
+    return keyset_page(
+        ProposedPlan.objects.filter(conversation=conversation, is_accepted=False),
+        'created_at',
+        cursor=cursor,
+        size=PROPOSED_PLANS_PAGE_SIZE,
+    )
+
+def _get_conversation(request, conversation_id):
+    """The user's conversation, with its messages brought back first if it was archived."""
+    conversation = get_object_or_404(ChatConversation, id=conversation_id, user=request.user)
+    retention.restore_conversation(conversation)
+    return conversation
+
 @login_required
 def chatbot_view(request):
-    conversation = ChatConversation.objects.filter(user=request.user).order_by('-updated_at').first()
-    if not conversation:
-        conversation = ChatConversation.objects.create(user=request.user)
+    """The chat page for ?conversation=<id>, or else the most recently used conversation."""
+    conversation_id = request.GET.get('conversation')
+    if conversation_id and conversation_id.isdigit():
+        conversation = _get_conversation(request, conversation_id)
+    else:
+        conversation = ChatConversation.objects.filter(user=request.user).order_by('-updated_at').first()
+        if not conversation:
+            conversation = ChatConversation.objects.create(user=request.user)
+        retention.restore_conversation(conversation)
     
-    messages = conversation.messages.all()
-    proposed_plans = ProposedPlan.objects.filter(conversation=conversation, is_accepted=False)
+    # Only the newest messages and proposals; older ones load on demand
+    messages, older_cursor = _messages_page(conversation)
+    proposed_plans, proposals_cursor = _proposed_plans_page(conversation)
     
     return render(request, 'planner/chatbot.html', {
         'conversation': conversation,
         'messages': messages,
-        'proposed_plans': proposed_plans
+        'older_cursor': older_cursor,
+        'proposed_plans': proposed_plans,
+        'proposals_cursor': proposals_cursor
+    })
+
+@login_required
+def chatbot_messages(request, conversation_id):
+    """Older messages of a conversation, loaded when the chat is scrolled to the top."""
+    conversation = _get_conversation(request, conversation_id)
+    try:
+        messages, older_cursor = _messages_page(conversation, request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    return render(request, 'planner/partials/chat_messages.html', {
+        'conversation': conversation,
+        'messages': messages,
+        'older_cursor': older_cursor
+    })
+
+@login_required
+def chatbot_proposed_plans(request, conversation_id):
+    """Older unaccepted proposals of a conversation."""
+    conversation = _get_conversation(request, conversation_id)
+    try:
+        proposed_plans, proposals_cursor = _proposed_plans_page(conversation, request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    return render(request, 'planner/partials/proposed_plans.html', {
+        'conversation': conversation,
+        'proposed_plans': proposed_plans,
+        'proposals_cursor': proposals_cursor
     })
 
 @login_required
@@ -254,7 +855,7 @@ def chatbot_send_message(request):
     if not user_message:
         return JsonResponse({'error': 'Message cannot be empty'}, status=400)
     
-    conversation = get_object_or_404(ChatConversation, id=conversation_id, user=request.user)
+    conversation = _get_conversation(request, conversation_id)
     
     ChatMessage.objects.create(
         conversation=conversation,
@@ -262,68 +863,286 @@ def chatbot_send_message(request):
         content=user_message
     )
     
-    message_history = [
-        {'role': msg.role, 'content': msg.content}
-        for msg in conversation.messages.all()
-    ]
+    summary, message_history = build_message_history(conversation)
     
-    assistant_response = chat_with_assistant(message_history)
+    assistant_response = chat_with_assistant(message_history, summary)
+    try:
+        plan_data = parse_plan_proposal(assistant_response)
+        proposal_error = None
+    except PlanProposalError as e:
+        plan_data = None
+        proposal_error = e.as_dict()
+    _, proposed_plan = save_assistant_reply(conversation, request.user, assistant_response, plan_data)
+    proposed_plan_id = proposed_plan.id if proposed_plan else None
     
-    ChatMessage.objects.create(
+    return JsonResponse({
+        'user_message': user_message,
+        'assistant_message': assistant_response,
+        'proposed_plan_id': proposed_plan_id,
+        'proposal_error': proposal_error
+    })
+
+@login_required
+@require_http_methods(["POST"])
+def chatbot_submit_message(request):
+    """
+    Queue a chat turn for the run_chat_workers pool instead of waiting for
+    the model. Returns 202 with the job id and where to poll for the reply,
+    or 503 with Retry-After when the queue is over CHATBOT_JOB_QUEUE_LIMIT.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    user_message = data.get('message', '').strip()
+    conversation_id = data.get('conversation_id')
+    
+    if not user_message:
+        return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+    
+    conversation = _get_conversation(request, conversation_id)
+    
+    depth = queue_depth()
+    if queue_full(depth):
+        response = JsonResponse({
+            'error': "The assistant is busy right now. Please try again in a moment.",
+            'queue_depth': depth
+        }, status=503)
+        response['Retry-After'] = str(getattr(settings, 'CHATBOT_JOB_RETRY_AFTER', 5))
+        return response
+    
+    job = submit_chat_turn(conversation, request.user, user_message)
+    return JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('chatbot_job_status', args=[job.id]),
+        'queue_depth': depth + 1
+    }, status=202)
+
+@login_required
+def chatbot_job_status(request, job_id):
+    """Progress of a queued chat turn, and the reply once it has succeeded."""
+    job = get_object_or_404(
+        ChatJob.objects.select_related('assistant_message', 'proposed_plan'), id=job_id, user=request.user
+    )
+    data = {
+        'job_id': job.id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+    }
+    if job.status == 'queued':
+        data['queue_position'] = queue_position(job)
+        if job.attempts:
+            data['retry_at'] = job.run_after.isoformat()
+    elif job.status == 'succeeded':
+        data['assistant_message'] = job.assistant_message.content if job.assistant_message else None
+        data['proposed_plan_id'] = job.proposed_plan_id
+        data['proposal_error'] = job.proposal_error
+        if job.proposed_plan:
+            proposal = job.proposed_plan
+            data['plan'] = {
+                'title': proposal.title,
+                'description': proposal.description,
+                'start_date': proposal.start_date.isoformat(),
+                'end_date': proposal.end_date.isoformat() if proposal.end_date else None,
+                'tasks': proposal.tasks_data,
+            }
+    elif job.status == 'failed':
+        data['error'] = "I'm sorry, the assistant could not answer. Please try again."
+    
+    response = JsonResponse(data)
+    if job.status in ('queued', 'running'):
+        response['Retry-After'] = '1'
+    return response
+
+@staff_member_required
+def chatbot_queue_stats(request):
+    return JsonResponse(queue_stats())
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@login_required
+@require_http_methods(["POST"])
+async def chatbot_stream_message(request):
+    """
+    Async variant of chatbot_send_message that streams the reply as
+    server-sent events: `token` chunks, a `proposal` event as soon as a
+    plan proposal's JSON closes, then `done` or `error`. Serve through
+    plananything.asgi so waiting on Gemini does not hold a worker thread.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    user_message = data.get('message', '').strip()
+    conversation_id = data.get('conversation_id')
+    
+    if not user_message:
+        return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+    
+    user = await request.auser()
+    conversation = await ChatConversation.objects.filter(id=conversation_id, user=user).afirst()
+    if conversation is None:
+        raise Http404("Conversation not found")
+    await sync_to_async(retention.restore_conversation)(conversation)
+    
+    await ChatMessage.objects.acreate(
         conversation=conversation,
-        role='assistant',
-        content=assistant_response
+        role='user',
+        content=user_message
     )
     
-    plan_data = parse_plan_proposal(assistant_response)
-    proposed_plan_id = None
+    summary, message_history = await sync_to_async(build_message_history)(conversation)
     
-    if plan_data:
-        proposed_plan = ProposedPlan.objects.create(
-            conversation=conversation,
-            user=request.user,
-            title=plan_data.get('title', 'Untitled Plan'),
-            description=plan_data.get('description', ''),
-            color=plan_data.get('color', '#3B82F6'),
-            start_date=plan_data.get('start_date'),
-            end_date=plan_data.get('end_date'),
-            tasks_data=plan_data.get('tasks', [])
+    async def event_stream():
+        chunks = []
+        extractor = PlanProposalExtractor()
+        try:
+            async for text in stream_chat_with_assistant(message_history, summary):
+                chunks.append(text)
+                yield _sse_event('token', {'text': text})
+                plan = extractor.feed(text)
+                if plan is not None:
+                    yield _sse_event('proposal', {'plan': plan})
+        except (AssistantBusyError, AssistantStreamError) as e:
+            # Nothing is saved, so a half-written reply never enters the history
+            yield _sse_event('error', {'error': str(e)})
+            return
+        extractor.close()
+        
+        assistant_response = ''.join(chunks)
+        _, proposed_plan = await sync_to_async(save_assistant_reply)(
+            conversation, user, assistant_response, extractor.plan
         )
-        proposed_plan_id = proposed_plan.id
+        yield _sse_event('done', {
+            'assistant_message': assistant_response,
+            'proposed_plan_id': proposed_plan.id if proposed_plan else None,
+            'proposal_error': extractor.error.as_dict() if extractor.error else None
+        })
     
-    conversation.save()
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _normalize_proposed_series(index, task_date, repeat, plan_end_date):
+    """TaskSeries fields from a proposed task's 'repeat' object."""
+    if not isinstance(repeat, dict) or repeat.get('frequency') not in recurrence.FREQUENCIES:
+        raise ValidationError(f'Task {index} has an invalid repeat rule.')
+    interval = repeat.get('interval', 1)
+    if not isinstance(interval, int) or isinstance(interval, bool) or interval < 1:
+        raise ValidationError(f'Task {index} has an invalid repeat interval: {interval!r}.')
+    try:
+        weekdays = recurrence.parse_weekdays(repeat.get('weekdays') or [])
+    except ValueError:
+        raise ValidationError(f'Task {index} has invalid repeat weekdays.')
+    raw_until = repeat.get('until')
+    if raw_until is None:
+        until = plan_end_date
+    else:
+        try:
+            until = datetime.strptime(str(raw_until).strip(), '%Y-%m-%d').date()
+        except ValueError:
+            until = None
+    if until is None or until < task_date:
+        raise ValidationError(f'Task {index} repeats without a valid end date.')
+    if repeat['frequency'] != recurrence.WEEKLY:
+        weekdays = []
+    count = recurrence.count_occurrences(task_date, until, repeat['frequency'], interval, weekdays)
+    if count > recurrence.MAX_OCCURRENCES:
+        raise ValidationError(f'Task {index} repeats more than {recurrence.MAX_OCCURRENCES} times.')
+    return {
+        'frequency': repeat['frequency'],
+        'interval': interval,
+        'weekdays': weekdays,
+        'start_date': task_date,
+        'until': until,
+        'occurrence_count': count,
+    }
+
+def _normalize_proposed_tasks(tasks_data, plan_end_date=None):
+    """
+    Validate and normalize ProposedPlan.tasks_data before anything is written.
+    Returns (tasks, series): dicts ready for Task(**fields) and, for entries
+    with a 'repeat' rule, for TaskSeries(**fields). Raises ValidationError
+    naming the first malformed entry.
+    """
+    if not isinstance(tasks_data, list):
+        raise ValidationError('Proposed tasks must be a list.')
     
-    return JsonResponse({
-        'user_message': user_message,
-        'assistant_message': assistant_response,
-        'proposed_plan_id': proposed_plan_id
-    })
+    title_max = Task._meta.get_field('title').max_length
+    statuses = {choice for choice, _ in Task.STATUS_CHOICES}
+    normalized = []
+    series = []
+    for index, task_data in enumerate(tasks_data, start=1):
+        if not isinstance(task_data, dict):
+            raise ValidationError(f'Task {index} is not an object.')
+        
+        raw_date = task_data.get('task_date')
+        try:
+            task_date = datetime.strptime(str(raw_date).strip(), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValidationError(f'Task {index} has an invalid date: {raw_date!r}.')
+        
+        title = str(task_data.get('title') or 'Untitled Task')[:title_max]
+        description = str(task_data.get('description') or '')
+        if 'repeat' in task_data:
+            fields = _normalize_proposed_series(index, task_date, task_data['repeat'], plan_end_date)
+            series.append({'title': title, 'description': description, **fields})
+            continue
+        
+        status = task_data.get('status', 'pending')
+        normalized.append({
+            'title': title,
+            'description': description,
+            'task_date': task_date,
+            'status': status if status in statuses else 'pending',
+        })
+    return normalized, series
 
 @login_required
 @require_http_methods(["POST"])
 def chatbot_accept_plan(request, plan_id):
     proposed_plan = get_object_or_404(ProposedPlan, id=plan_id, user=request.user, is_accepted=False)
     
-    plan = Plan.objects.create(
-        user=request.user,
-        title=proposed_plan.title,
-        description=proposed_plan.description,
-        color=proposed_plan.color,
-        start_date=proposed_plan.start_date,
-        end_date=proposed_plan.end_date
-    )
+    try:
+        tasks, series = _normalize_proposed_tasks(proposed_plan.tasks_data, proposed_plan.end_date)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'error': e.messages[0]}, status=400)
     
-    for task_data in proposed_plan.tasks_data:
-        Task.objects.create(
-            plan=plan,
-            title=task_data.get('title', 'Untitled Task'),
-            description=task_data.get('description', ''),
-            task_date=task_data.get('task_date'),
-            status=task_data.get('status', 'pending')
+    with transaction.atomic():
+        # Claim the proposal first so concurrent clicks can't create it twice
+        claimed = ProposedPlan.objects.filter(
+            id=proposed_plan.id, user=request.user, is_accepted=False
+        ).update(is_accepted=True)
+        if not claimed:
+            return JsonResponse({'success': False, 'error': 'This plan has already been created.'}, status=409)
+        
+        plan = Plan.objects.create(
+            user=request.user,
+            title=proposed_plan.title,
+            description=proposed_plan.description,
+            color=proposed_plan.color,
+            start_date=proposed_plan.start_date,
+            end_date=proposed_plan.end_date,
+            # bulk_create bypasses Task.save, so set the counters up front
+            task_count=len(tasks) + sum(fields['occurrence_count'] for fields in series),
+            completed_task_count=sum(1 for task in tasks if task['status'] == 'completed'),
+        )
+        
+        created = Task.objects.bulk_create(
+            [Task(plan=plan, **fields) for fields in tasks],
+            batch_size=500
+        )
+        # Repeating tasks are stored as one series row each, not per date
+        created_series = TaskSeries.objects.bulk_create([TaskSeries(plan=plan, **fields) for fields in series])
+        # bulk_create sends no post_save, so index the tasks here
+        search.index_documents(
+            [search.task_document(task, request.user.id) for task in created]
+            + [search.series_document(item, request.user.id) for item in created_series]
         )
-    
-    proposed_plan.is_accepted = True
-    proposed_plan.save()
     
     return JsonResponse({
         'success': True,
@@ -331,6 +1150,11 @@ def chatbot_accept_plan(request, plan_id):
         'redirect_url': reverse('plan_detail', args=[plan.id])
     })
 
+@staff_member_required
+def chatbot_cache_stats(request):
+    """Hit/miss counters of the model response cache, for operators."""
+    return JsonResponse(response_cache_stats())
+
 @login_required
 @require_http_methods(["POST"])
 def chatbot_new_conversation(request):